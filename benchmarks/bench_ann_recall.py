@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+近似近傍インデックス（IVF-Flat）の recall@k と所要時間を全件計算と比較するベンチマーク
+
+nprobe（走査クラスタ数）ごとに、候補制限なし / 地名フィルタ相当の候補制限ありの両方で計測する
+
+使い方:
+    python benchmarks/bench_ann_recall.py [--matrix <展開済み*.matrix.npy>] [--rows 200000]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from infrastructures.ivf_index import build_ivf_index
+from services import similarity_engine
+from services.similarity_engine import rank_rows
+from benchmarks.bench_quantized_similarity import load_table, make_queries
+
+
+def run(table, index, rows, queries, top_k, engine, nprobe=None):
+    """全クエリを実行し、(上位k件の集合リスト, 所要時間リスト) を返す"""
+    if nprobe is not None:
+        similarity_engine.ANN_NPROBE = nprobe
+    results = []
+    timings = []
+    for query in queries:
+        started = time.perf_counter()
+        order, _ = rank_rows(table, rows, query, top_k=top_k, engine=engine, index=index)
+        timings.append((time.perf_counter() - started) * 1000)
+        results.append(set(rows[order].tolist()))
+    return results, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--matrix", default=None, help="展開済みの*.matrix.npy")
+    parser.add_argument("--rows", type=int, default=200000, help="合成データの行数")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--lists", type=int, default=None)
+    parser.add_argument("--subset", type=float, default=0.3, help="候補制限ありの場合に残す行の割合")
+    args = parser.parse_args()
+
+    table = load_table(args.matrix, args.rows, args.dim)
+    queries = make_queries(table, args.queries)
+
+    started = time.perf_counter()
+    index = build_ivf_index(table.matrix, table.ids, num_lists=args.lists)
+    print(f"カタログ: N={len(table)}, D={table.dim}, lists={index.num_lists} (構築 {time.perf_counter() - started:.1f}s)")
+
+    # 候補制限は地名フィルタと同様、同じクラスタに偏らない部分集合として作る
+    rng = np.random.default_rng(2)
+    all_rows = np.arange(len(table), dtype=np.intp)
+    subset_rows = np.sort(rng.choice(len(table), size=int(len(table) * args.subset), replace=False))
+    similarity_engine.ANN_MIN_ROWS = 0
+
+    for label, rows in [("制限なし", all_rows), (f"制限あり({args.subset:.0%})", subset_rows)]:
+        exact, exact_times = run(table, None, rows, queries, args.top_k, "exact")
+        exact_p50 = statistics.median(exact_times)
+        print(f"[{label}] exact p50={exact_p50:.2f}ms")
+        for nprobe in [1, 4, 8, 16, 32, 64]:
+            approx, times = run(table, index, rows, queries, args.top_k, "ann", nprobe)
+            recall = statistics.mean(len(a & e) / args.top_k for a, e in zip(approx, exact))
+            p50 = statistics.median(times)
+            print(f"  nprobe={nprobe:<3} recall@{args.top_k}={recall:.3f}  p50={p50:7.2f}ms  speedup={exact_p50 / p50:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Blobマニフェスト有無で、1リクエストあたりのStorage問い合わせ回数を比較するベンチマーク
+
+ローカルのStorage代替（問い合わせ回数と擬似レイテンシを持つメモリ上のバケット）で、
+次の処理の存在確認にかかる問い合わせ回数と所要時間を計測する
+
+  - image_generate の既存画像チェック（2ディレクトリ × 4拡張子）
+  - アップロード画像の重複チェック（query / search）
+  - バッチ検索の結果画像チェック（api/photo、最大4拡張子）
+
+使い方:
+    python benchmarks/bench_blob_manifest.py [--objects 5000] [--requests 200] [--latency-ms 40]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import infrastructures.firebase_config as firebase_config
+
+# ローカル計測のためFirebaseには接続しない
+firebase_config.initialize_firebase = lambda: None
+
+import infrastructures.blob_manifest as blob_manifest
+from infrastructures.blob_manifest import BlobManifest
+import services.image_storage_service as image_storage_service
+from services.image_generate_service import check_existing_image_in_storage
+
+
+class FakeBlob:
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+
+    def exists(self):
+        self.bucket.round_trips += 1
+        time.sleep(self.bucket.latency)
+        return self.name in self.bucket.objects
+
+
+class FakeBucket:
+    """問い合わせ回数を数えるメモリ上のバケット（list_blobsは1000件ごとに1往復）"""
+
+    def __init__(self, objects, latency):
+        self.objects = set(objects)
+        self.latency = latency
+        self.round_trips = 0
+
+    def blob(self, name):
+        return FakeBlob(self, name)
+
+    def list_blobs(self, prefix=""):
+        names = sorted(name for name in self.objects if name.startswith(prefix))
+        for start in range(0, max(1, len(names)), 1000):
+            self.round_trips += 1
+            time.sleep(self.latency)
+            for name in names[start:start + 1000]:
+                yield FakeBlob(self, name)
+
+
+async def run_requests(bucket, names, num_requests):
+    """1リクエスト分の存在確認（画像生成チェック + アップロード重複チェック + 結果画像チェック）を繰り返す"""
+    rng = random.Random(0)
+    started = time.perf_counter()
+    for _ in range(num_requests):
+        name = rng.choice(names) if rng.random() < 0.5 else f"missing_{rng.randrange(10**6)}"
+        await check_existing_image_in_storage(f"{name}.jpg")
+        await image_storage_service.check_blob_exists(f"api/query_image/{name}.jpg")
+        await image_storage_service.check_blob_exists(f"api/search_image/{name}.jpg")
+        for ext in [".jpg", ".jpeg", ".png", ".webp"]:
+            if await image_storage_service.check_blob_exists(f"api/photo/{rng.randrange(2000)}{ext}"):
+                break
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--objects", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="1往復の擬似レイテンシ")
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    names = [f"spot_{i}" for i in range(args.objects)]
+    objects = [f"api/query_image/{name}.jpg" for name in names[:args.objects // 10]]
+    objects += [f"api/search_image/{name}.jpg" for name in names[args.objects // 10:]]
+    objects += [f"api/photo/{i}{rng.choice(['.jpg', '.png'])}" for i in range(2000)]
+    bucket = FakeBucket(objects, args.latency_ms / 1000)
+
+    # Storage呼び出しを代替バケットに向ける
+    image_storage_service.storage.bucket = lambda: bucket
+
+    for label, manifest in [("manifestなし", BlobManifest(prefixes=(), bucket_factory=lambda: bucket)),
+                            ("manifestあり", BlobManifest(bucket_factory=lambda: bucket))]:
+        blob_manifest._blob_manifest = manifest
+        bucket.round_trips = 0
+        load_started = time.perf_counter()
+        manifest.load()
+        load_trips = bucket.round_trips
+        load_seconds = time.perf_counter() - load_started
+
+        bucket.round_trips = 0
+        elapsed = asyncio.run(run_requests(bucket, names, args.requests))
+        print(
+            f"  {label}: 読み込み {load_trips}往復 ({load_seconds * 1000:.0f}ms)  "
+            f"リクエストあたり {bucket.round_trips / args.requests:5.2f}往復  "
+            f"{elapsed / args.requests * 1000:7.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
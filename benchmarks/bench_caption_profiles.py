@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+BLIPキャプション生成のデコード設定（quality / balanced / fast）を比較するベンチマーク
+
+出力:
+  - 設定ごとのキャプション生成時間（p50 / p90）
+  - qualityのキャプションとの検索結果の一致率（テキスト検索の上位k件の重なり）
+
+検索結果の比較には、キャプションを日本語に翻訳してSentence-BERTでベクトル化し、
+カタログのテキスト埋め込みテーブル（*.table.npz）に対して上位k件を求める
+（翻訳にはネットワークを使う。--table を省略した場合はキャプションと時間のみ出力）
+
+使い方:
+    python benchmarks/bench_caption_profiles.py --images <画像ディレクトリ> [--table sentence_bert_ja_mean_ver2.table.npz] [--top-k 10]
+"""
+
+import argparse
+import asyncio
+import glob
+import os
+import statistics
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from infrastructures.image_processor import ImageProcessor, CAPTION_PROFILES
+from infrastructures.embedding_table import load_embedding_table
+from services.similarity_engine import rank_rows
+
+
+def percentile(values, ratio):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * ratio))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", required=True, help="画像ディレクトリ（jpg/png/webp）")
+    parser.add_argument("--table", default=None, help="テキスト埋め込みテーブル（*.table.npz）")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--limit", type=int, default=30, help="使用する画像の最大数")
+    args = parser.parse_args()
+
+    paths = sorted(
+        path for path in glob.glob(os.path.join(args.images, "*"))
+        if path.lower().endswith((".jpg", ".jpeg", ".png", ".webp"))
+    )[:args.limit]
+    if not paths:
+        print("画像が見つかりません")
+        sys.exit(1)
+
+    images = []
+    for path in paths:
+        with open(path, "rb") as f:
+            images.append(ImageProcessor.open_image(f.read()))
+
+    # モデル読み込み（計測に含めない）
+    ImageProcessor.generate_text_from_image(images[0], "fast")
+
+    captions = {}
+    print(f"画像数: {len(images)}")
+    for profile in CAPTION_PROFILES:
+        timings = []
+        captions[profile] = []
+        for image in images:
+            started = time.perf_counter()
+            captions[profile].append(ImageProcessor.generate_text_from_image(image, profile))
+            timings.append((time.perf_counter() - started) * 1000)
+        print(
+            f"  {profile:<9} p50={statistics.median(timings):8.1f}ms  p90={percentile(timings, 0.9):8.1f}ms  "
+            f"例: {captions[profile][0]}"
+        )
+
+    if not args.table:
+        return
+
+    from infrastructures.bert_vectorizer import vectorize_texts
+    from infrastructures.translation_client import translate_to_japanese
+
+    table = load_embedding_table(args.table)
+    rows = np.arange(len(table), dtype=np.intp)
+
+    def top_ids(english_captions):
+        japanese = [asyncio.run(translate_to_japanese(caption)) if caption else "" for caption in english_captions]
+        results = []
+        for vector in vectorize_texts(japanese):
+            if vector is None:
+                results.append(set())
+                continue
+            order, _ = rank_rows(table, rows, vector, top_k=args.top_k, engine="exact")
+            results.append(set(table.ids[order].tolist()))
+        return results
+
+    reference = top_ids(captions["quality"])
+    print(f"qualityとの検索結果一致率（上位{args.top_k}件）")
+    for profile in CAPTION_PROFILES:
+        if profile == "quality":
+            continue
+        candidate = top_ids(captions[profile])
+        overlaps = [len(a & b) / args.top_k for a, b in zip(reference, candidate)]
+        print(f"  {profile:<9} mean={statistics.mean(overlaps):.3f}  min={min(overlaps):.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+キーワード抽出（MeCab）の1リクエストあたりの所要時間を比較するマイクロベンチマーク
+
+  - per-call : 従来通り呼び出しごとに MeCab.Tagger() を生成
+  - pooled   : スレッドごとのTaggerを再利用（キャッシュなし）
+  - cached   : Tagger再利用 + NFKC正規化テキストのLRUキャッシュ（繰り返しクエリを含む）
+
+使い方:
+    python benchmarks/bench_keyword_extraction.py [--requests 2000] [--distinct 200]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import MeCab
+from services import mecab
+
+# クエリの材料
+PLACES = ["函館", "札幌", "小樽", "京都", "奈良", "金沢", "松本", "鎌倉", "日光", "別府"]
+SCENES = ["の夜景", "の紅葉", "の古い町並み", "で温泉", "の海", "の桜並木", "の雪景色", "の神社"]
+SUFFIXES = ["が見たい", "に行きたい", "を楽しみたい", "", "がきれいなところ"]
+
+
+def make_queries(num_requests: int, num_distinct: int):
+    """実際の検索に近い、繰り返しを含むクエリ列を生成（全角・半角の揺れも含める）"""
+    rng = random.Random(0)
+    distinct = [rng.choice(PLACES) + rng.choice(SCENES) + rng.choice(SUFFIXES) for _ in range(num_distinct)]
+    queries = []
+    for _ in range(num_requests):
+        query = rng.choice(distinct)
+        if rng.random() < 0.2:
+            query = query.replace("の", "の　")  # 全角スペースの揺れ（NFKCで半角になる）
+        queries.append(query)
+    return queries
+
+
+def extract_per_call(text: str):
+    """従来の実装（呼び出しごとにTaggerを生成）"""
+    tagger = MeCab.Tagger()
+    keywords = []
+    node = tagger.parseToNode(text)
+    while node:
+        features = node.feature.split(',')
+        if len(features) > 0 and features[0] in mecab.TARGET_POS and node.surface:
+            keywords.append(node.surface)
+        node = node.next
+    return list(set(keywords))
+
+
+def measure(label: str, func, queries, baseline_mean=None):
+    timings = []
+    for query in queries:
+        started = time.perf_counter()
+        func(query)
+        timings.append((time.perf_counter() - started) * 1000)
+    p50 = statistics.median(timings)
+    mean = statistics.mean(timings)
+    speedup = f"  speedup(mean)={baseline_mean / mean:6.1f}x" if baseline_mean else ""
+    print(f"  {label:<9} p50={p50:8.3f}ms  mean={mean:8.3f}ms{speedup}")
+    return mean
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--distinct", type=int, default=200, help="異なるクエリの数")
+    args = parser.parse_args()
+
+    queries = make_queries(args.requests, args.distinct)
+    print(f"リクエスト数={len(queries)}, 異なるクエリ={args.distinct}")
+
+    # 従来実装は遅いため一部のみ計測
+    baseline = measure("per-call", extract_per_call, queries[:max(1, len(queries) // 10)])
+
+    mecab.warmup_tagger()
+    measure("pooled", lambda q: mecab._extract_keywords_cached.__wrapped__(q), queries, baseline)
+
+    mecab._extract_keywords_cached.cache_clear()
+    measure("cached", mecab.extract_keywords, queries, baseline)
+    print(f"  キャッシュ統計: {mecab.get_keyword_cache_stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+圧縮エンジン（int8 + float32再計算）とfloat32全件計算を比較するベンチマーク
+
+カタログの展開済み行列（FEATURE_CACHE_DIR内の *.matrix.npy）を指定すると実データで、
+指定しない場合は乱数の合成データで計測する。クエリはカタログの行にノイズを加えて作る
+
+本番と同じく expand_table で一時ディレクトリに展開し（圧縮行列も展開時に作成）、
+エンジンごとに新しいプロセスでメモリマップとして開いて計測する
+
+出力:
+  - 展開済みファイルの大きさ
+  - 1プロセスあたりのメモリ（テーブルを開く前からのRssの増分と、その内訳）
+    ※ fileはメモリマップしたファイルのページで、同一インスタンスのワーカー間で1コピーを共有する。
+      ワーカーを1つ増やすごとに増えるのはanon（プロセス固有の匿名メモリ）
+  - 1クエリあたりの所要時間（p50）と全件計算に対する速度比
+  - 上位10件の一致率（全件計算の結果との重なり）
+
+使い方:
+    python benchmarks/bench_quantized_similarity.py [--matrix /tmp/kankodori_features/vit.table.npz.<gen>.matrix.npy]
+"""
+
+import argparse
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from infrastructures import feature_cache
+from infrastructures.embedding_table import EmbeddingTable, save_embedding_table
+from infrastructures.quantized_matrix import QUANTIZATION_MODES
+from services.similarity_engine import rank_rows
+
+# 展開先のテーブルファイル名と世代（計測用の一時ディレクトリ内でのみ使う）
+BENCH_TABLE = "bench.table.npz"
+BENCH_GENERATION = "bench"
+
+
+def load_table(matrix_path, num_rows: int, dim: int) -> EmbeddingTable:
+    """実データまたは合成データのテーブルを用意"""
+    if matrix_path:
+        matrix = np.load(matrix_path, mmap_mode="r")
+        ids = np.array([str(i) for i in range(matrix.shape[0])])
+        return EmbeddingTable.from_arrays(np.asarray(matrix), ids)
+
+    rng = np.random.default_rng(0)
+    # クラスタ構造を持たせて実データに近い分布にする
+    centers = rng.standard_normal((64, dim)).astype(np.float32)
+    labels = rng.integers(0, len(centers), num_rows)
+    matrix = centers[labels] + 0.7 * rng.standard_normal((num_rows, dim)).astype(np.float32)
+    ids = np.array([str(i) for i in range(num_rows)])
+    return EmbeddingTable.from_arrays(matrix, ids)
+
+
+def make_queries(table: EmbeddingTable, num_queries: int) -> np.ndarray:
+    rng = np.random.default_rng(1)
+    picks = rng.integers(0, len(table), num_queries)
+    noise = 0.5 * rng.standard_normal((num_queries, table.dim)).astype(np.float32) / np.sqrt(table.dim)
+    return np.asarray(table.matrix[picks]) + noise
+
+
+def process_memory() -> dict:
+    """
+    このプロセスのメモリ（MB）
+
+    /proc/self/smaps_rollup が読める場合は Rss と、その内訳の
+    anon（プロセス固有の匿名メモリ）/ file（ワーカー間で共有できるファイルのページ）を返す。
+    読めない場合は最大Rssのみ
+    """
+    try:
+        values = {}
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[1].isdigit():
+                    values[parts[0].rstrip(":")] = int(parts[1]) / 1024
+        rss = values.get("Rss", 0.0)
+        anon = values.get("Anonymous", 0.0)
+        return {"rss": rss, "anon": anon, "file": rss - anon}
+    except OSError:
+        import resource
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOSはバイト、Linuxはキロバイト単位
+        divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+        return {"rss": maxrss / divisor, "anon": float("nan"), "file": float("nan")}
+
+
+def run_engine(cache_dir: str, engine: str, queries: np.ndarray, top_k: int) -> dict:
+    """
+    新しいプロセスで展開済みテーブルを開き、1エンジン分を計測する
+
+    Returns:
+        所要時間・上位k件・メモリ増分の辞書
+    """
+    feature_cache.FEATURE_CACHE_DIR = cache_dir
+    before = process_memory()
+
+    table = feature_cache.open_cached_table(BENCH_TABLE, BENCH_GENERATION)
+    rows = np.arange(len(table), dtype=np.intp)
+
+    timings = []
+    tops = []
+    for query in queries:
+        started = time.perf_counter()
+        order, _ = rank_rows(table, rows, query, top_k=top_k, engine=engine)
+        timings.append((time.perf_counter() - started) * 1000)
+        tops.append(order.tolist())
+
+    after = process_memory()
+    return {
+        "timings": timings,
+        "tops": tops,
+        "memory": {key: after[key] - before[key] for key in after}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--matrix", default=None, help="展開済みの*.matrix.npy")
+    parser.add_argument("--rows", type=int, default=50000, help="合成データの行数")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+
+    table = load_table(args.matrix, args.rows, args.dim)
+    queries = make_queries(table, args.queries)
+    print(f"カタログ: N={len(table)}, D={table.dim}")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        # 本番と同じ手順で展開（圧縮行列も同時に作成）
+        feature_cache.FEATURE_CACHE_DIR = cache_dir
+        npz_path = os.path.join(cache_dir, BENCH_TABLE)
+        save_embedding_table(table, npz_path)
+        feature_cache.expand_table(npz_path, BENCH_TABLE, BENCH_GENERATION)
+        os.remove(npz_path)
+        del table
+
+        for name in sorted(os.listdir(cache_dir)):
+            if name.endswith(".npy"):
+                print(f"  {name:<40} {os.path.getsize(os.path.join(cache_dir, name)) / 1e6:8.1f}MB")
+
+        # エンジンごとに新しいプロセスで計測（他のエンジンが触れたページを数えない）
+        context = multiprocessing.get_context("spawn")
+        results = {}
+        for engine in ("exact",) + QUANTIZATION_MODES:
+            with context.Pool(1) as pool:
+                results[engine] = pool.apply(run_engine, (cache_dir, engine, queries, args.top_k))
+
+    baseline = results["exact"]
+    baseline_p50 = statistics.median(baseline["timings"])
+    for engine, result in results.items():
+        p50 = statistics.median(result["timings"])
+        memory = result["memory"]
+        overlaps = [
+            len(set(expected) & set(actual)) / args.top_k
+            for expected, actual in zip(baseline["tops"], result["tops"])
+        ]
+        print(
+            f"  {engine:<6} rss=+{memory['rss']:7.1f}MB (file={memory['file']:7.1f}MB, anon={memory['anon']:6.1f}MB)  "
+            f"p50={p50:7.2f}ms  speedup={baseline_p50 / p50:4.2f}x  "
+            f"top{args.top_k}一致率={statistics.mean(overlaps):.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
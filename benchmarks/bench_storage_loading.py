@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+place_data.json / 特徴量.npy の読み込み方式を比較するベンチマーク
+
+- tmpfile: 固定パスの一時ファイルに書き出し → 読み戻し → 削除（従来方式）
+- memory : ダウンロードしたバイト列をメモリ上で直接パース（現行方式）
+
+ネットワーク転送は両方式で共通のため、ダウンロード済みのバイト列を入力として
+ローカルのI/Oとパースにかかる時間だけを比較する
+
+使い方:
+    python benchmarks/bench_storage_loading.py [--photos 20000] [--repeat 20]
+"""
+
+import argparse
+import io
+import json
+import os
+import statistics
+import time
+import numpy as np
+
+
+def build_place_data_bytes(num_photos: int) -> bytes:
+    """place_data.json相当のバイト列を生成"""
+    photos = [
+        {"id": f"photo_{i:06d}", "name": f"観光地{i}", "location": f"北海道函館市{i % 500}丁目"}
+        for i in range(num_photos)
+    ]
+    return json.dumps({"photo": photos}, ensure_ascii=False).encode("utf-8")
+
+
+def build_feature_bytes(num_photos: int, dim: int = 768) -> bytes:
+    """旧形式の特徴量.npy（pickle化された辞書）相当のバイト列を生成"""
+    rng = np.random.default_rng(0)
+    features = {f"photo_{i:06d}": rng.standard_normal(dim).astype(np.float32) for i in range(num_photos)}
+    buffer = io.BytesIO()
+    np.save(buffer, features, allow_pickle=True)
+    return buffer.getvalue()
+
+
+def load_json_via_tmpfile(content: bytes):
+    local_path = "/tmp/place_data.json"
+    with open(local_path, "wb") as f:
+        f.write(content)
+    with open(local_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    os.remove(local_path)
+    return data
+
+
+def load_json_in_memory(content: bytes):
+    return json.loads(content)
+
+
+def load_npy_via_tmpfile(content: bytes):
+    local_path = "/tmp/bench_feature.npy"
+    with open(local_path, "wb") as f:
+        f.write(content)
+    data = np.load(local_path, allow_pickle=True)
+    os.remove(local_path)
+    return data
+
+
+def load_npy_in_memory(content: bytes):
+    return np.load(io.BytesIO(content), allow_pickle=True)
+
+
+def measure(func, content: bytes, repeat: int) -> list:
+    """repeat回実行した所要時間（ミリ秒）のリスト"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(content)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def report(label: str, timings: list) -> None:
+    p50 = statistics.median(timings)
+    p95 = sorted(timings)[max(0, int(len(timings) * 0.95) - 1)]
+    print(f"  {label:<8} p50={p50:8.2f}ms  p95={p95:8.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--photos", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    place_bytes = build_place_data_bytes(args.photos)
+    feature_bytes = build_feature_bytes(args.photos)
+
+    print(f"place_data.json ({len(place_bytes) / 1e6:.1f}MB)")
+    report("tmpfile", measure(load_json_via_tmpfile, place_bytes, args.repeat))
+    report("memory", measure(load_json_in_memory, place_bytes, args.repeat))
+
+    print(f"feature .npy ({len(feature_bytes) / 1e6:.1f}MB)")
+    report("tmpfile", measure(load_npy_via_tmpfile, feature_bytes, args.repeat))
+    report("memory", measure(load_npy_in_memory, feature_bytes, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
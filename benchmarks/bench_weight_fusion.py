@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+重み比率ごとの統合（integrate_with_weights を比率の数だけ呼ぶ従来方式）と
+行列積による一括統合（fuse_weight_grid）を比較するベンチマーク
+
+乱数の合成データでテキスト・画像の類似度を作り、同じ重みの組で上位k件を求める
+
+出力:
+  - 1クエリあたりの所要時間（p50）と速度比
+  - 上位k件の統合スコアが従来方式と一致するか
+
+使い方:
+    python benchmarks/bench_weight_fusion.py [--candidates 20000] [--weights 21] [--top-k 1]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.integration_service import integrate_with_weights
+from services.fusion_service import align_scores, weight_grid_results
+
+
+def make_rankings(num_candidates: int, image_ratio: float, seed: int):
+    """テキスト・画像それぞれの (位置, 類似度) と、従来方式用の辞書リストを作る"""
+    rng = np.random.default_rng(seed)
+    photo_data = [{"id": f"spot_{i}", "name": f"観光地{i}", "location": "場所"} for i in range(num_candidates)]
+
+    text_positions = np.arange(num_candidates, dtype=np.intp)
+    image_positions = np.sort(rng.choice(num_candidates, int(num_candidates * image_ratio), replace=False))
+    text_scores = rng.random(len(text_positions)).astype(np.float32)
+    image_scores = rng.random(len(image_positions)).astype(np.float32)
+
+    text_results = [
+        {"id": photo_data[p]["id"], "name": photo_data[p]["name"], "location": "場所", "similarity": float(s)}
+        for p, s in zip(text_positions.tolist(), text_scores.tolist())
+    ]
+    image_results = [
+        {"id": photo_data[p]["id"], "similarity": float(s)}
+        for p, s in zip(image_positions.tolist(), image_scores.tolist())
+    ]
+    return photo_data, (text_positions, text_scores), (image_positions, image_scores), text_results, image_results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candidates", type=int, default=20000, help="地名フィルタ後の候補数")
+    parser.add_argument("--weights", type=int, default=5, help="重みの組の数（0〜1を等分）")
+    parser.add_argument("--top-k", type=int, default=1)
+    parser.add_argument("--queries", type=int, default=10)
+    args = parser.parse_args()
+
+    text_weights = np.linspace(1.0, 0.0, args.weights)
+    weights = np.stack([text_weights, 1.0 - text_weights], axis=1).astype(np.float32)
+
+    print(f"候補数={args.candidates}, 重みの組={args.weights}, top_k={args.top_k}")
+
+    baseline_times = []
+    grid_times = []
+    mismatches = 0
+    for seed in range(args.queries):
+        photo_data, text_ranking, image_ranking, text_results, image_results = make_rankings(args.candidates, 0.9, seed)
+
+        started = time.perf_counter()
+        baseline = [
+            integrate_with_weights(text_results, image_results, float(tw), float(iw), top_n=args.top_k)
+            for tw, iw in weights.tolist()
+        ]
+        baseline_times.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        grid = weight_grid_results(photo_data, align_scores(text_ranking, image_ranking), weights, args.top_k)
+        grid_times.append((time.perf_counter() - started) * 1000)
+
+        for expected, items in zip(baseline, grid.values()):
+            expected_scores = np.array([item["integrated_score"] for item in expected])
+            actual_scores = np.array([item["integrated_score"] for item in items])
+            # 従来方式はfloat64、一括統合はfloat32で計算するため誤差の範囲で比較する
+            if expected_scores.shape != actual_scores.shape or not np.allclose(expected_scores, actual_scores, atol=1e-5):
+                mismatches += 1
+
+    baseline_p50 = statistics.median(baseline_times)
+    grid_p50 = statistics.median(grid_times)
+    print(f"  integrate_with_weights x{args.weights}: p50={baseline_p50:8.2f}ms")
+    print(f"  fuse_weight_grid         : p50={grid_p50:8.2f}ms  speedup={baseline_p50 / grid_p50:6.1f}x")
+    print(f"  上位{args.top_k}件のスコア不一致: {mismatches}/{args.queries * args.weights}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,34 @@
-from typing import Optional, Dict, Any
+import math
+from typing import Optional, Dict, Any, AsyncIterator, Tuple
 from fastapi import UploadFile, HTTPException
-from services.search_service import search_tourist_spots as search_service, get_suggested_images
+from services.search_service import (
+    search_tourist_spots as search_service,
+    search_tourist_spots_events as search_events_service,
+    get_suggested_images
+)
+from services.fusion_service import (
+    FusionOptions,
+    SEARCH_TEXT_WEIGHT,
+    SEARCH_IMAGE_WEIGHT,
+    SEARCH_TOP_K,
+    SEARCH_MAX_TOP_K,
+    decode_cursor
+)
+from services.image_storage_service import detach_upload_file
+from infrastructures.image_processor import CAPTION_PROFILES
 
 
-async def search_tourist_spots(
-    text: Optional[str] = None,
-    image: Optional[UploadFile] = None
-) -> Dict[str, Any]:
+def _validate_search_inputs(
+    text: Optional[str],
+    image: Optional[UploadFile],
+    caption_profile: Optional[str]
+) -> Tuple[Optional[str], Optional[UploadFile]]:
+    """
+    検索の入力を正規化・検証する
 
+    Returns:
+        (text, image)（undefined/空の入力はNone）
+    """
     # text の undefined/空文字チェック
     if text and (text.strip() == "" or text.strip().lower() == "undefined"):
         text = None
@@ -23,7 +44,107 @@ async def search_tourist_spots(
             detail="text または image のいずれかは必須です"
         )
 
-    return await search_service(text, image)
+    # キャプション生成のデコード設定チェック
+    if caption_profile and caption_profile not in CAPTION_PROFILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"caption_profile は {', '.join(CAPTION_PROFILES)} のいずれかを指定してください"
+        )
+
+    return text, image
+
+
+def _fusion_options(
+    text_weight: Optional[float],
+    image_weight: Optional[float],
+    top_k: Optional[int],
+    cursor: Optional[str],
+    legacy: bool
+) -> FusionOptions:
+    """
+    結果の統合方法を検証して組み立てる
+
+    Returns:
+        FusionOptions（未指定の項目は既定値）
+    """
+    if legacy:
+        return FusionOptions(legacy=True)
+
+    text_weight = SEARCH_TEXT_WEIGHT if text_weight is None else text_weight
+    image_weight = SEARCH_IMAGE_WEIGHT if image_weight is None else image_weight
+    # nan / inf は統合スコアが nan になり順位が決まらないため受け付けない
+    if (
+        not math.isfinite(text_weight) or not math.isfinite(image_weight)
+        or text_weight < 0 or image_weight < 0 or (text_weight == 0 and image_weight == 0)
+    ):
+        raise HTTPException(
+            status_code=400,
+            detail="text_weight, image_weight は0以上の有限の値で、少なくとも一方は正の値を指定してください"
+        )
+
+    top_k = SEARCH_TOP_K if top_k is None else top_k
+    if top_k < 1 or top_k > SEARCH_MAX_TOP_K:
+        raise HTTPException(
+            status_code=400,
+            detail=f"top_k は1〜{SEARCH_MAX_TOP_K}の範囲で指定してください"
+        )
+
+    try:
+        offset = decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(
+            status_code=400,
+            detail="cursor が不正です"
+        )
+
+    return FusionOptions(text_weight=text_weight, image_weight=image_weight, top_k=top_k, offset=offset)
+
+
+async def search_tourist_spots(
+    text: Optional[str] = None,
+    image: Optional[UploadFile] = None,
+    caption_profile: Optional[str] = None,
+    caption_budget_ms: Optional[float] = None,
+    text_weight: Optional[float] = None,
+    image_weight: Optional[float] = None,
+    top_k: Optional[int] = None,
+    cursor: Optional[str] = None,
+    legacy: bool = False
+) -> Dict[str, Any]:
+
+    text, image = _validate_search_inputs(text, image, caption_profile)
+    fusion = _fusion_options(text_weight, image_weight, top_k, cursor, legacy)
+
+    return await search_service(text, image, caption_profile, caption_budget_ms, fusion)
+
+
+async def search_tourist_spots_stream(
+    text: Optional[str] = None,
+    image: Optional[UploadFile] = None,
+    caption_profile: Optional[str] = None,
+    caption_budget_ms: Optional[float] = None,
+    text_weight: Optional[float] = None,
+    image_weight: Optional[float] = None,
+    top_k: Optional[int] = None,
+    cursor: Optional[str] = None,
+    legacy: bool = False
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    ストリーミング検索の処理
+
+    入力の検証はストリーム開始前に行う（不正な入力は通常の400エラーになる）。
+    アップロード画像はレスポンス送信中に閉じられないよう、ここでメモリに読み込んでおく
+
+    Returns:
+        (イベント名, 内容) の非同期イテレータ
+    """
+    text, image = _validate_search_inputs(text, image, caption_profile)
+    fusion = _fusion_options(text_weight, image_weight, top_k, cursor, legacy)
+
+    if image is not None:
+        image = await detach_upload_file(image)
+
+    return search_events_service(text, image, caption_profile, caption_budget_ms, fusion)
 
 
 async def suggest_images() -> Dict[str, Any]:
@@ -0,0 +1,277 @@
+import asyncio
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+# 同時に処理するワーカー数
+BACKGROUND_WORKERS = int(os.environ.get("BACKGROUND_WORKERS", "4"))
+
+# キューに積める最大件数（満杯の場合は投入側が空きを待つ）
+BACKGROUND_QUEUE_SIZE = int(os.environ.get("BACKGROUND_QUEUE_SIZE", "1000"))
+
+# 失敗時の再試行回数と初回の待ち時間（秒、再試行ごとに2倍）
+BACKGROUND_MAX_RETRIES = int(os.environ.get("BACKGROUND_MAX_RETRIES", "3"))
+BACKGROUND_RETRY_BACKOFF = float(os.environ.get("BACKGROUND_RETRY_BACKOFF", "0.5"))
+
+# 終了時に残りの処理を待つ最大時間（秒）
+BACKGROUND_DRAIN_TIMEOUT = float(os.environ.get("BACKGROUND_DRAIN_TIMEOUT", "30"))
+
+# 再試行しても失敗した処理を保持する件数
+BACKGROUND_DEAD_LETTER_SIZE = int(os.environ.get("BACKGROUND_DEAD_LETTER_SIZE", "100"))
+
+
+@dataclass
+class _Job:
+    name: str
+    func: Callable[..., Awaitable[Any]]
+    args: tuple
+    kwargs: Dict[str, Any]
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+@dataclass
+class _DeadLetter:
+    """再試行しても失敗した処理（積み直せるよう処理と引数ごと保持）"""
+    job: _Job
+    error: Optional[str]
+    attempts: int
+    failed_at: float = field(default_factory=time.time)
+
+
+class BackgroundQueue:
+    """
+    レスポンス後に行う処理（Storageへの保存・ログ書き込みなど）を実行するプロセス内の非同期キュー
+
+    - 件数上限付きのキューをワーカーが順に処理する
+    - 例外またはFalseを返した処理は指数バックオフで再試行し、それでも失敗したものはデッドレターに残す
+      （デッドレターは処理と引数ごと保持し、replay_dead_letters で積み直せる）
+    - 終了時は drain で残りの処理を待ってからワーカーを止める
+    """
+
+    def __init__(
+        self,
+        name: str,
+        workers: Optional[int] = None,
+        maxsize: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        retry_backoff: Optional[float] = None
+    ):
+        """
+        Args:
+            name: 統計上の名前
+            workers: ワーカー数（省略時はBACKGROUND_WORKERS）
+            maxsize: キューの最大件数（省略時はBACKGROUND_QUEUE_SIZE）
+            max_retries: 再試行回数（省略時はBACKGROUND_MAX_RETRIES）
+            retry_backoff: 初回の再試行までの待ち時間（秒、省略時はBACKGROUND_RETRY_BACKOFF）
+        """
+        self.name = name
+        self.workers = max(1, workers or BACKGROUND_WORKERS)
+        self.maxsize = maxsize or BACKGROUND_QUEUE_SIZE
+        self.max_retries = BACKGROUND_MAX_RETRIES if max_retries is None else max_retries
+        self.retry_backoff = BACKGROUND_RETRY_BACKOFF if retry_backoff is None else retry_backoff
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._closed = False
+        self._dead_letters: deque = deque(maxlen=BACKGROUND_DEAD_LETTER_SIZE)
+
+        self._submitted = 0
+        self._dequeued = 0
+        self._completed = 0
+        self._retried = 0
+        self._failed = 0
+        self._inline = 0
+        self._blocked = 0
+        self._last_lag_ms = 0.0
+        self._max_lag_ms = 0.0
+        self._total_lag_ms = 0.0
+
+    def start(self) -> None:
+        """ワーカーを起動（イベントループ内で呼ぶ、起動済みの場合は何もしない）"""
+        if self._workers:
+            return
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._closed = False
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"{self.name}-worker-{i}")
+            for i in range(self.workers)
+        ]
+
+    async def submit(self, name: str, func: Callable[..., Awaitable[Any]], *args: Any, **kwargs: Any) -> None:
+        """
+        処理をキューに積む（実行は待たない）
+
+        キューが満杯の場合は空きが出るまで待つ。終了処理後に呼ばれた場合はその場で実行する
+
+        Args:
+            name: 処理名（ログ・デッドレター用）
+            func: 実行するコルーチン関数（Falseを返した場合も失敗として再試行）
+            *args, **kwargs: funcに渡す引数
+        """
+        job = _Job(name=name, func=func, args=args, kwargs=kwargs)
+
+        if self._closed:
+            self._inline += 1
+            await self._run(job)
+            return
+
+        self.start()
+        self._submitted += 1
+        if self._queue.full():
+            self._blocked += 1
+        await self._queue.put(job)
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                lag_ms = (time.monotonic() - job.enqueued_at) * 1000
+                self._dequeued += 1
+                self._last_lag_ms = lag_ms
+                self._max_lag_ms = max(self._max_lag_ms, lag_ms)
+                self._total_lag_ms += lag_ms
+                await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"バックグラウンド処理エラー ({job.name}): {e}")
+            finally:
+                self._queue.task_done()
+
+    async def run(self, name: str, func: Callable[..., Awaitable[Any]], *args: Any, **kwargs: Any) -> bool:
+        """
+        処理をその場で実行する（失敗時の再試行・デッドレターはキューに積んだ場合と同じ）
+
+        バックグラウンド処理の中で、一部の処理だけを再試行の対象にする場合に使う
+
+        Args:
+            name: 処理名（ログ・デッドレター用）
+            func: 実行するコルーチン関数（Falseを返した場合も失敗として再試行）
+            *args, **kwargs: funcに渡す引数
+
+        Returns:
+            成功した場合True
+        """
+        return await self._run(_Job(name=name, func=func, args=args, kwargs=kwargs))
+
+    async def _run(self, job: _Job) -> bool:
+        """処理を実行し、失敗した場合は再試行する"""
+        error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt > 0:
+                self._retried += 1
+                await asyncio.sleep(self.retry_backoff * (2 ** (attempt - 1)))
+            try:
+                result = await job.func(*job.args, **job.kwargs)
+                if result is not False:
+                    self._completed += 1
+                    return True
+                error = "処理がFalseを返しました"
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                error = str(e)
+            print(f"バックグラウンド処理失敗 ({job.name}, {attempt + 1}回目): {error}")
+
+        self._failed += 1
+        self._dead_letters.append(_DeadLetter(job=job, error=error, attempts=self.max_retries + 1))
+        print(f"バックグラウンド処理をデッドレターに移動: {job.name}")
+        return False
+
+    async def drain(self, timeout: Optional[float] = None) -> bool:
+        """
+        残りの処理を待ってからワーカーを止める（以降の投入はその場で実行）
+
+        Args:
+            timeout: 最大待ち時間（秒、省略時はBACKGROUND_DRAIN_TIMEOUT）
+
+        Returns:
+            すべて処理できた場合True
+        """
+        self._closed = True
+        if not self._workers:
+            return True
+
+        timeout = BACKGROUND_DRAIN_TIMEOUT if timeout is None else timeout
+        drained = True
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            drained = False
+            print(f"バックグラウンド処理が終わらないまま終了します: 残り{self._queue.qsize()}件")
+
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        return drained
+
+    def dead_letters(self) -> List[Dict[str, Any]]:
+        """
+        デッドレター（再試行しても失敗した処理）の一覧
+
+        Returns:
+            処理名・関数名・エラー・試行回数・失敗時刻の辞書のリスト（引数はユーザー情報を含むため返さない）
+        """
+        return [
+            {
+                "name": letter.job.name,
+                "func": getattr(letter.job.func, "__qualname__", repr(letter.job.func)),
+                "error": letter.error,
+                "attempts": letter.attempts,
+                "failed_at": letter.failed_at
+            }
+            for letter in self._dead_letters
+        ]
+
+    async def replay_dead_letters(self) -> int:
+        """
+        デッドレターの処理を同じ引数でキューに積み直す
+
+        Returns:
+            積み直した件数
+        """
+        letters = list(self._dead_letters)
+        self._dead_letters.clear()
+        for letter in letters:
+            await self.submit(letter.job.name, letter.job.func, *letter.job.args, **letter.job.kwargs)
+        if letters:
+            print(f"デッドレターを積み直しました: {len(letters)}件")
+        return len(letters)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        キューの統計
+
+        Returns:
+            depth（待ち件数）/ lag（投入から実行開始までの時間）/ 成功・再試行・失敗件数などの辞書
+        """
+        return {
+            "workers": len(self._workers),
+            "depth": self._queue.qsize() if self._queue is not None else 0,
+            "maxsize": self.maxsize,
+            "submitted": self._submitted,
+            "completed": self._completed,
+            "retried": self._retried,
+            "failed": self._failed,
+            "inline": self._inline,
+            "blocked": self._blocked,
+            "last_lag_ms": round(self._last_lag_ms, 1),
+            "max_lag_ms": round(self._max_lag_ms, 1),
+            "avg_lag_ms": round(self._total_lag_ms / self._dequeued, 1) if self._dequeued else 0.0,
+            "dead_letters": len(self._dead_letters),
+            "closed": self._closed
+        }
+
+
+_background_queue: Optional[BackgroundQueue] = None
+
+
+def get_background_queue() -> BackgroundQueue:
+    """レスポンス後の処理用キュー（シングルトン）を取得"""
+    global _background_queue
+    if _background_queue is None:
+        _background_queue = BackgroundQueue("post_response")
+    return _background_queue
@@ -67,6 +67,36 @@ class BertVectorizer:
             print(f"テキストベクトル化エラー: {e}")
             return None
 
+    def vectorize_texts(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """
+        複数のテキストを1回のエンコードでベクトル化する
+
+        Args:
+            texts: ベクトル化するテキストのリスト
+
+        Returns:
+            textsと同じ順序のベクトルのリスト（空テキストはNone）
+        """
+        vectors: List[Optional[np.ndarray]] = [None] * len(texts)
+        try:
+            # モデル初期化
+            self._initialize_model()
+
+            targets = [i for i, text in enumerate(texts) if text and text.strip()]
+            if not targets:
+                return vectors
+
+            # Sentence-BERTでまとめてエンコード
+            encoded = self.model.encode([texts[i] for i in targets], batch_size=len(targets), convert_to_numpy=True)
+            for i, vector in zip(targets, encoded):
+                vectors[i] = vector
+
+            return vectors
+
+        except Exception as e:
+            print(f"テキストベクトル化エラー: {e}")
+            return vectors
+
     def vectorize_image(self, image_url: str) -> Optional[np.ndarray]:
         """
         画像URLから画像をダウンロードしてベクトル化する
@@ -151,6 +181,19 @@ def vectorize_text(text: str) -> Optional[np.ndarray]:
     vectorizer = get_bert_vectorizer()
     return vectorizer.vectorize_text(text)
 
+def vectorize_texts(texts: List[str]) -> List[Optional[np.ndarray]]:
+    """
+    複数のテキストをまとめてベクトル化する便利関数
+
+    Args:
+        texts: ベクトル化するテキストのリスト
+
+    Returns:
+        ベクトルのリスト（失敗したテキストはNone）
+    """
+    vectorizer = get_bert_vectorizer()
+    return vectorizer.vectorize_texts(texts)
+
 def vectorize_image(image_url: str) -> Optional[np.ndarray]:
     """
     画像URLをベクトル化する便利関数
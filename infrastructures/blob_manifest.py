@@ -0,0 +1,150 @@
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+from firebase_admin import storage
+from infrastructures.firebase_config import initialize_firebase
+
+# マニフェストで管理するStorageのディレクトリ
+MANIFEST_PREFIXES = ("api/query_image/", "api/search_image/", "api/photo/")
+
+# マニフェストを一覧取得し直す間隔（秒）
+BLOB_MANIFEST_REFRESH_SECONDS = float(os.environ.get("BLOB_MANIFEST_REFRESH_SECONDS", "600"))
+
+
+def _default_bucket():
+    initialize_firebase()
+    return storage.bucket()
+
+
+class BlobManifest:
+    """
+    Storage上のオブジェクト名のメモリ内一覧
+
+    ディレクトリごとに1回の一覧取得（ページングはクライアントが処理）で読み込み、
+    自分の書き込みは即座に反映し、定期的に全体を取得し直す。
+    存在確認は集合の検索になり、Storageへの問い合わせは発生しない
+    """
+
+    def __init__(self, prefixes: Iterable[str] = MANIFEST_PREFIXES, bucket_factory: Callable[[], Any] = None):
+        """
+        Args:
+            prefixes: 管理するディレクトリ（末尾は"/"）
+            bucket_factory: バケットを返す関数（省略時はFirebase Storage、ローカル計測用に差し替え可能）
+        """
+        self.prefixes = tuple(prefixes)
+        self._bucket_factory = bucket_factory or _default_bucket
+        self._names: Optional[Set[str]] = None
+        self._lock = threading.Lock()
+        self._recent_writes: Dict[str, float] = {}
+        self.loaded_at: Optional[float] = None
+        self.lookups = 0
+        self.fallbacks = 0
+
+    def manages(self, path: str) -> bool:
+        """pathがマニフェストの管理対象かどうか"""
+        return path.startswith(self.prefixes)
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._names is not None
+
+    def load(self) -> bool:
+        """
+        全ディレクトリを一覧取得してマニフェストを置き換える（同期処理）
+
+        一覧取得中に行われた自分の書き込みは失われないよう引き継ぐ
+
+        Returns:
+            成功時True
+        """
+        started_at = time.time()
+        try:
+            bucket = self._bucket_factory()
+            names = set()
+            for prefix in self.prefixes:
+                for blob in bucket.list_blobs(prefix=prefix):
+                    names.add(blob.name)
+        except Exception as e:
+            print(f"Blobマニフェスト取得エラー: {e}")
+            return False
+
+        with self._lock:
+            for path, written_at in self._recent_writes.items():
+                if written_at >= started_at:
+                    names.add(path)
+            self._recent_writes = {
+                path: written_at for path, written_at in self._recent_writes.items() if written_at >= started_at
+            }
+            self._names = names
+            self.loaded_at = time.time()
+
+        print(f"Blobマニフェスト更新: {len(names)}件")
+        return True
+
+    def exists(self, path: str) -> Optional[bool]:
+        """
+        オブジェクトが存在するか
+
+        Args:
+            path: Storageのパス
+
+        Returns:
+            存在すればTrue、しなければFalse。
+            未読み込みまたは管理対象外のパスの場合はNone（呼び出し元でStorageに問い合わせる）
+        """
+        names = self._names
+        if names is None or not self.manages(path):
+            self.fallbacks += 1
+            return None
+        self.lookups += 1
+        return path in names
+
+    def add(self, path: str) -> None:
+        """自分の書き込みを反映"""
+        if not self.manages(path):
+            return
+        with self._lock:
+            self._recent_writes[path] = time.time()
+            if self._names is not None:
+                self._names.add(path)
+
+    def names(self, prefix: str) -> Optional[List[str]]:
+        """
+        指定ディレクトリのオブジェクト名一覧
+
+        Args:
+            prefix: ディレクトリ（"api/query_image/" など）
+
+        Returns:
+            パスのリスト（未読み込みの場合はNone）
+        """
+        names = self._names
+        if names is None:
+            return None
+        return sorted(name for name in names if name.startswith(prefix))
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        マニフェストの統計
+
+        Returns:
+            件数・読み込み時刻・集合検索数・フォールバック数
+        """
+        names = self._names
+        return {
+            "loaded": names is not None,
+            "size": len(names) if names is not None else 0,
+            "loaded_at": self.loaded_at,
+            "lookups": self.lookups,
+            "fallbacks": self.fallbacks
+        }
+
+
+# シングルトンインスタンス
+_blob_manifest = BlobManifest()
+
+
+def get_blob_manifest() -> BlobManifest:
+    """Blobマニフェストのシングルトンインスタンスを取得"""
+    return _blob_manifest
@@ -0,0 +1,87 @@
+import threading
+import time
+from typing import Any, Dict
+
+
+class CircuitBreaker:
+    """
+    連続失敗で外部呼び出しを一時停止するサーキットブレーカー
+
+    failure_threshold 回連続で失敗すると reset_seconds の間は呼び出しを止め（open）、
+    経過後は1回だけ試行を許可し（half-open）、成功すれば元に戻る
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        """
+        Args:
+            name: 名前（ログ用）
+            failure_threshold: 停止するまでの連続失敗回数
+            reset_seconds: 停止してから再試行を許可するまでの秒数
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        """
+        呼び出してよいかどうか
+
+        Returns:
+            呼び出し可能な場合True
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at >= self.reset_seconds and not self._trial_running:
+                self._trial_running = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self) -> None:
+        """成功を記録（停止状態を解除）"""
+        with self._lock:
+            if self._opened_at is not None:
+                print(f"サーキットブレーカー復帰: {self.name}")
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        """失敗を記録（閾値に達したら停止）"""
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    print(f"サーキットブレーカー作動: {self.name} ({self._failures}回連続失敗)")
+                self._opened_at = time.monotonic()
+
+    def release_trial(self) -> None:
+        """成功・失敗を記録せずに終わった試行（キャンセルなど）の枠を解放する"""
+        with self._lock:
+            self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        """"closed" / "open" / "half_open" """
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_seconds:
+                return "half_open"
+            return "open"
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        状態と統計
+
+        Returns:
+            state / consecutive_failures / rejected の辞書
+        """
+        return {"state": self.state, "consecutive_failures": self._failures, "rejected": self.rejected}
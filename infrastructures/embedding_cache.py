@@ -0,0 +1,132 @@
+import asyncio
+import hashlib
+import os
+import threading
+import numpy as np
+from typing import Any, Dict, Optional
+from infrastructures.feature_cache import atomic_temp_path
+from infrastructures.memory_cache import LRUCache
+
+
+def content_hash(data: bytes) -> str:
+    """バイト列のSHA-256（16進文字列）"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    内容ハッシュをキーにした埋め込みベクトルのキャッシュ
+
+    - pinned : 事前計算したベクトル（削除されない）
+    - memory : LRUのメモリ層
+    - disk   : ローカルディスク層（{disk_dir}/{hash[:2]}/{hash}.npy、プロセス・再起動をまたいで共有）
+
+    ディスク層の読み書きは別スレッドで行い、イベントループを止めない
+    """
+
+    def __init__(self, name: str, memory_size: int, disk_dir: Optional[str] = None):
+        """
+        Args:
+            name: キャッシュ名（ディスク層のサブディレクトリ名）
+            memory_size: メモリ層の最大件数
+            disk_dir: ディスク層のディレクトリ（Noneまたは空の場合はディスク層なし）
+        """
+        self.name = name
+        self._pinned: Dict[str, np.ndarray] = {}
+        self._pinned_lock = threading.Lock()
+        self._memory = LRUCache(memory_size)
+        self._disk_dir = os.path.join(disk_dir, name) if disk_dir else None
+        self.pinned_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self._disk_dir, key[:2], f"{key}.npy")
+
+    async def get(self, key: str) -> Optional[np.ndarray]:
+        """
+        ベクトルを取得（pinned → メモリ → ディスクの順に探す）
+
+        Args:
+            key: 内容ハッシュ
+
+        Returns:
+            ベクトル、見つからない場合はNone
+        """
+        vector = self._pinned.get(key)
+        if vector is not None:
+            self.pinned_hits += 1
+            return vector
+
+        vector = self._memory.get(key)
+        if vector is not None:
+            return vector
+
+        if self._disk_dir is not None:
+            vector = await asyncio.to_thread(self._load_disk, key)
+            if vector is not None:
+                self._memory.set(key, vector)
+                self.disk_hits += 1
+                return vector
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, vector: np.ndarray, pin: bool = False) -> None:
+        """
+        ベクトルを保存（ディスク層があれば書き込む）
+
+        Args:
+            key: 内容ハッシュ
+            vector: ベクトル
+            pin: Trueの場合はメモリ層から削除されないように保持する
+        """
+        vector = np.asarray(vector, dtype=np.float32)
+        if pin:
+            with self._pinned_lock:
+                self._pinned[key] = vector
+        else:
+            self._memory.set(key, vector)
+
+        if self._disk_dir is not None:
+            await asyncio.to_thread(self._save_disk, key, vector)
+
+    def _load_disk(self, key: str) -> Optional[np.ndarray]:
+        """ディスク層から読み込む（同期処理、なければNone）"""
+        path = self._disk_path(key)
+        try:
+            return np.load(path, allow_pickle=False)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"埋め込みキャッシュ読み込みエラー ({path}): {e}")
+            return None
+
+    def _save_disk(self, key: str, vector: np.ndarray) -> None:
+        """ディスク層に書き込む（同期処理、既にある場合は何もしない）"""
+        path = self._disk_path(key)
+        if os.path.exists(path):
+            return
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with atomic_temp_path(path) as temp_path:
+                with open(temp_path, "wb") as f:
+                    np.save(f, vector)
+        except Exception as e:
+            print(f"埋め込みキャッシュ書き込みエラー ({path}): {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        キャッシュの統計
+
+        Returns:
+            層ごとのヒット数・件数
+        """
+        return {
+            "pinned": len(self._pinned),
+            "pinned_hits": self.pinned_hits,
+            "memory": self._memory.stats(),
+            "disk_enabled": self._disk_dir is not None,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses
+        }
@@ -0,0 +1,236 @@
+import os
+import weakref
+import numpy as np
+from dataclasses import dataclass, field
+from typing import Any, BinaryIO, Dict, Iterable, Optional, Tuple
+from infrastructures.quantized_matrix import QuantizedMatrix, quantize_matrix
+
+
+# 旧形式（pickle化された辞書）から変換した埋め込みテーブルの拡張子
+TABLE_SUFFIX = ".table.npz"
+
+
+def table_filename(feature_filename: str) -> str:
+    """
+    旧形式の特徴量ファイル名から埋め込みテーブルのファイル名を生成
+
+    Args:
+        feature_filename: 旧形式のファイル名 (例: "vit.npy")
+
+    Returns:
+        テーブル形式のファイル名 (例: "vit.table.npz")
+    """
+    stem = feature_filename[:-4] if feature_filename.endswith(".npy") else feature_filename
+    return f"{stem}{TABLE_SUFFIX}"
+
+
+def l2_normalize(matrix: np.ndarray) -> np.ndarray:
+    """
+    行ごとにL2正規化する（ノルム0の行はそのまま0ベクトル）
+
+    Args:
+        matrix: (N, D) の行列
+
+    Returns:
+        正規化済みの (N, D) float32 行列
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+
+@dataclass
+class EmbeddingTable:
+    """
+    (N, D) float32 の埋め込み行列と ID→行番号 のインデックス
+
+    matrixは読み込み時に行ごとにL2正規化済みのため、
+    クエリとの内積をクエリのノルムで割るだけでコサイン類似度になる
+    """
+    matrix: np.ndarray
+    ids: np.ndarray
+    index: Dict[str, int]
+    _quantized: Dict[str, QuantizedMatrix] = field(default_factory=dict, repr=False, compare=False)
+    # メモリマップ元の (ファイルディスクリプタ, 行列データの先頭オフセット)
+    _matrix_file: Optional[Tuple[int, int]] = field(default=None, repr=False, compare=False)
+
+    @classmethod
+    def from_arrays(cls, matrix: np.ndarray, ids: np.ndarray, normalized: bool = False) -> "EmbeddingTable":
+        """
+        行列とID配列からテーブルを構築（行列はL2正規化される）
+
+        Args:
+            matrix: (N, D) の埋め込み行列
+            ids: (N,) のID配列
+            normalized: 正規化済みの行列を渡す場合True（メモリマップをコピーせずそのまま保持する）
+
+        Returns:
+            EmbeddingTable
+        """
+        matrix = np.asarray(matrix, dtype=np.float32)
+        ids = np.asarray(ids)
+        if ids.dtype.kind != "U":
+            ids = ids.astype(str)
+
+        if matrix.ndim != 2 or matrix.shape[0] != ids.shape[0]:
+            raise ValueError(f"行列とIDの形状が一致しません: {matrix.shape}, {ids.shape}")
+
+        # カタログ側の正規化は読み込み時に一度だけ行う
+        if not normalized:
+            matrix = np.ascontiguousarray(l2_normalize(matrix))
+
+        index = {label_id: row for row, label_id in enumerate(ids.tolist())}
+        return cls(matrix=matrix, ids=ids, index=index)
+
+    @classmethod
+    def from_feature_dict(cls, features: Dict[Any, np.ndarray]) -> "EmbeddingTable":
+        """
+        旧形式の {id: ベクトル} 辞書からテーブルを構築
+
+        Args:
+            features: IDをキー、1次元ベクトルを値とする辞書
+
+        Returns:
+            EmbeddingTable
+        """
+        ids = [str(label_id) for label_id in features.keys()]
+        if not ids:
+            return cls.from_arrays(np.zeros((0, 0), dtype=np.float32), np.array([], dtype=str))
+
+        matrix = np.stack([np.asarray(vector, dtype=np.float32).reshape(-1) for vector in features.values()])
+        return cls.from_arrays(matrix, np.array(ids))
+
+    def __len__(self) -> int:
+        return self.matrix.shape[0]
+
+    @property
+    def dim(self) -> int:
+        """ベクトルの次元数"""
+        return self.matrix.shape[1]
+
+    def quantized(self, mode: str) -> QuantizedMatrix:
+        """
+        圧縮した行列を取得
+
+        展開済みキャッシュから開いたテーブルは、キャッシュに保存した圧縮行列（メモリマップ）を使う。
+        それ以外のテーブルは初回のみ作成し、以降は使い回す
+
+        Args:
+            mode: "int8"
+
+        Returns:
+            QuantizedMatrix
+        """
+        quantized = self._quantized.get(mode)
+        if quantized is None:
+            quantized = quantize_matrix(self.matrix, mode)
+            self._quantized[mode] = quantized
+        return quantized
+
+    def read_rows(self, rows: np.ndarray) -> np.ndarray:
+        """
+        指定行をfloat32で取得
+
+        メモリマップで開いたテーブルはファイルから行ごとに直接読み出す。
+        メモリマップ経由で触れると周辺のページもまとめてプロセスに載るため、
+        圧縮エンジンの再計算（少数の行だけ読む）でfloat32行列全体が常駐しないようにする
+
+        Args:
+            rows: 行番号の配列
+
+        Returns:
+            (len(rows), D) float32 行列
+        """
+        if self._matrix_file is None:
+            return np.asarray(self.matrix[rows])
+
+        fd, offset = self._matrix_file
+        row_bytes = self.dim * 4
+        result = np.empty((len(rows), self.dim), dtype=np.float32)
+        buffer = memoryview(result).cast("B")
+        for i, row in enumerate(np.asarray(rows).tolist()):
+            os.preadv(fd, [buffer[i * row_bytes:(i + 1) * row_bytes]], offset + row * row_bytes)
+        return result
+
+    def lookup_rows(self, label_ids: Iterable[Any]) -> np.ndarray:
+        """
+        IDリストと同じ順序・長さの行番号配列を取得（存在しないIDは-1）
+
+        Args:
+            label_ids: IDのリスト
+
+        Returns:
+            行番号の配列
+        """
+        index = self.index
+        return np.fromiter((index.get(str(label_id), -1) for label_id in label_ids), dtype=np.intp)
+
+
+def save_embedding_table(table: EmbeddingTable, path: str) -> None:
+    """
+    埋め込みテーブルを.npz形式で保存（pickleを使わない）
+
+    Args:
+        table: 保存するテーブル
+        path: 保存先パス
+    """
+    with open(path, "wb") as f:
+        np.savez(f, matrix=table.matrix, ids=table.ids)
+
+
+def load_embedding_table(source: Any) -> EmbeddingTable:
+    """
+    .npz形式の埋め込みテーブルを読み込み
+
+    Args:
+        source: ファイルパスまたはファイルライクオブジェクト
+
+    Returns:
+        EmbeddingTable
+    """
+    with np.load(source, allow_pickle=False) as data:
+        return EmbeddingTable.from_arrays(data["matrix"], data["ids"])
+
+
+def save_table_arrays(table: EmbeddingTable, matrix_file: BinaryIO, ids_file: BinaryIO) -> None:
+    """
+    正規化済みの行列とID配列をそれぞれ生の.npyとして書き出す（メモリマップ用）
+
+    Args:
+        table: 保存するテーブル
+        matrix_file: 行列の書き込み先
+        ids_file: ID配列の書き込み先
+    """
+    np.save(matrix_file, table.matrix, allow_pickle=False)
+    np.save(ids_file, table.ids, allow_pickle=False)
+
+
+def open_table_mmap(
+    matrix_path: str,
+    ids_path: str,
+    quantized: Optional[Dict[str, QuantizedMatrix]] = None
+) -> EmbeddingTable:
+    """
+    save_table_arraysで書き出した.npyをメモリマップで開く
+
+    行列はページキャッシュ上の1コピーを複数ワーカーで共有する
+
+    Args:
+        matrix_path: 行列の.npyパス
+        ids_path: ID配列の.npyパス
+        quantized: 同じくメモリマップで開いた圧縮行列（圧縮形式 → QuantizedMatrix）
+
+    Returns:
+        EmbeddingTable
+    """
+    matrix = np.load(matrix_path, mmap_mode="r", allow_pickle=False)
+    ids = np.load(ids_path, mmap_mode="r", allow_pickle=False)
+    table = EmbeddingTable.from_arrays(matrix, ids, normalized=True)
+    if quantized:
+        table._quantized.update(quantized)
+
+    # 少数の行を読むためのファイルディスクリプタ（テーブルの破棄時に閉じる）
+    fd = os.open(matrix_path, os.O_RDONLY)
+    weakref.finalize(table, os.close, fd)
+    table._matrix_file = (fd, matrix.offset)
+    return table
@@ -0,0 +1,202 @@
+import asyncio
+import glob
+import os
+import tempfile
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Iterator, Optional, Tuple
+from filelock import FileLock, Timeout
+from infrastructures.embedding_table import EmbeddingTable, load_embedding_table, open_table_mmap, save_table_arrays
+from infrastructures.quantized_matrix import QUANTIZATION_MODES, open_quantized_mmap, quantize_matrix, save_quantized_arrays
+
+# 埋め込みテーブルを展開するローカルキャッシュディレクトリ（同一インスタンスの全ワーカーで共有）
+FEATURE_CACHE_DIR = os.environ.get("FEATURE_CACHE_DIR", "/tmp/kankodori_features")
+
+# 他ワーカーのダウンロード完了を待つ最大秒数
+FEATURE_CACHE_LOCK_TIMEOUT = float(os.environ.get("FEATURE_CACHE_LOCK_TIMEOUT", "600"))
+
+# ファイルロックが空くのを確認する間隔（秒）
+FILE_LOCK_POLL_SECONDS = float(os.environ.get("FILE_LOCK_POLL_SECONDS", "0.05"))
+
+
+@contextmanager
+def temporary_path(directory: str, suffix: str = "") -> Iterator[str]:
+    """
+    directory内に一意な一時ファイルを作り、終了時に削除する
+
+    Args:
+        directory: 作成先ディレクトリ
+        suffix: ファイル名の末尾
+
+    Yields:
+        一時ファイルパス
+    """
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=suffix)
+    os.close(fd)
+    try:
+        yield temp_path
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+@contextmanager
+def atomic_temp_path(final_path: str) -> Iterator[str]:
+    """
+    final_pathと同じディレクトリに一意な一時ファイルを作り、成功時のみrenameで置き換える
+
+    途中で失敗した場合は一時ファイルを削除するため、final_pathに書きかけのファイルが見えることはない
+
+    Args:
+        final_path: 最終的なファイルパス
+
+    Yields:
+        書き込み先の一時ファイルパス
+    """
+    directory = os.path.dirname(final_path) or "."
+    with temporary_path(directory, suffix=os.path.basename(final_path)) as temp_path:
+        yield temp_path
+        os.replace(temp_path, final_path)
+
+
+def _cache_stem(filename: str, generation: Optional[str]) -> str:
+    """キャッシュファイル名の共通部分（世代ごとに別ファイルにする）"""
+    return os.path.join(FEATURE_CACHE_DIR, f"{filename}.{generation or 'latest'}")
+
+
+def cached_table_paths(filename: str, generation: Optional[str]) -> Tuple[str, str]:
+    """
+    展開済みテーブルの (行列, ID配列) パスを取得
+
+    Args:
+        filename: テーブルファイル名 (例: "vit.table.npz")
+        generation: Storage上の世代
+
+    Returns:
+        (行列の.npyパス, ID配列の.npyパス)
+    """
+    stem = _cache_stem(filename, generation)
+    return f"{stem}.matrix.npy", f"{stem}.ids.npy"
+
+
+def cached_quantized_paths(filename: str, generation: Optional[str], mode: str) -> Tuple[str, str]:
+    """
+    展開済みの圧縮行列の (圧縮行列, スケール) パスを取得
+
+    Args:
+        filename: テーブルファイル名
+        generation: Storage上の世代
+        mode: 圧縮形式
+
+    Returns:
+        (圧縮行列の.npyパス, スケールの.npyパス)
+    """
+    stem = _cache_stem(filename, generation)
+    return f"{stem}.{mode}.npy", f"{stem}.{mode}.scales.npy"
+
+
+def open_cached_table(filename: str, generation: Optional[str]) -> Optional[EmbeddingTable]:
+    """
+    展開済みのテーブルがあればメモリマップで開く（圧縮行列もメモリマップで付ける）
+
+    Args:
+        filename: テーブルファイル名
+        generation: Storage上の世代
+
+    Returns:
+        EmbeddingTable、キャッシュがない（圧縮行列のない古い展開を含む）場合はNone
+    """
+    matrix_path, ids_path = cached_table_paths(filename, generation)
+    quantized_paths = {mode: cached_quantized_paths(filename, generation, mode) for mode in QUANTIZATION_MODES}
+    required = [matrix_path, ids_path] + [path for paths in quantized_paths.values() for path in paths]
+    if not all(os.path.exists(path) for path in required):
+        return None
+
+    quantized = {mode: open_quantized_mmap(mode, *paths) for mode, paths in quantized_paths.items()}
+    return open_table_mmap(matrix_path, ids_path, quantized)
+
+
+def cache_lock(filename: str, generation: Optional[str]) -> FileLock:
+    """
+    同じテーブルを複数ワーカーが同時にダウンロードしないためのロック
+
+    コルーチンからは hold_file_lock で取得・解放する
+    """
+    os.makedirs(FEATURE_CACHE_DIR, exist_ok=True)
+    return FileLock(f"{_cache_stem(filename, generation)}.lock", timeout=FEATURE_CACHE_LOCK_TIMEOUT, thread_local=False)
+
+
+@asynccontextmanager
+async def hold_file_lock(lock: FileLock, timeout: Optional[float] = None) -> AsyncIterator[None]:
+    """
+    ファイルロックをイベントループを止めずに取得し、終了時に解放する
+
+    ノンブロッキングの取得とasyncio.sleepを繰り返して待つため、
+    待機中にキャンセルされても後からロックが取得されて残ることはない
+
+    Args:
+        lock: 取得するロック
+        timeout: 待つ最大秒数（省略時はロックに設定したタイムアウト）
+
+    Raises:
+        filelock.Timeout: timeout秒以内に取得できなかった場合
+    """
+    timeout = lock.timeout if timeout is None else timeout
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            lock.acquire(timeout=0)
+            break
+        except Timeout:
+            if timeout >= 0 and time.monotonic() >= deadline:
+                raise
+            await asyncio.sleep(FILE_LOCK_POLL_SECONDS)
+
+    try:
+        yield
+    finally:
+        lock.release()
+
+
+def expand_table(npz_path: str, filename: str, generation: Optional[str]) -> None:
+    """
+    ダウンロードした.npzを正規化済みの生.npyに展開し、アトミックに配置する
+
+    圧縮行列（QUANTIZATION_MODES）もここで作って保存し、各ワーカーはメモリマップで共有する。
+    圧縮行列・ID配列→行列の順にrenameするため、行列が見えた時点で他のファイルも揃っている
+
+    Args:
+        npz_path: ダウンロードした.table.npzのパス
+        filename: テーブルファイル名
+        generation: Storage上の世代
+    """
+    table = load_embedding_table(npz_path)
+    matrix_path, ids_path = cached_table_paths(filename, generation)
+
+    with atomic_temp_path(matrix_path) as matrix_temp, atomic_temp_path(ids_path) as ids_temp:
+        for mode in QUANTIZATION_MODES:
+            data_path, scales_path = cached_quantized_paths(filename, generation, mode)
+            with atomic_temp_path(data_path) as data_temp, atomic_temp_path(scales_path) as scales_temp:
+                with open(data_temp, "wb") as data_file, open(scales_temp, "wb") as scales_file:
+                    save_quantized_arrays(quantize_matrix(table.matrix, mode), data_file, scales_file)
+
+        with open(matrix_temp, "wb") as matrix_file, open(ids_temp, "wb") as ids_file:
+            save_table_arrays(table, matrix_file, ids_file)
+
+    remove_stale_generations(filename, generation)
+
+
+def remove_stale_generations(filename: str, generation: Optional[str]) -> None:
+    """
+    古い世代の展開済みファイルを削除
+
+    他ワーカーがメモリマップ中でも、unlink後もマップは有効なまま残る
+    """
+    current = _cache_stem(filename, generation)
+    for path in glob.glob(os.path.join(FEATURE_CACHE_DIR, f"{glob.escape(filename)}.*.npy")):
+        if not path.startswith(f"{current}."):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
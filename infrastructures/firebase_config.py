@@ -1,3 +1,4 @@
+import asyncio
 import firebase_admin
 from firebase_admin import credentials, storage, auth
 import os
@@ -68,13 +69,58 @@ async def download_storage(storage_path: str, local_path: str) -> bool:
         blob = bucket.blob(storage_path)
 
         os.makedirs(os.path.dirname(local_path), exist_ok=True)
-        blob.download_to_filename(local_path)
+        # SDKは同期APIのため別スレッドで実行（イベントループを止めない）
+        await asyncio.to_thread(blob.download_to_filename, local_path)
 
         return True
     except Exception as e:
         print(f"ダウンロードエラー: {e}")
         return False
 
+async def download_storage_bytes(storage_path: str) -> Optional[bytes]:
+    """
+    Firebase Storageからファイルをメモリ上に直接ダウンロード
+
+    Args:
+        storage_path: Storageでのパス
+
+    Returns:
+        ファイルのバイトデータ、失敗時はNone
+    """
+    try:
+        initialize_firebase()
+        bucket = storage.bucket()
+        blob = bucket.blob(storage_path)
+
+        return await asyncio.to_thread(blob.download_as_bytes)
+    except Exception as e:
+        print(f"ダウンロードエラー: {e}")
+        return None
+
+async def get_storage_generation(storage_path: str) -> Optional[str]:
+    """
+    Firebase Storage上のファイルの世代（generation/etag）を取得
+
+    Args:
+        storage_path: Storageでのパス
+
+    Returns:
+        世代を表す文字列、存在しない・取得失敗時はNone
+    """
+    try:
+        initialize_firebase()
+        bucket = storage.bucket()
+        blob = await asyncio.to_thread(bucket.get_blob, storage_path)
+        if blob is None:
+            return None
+
+        if blob.generation is not None:
+            return str(blob.generation)
+        return blob.etag
+    except Exception as e:
+        print(f"世代取得エラー ({storage_path}): {e}")
+        return None
+
 async def get_image_url(storage_path: str) -> Optional[str]:
     """
     Firebase Storageの画像公開URLを取得
@@ -128,6 +174,22 @@ async def upload_pil_image_to_storage(image: Image.Image, storage_path: str) ->
         print(f"PIL画像アップロードエラー: {e}")
         return None
 
+def _decode_id_token(request: Request) -> dict:
+    """AuthorizationヘッダのFirebase IDトークンを検証してクレームを返す（失敗時は401）"""
+    initialize_firebase()
+
+    auth_header = request.headers.get('authorization')
+    if not auth_header or not auth_header.startswith('Bearer '):
+        raise HTTPException(status_code=401, detail="Authorization header missing or invalid")
+
+    token = auth_header.split('Bearer ')[1]
+    try:
+        return auth.verify_id_token(token)
+    except Exception as e:
+        print(f"Token verification failed: {e}")
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+
 async def verify_firebase_token(request: Request) -> str:
     """
     Firebase IDトークンを検証してUIDを返す
@@ -138,17 +200,22 @@ async def verify_firebase_token(request: Request) -> str:
     Raises:
         HTTPException: 認証失敗時
     """
+    return _decode_id_token(request)['uid']
 
-    initialize_firebase()
 
-    auth_header = request.headers.get('authorization')
-    if not auth_header or not auth_header.startswith('Bearer '):
-        raise HTTPException(status_code=401, detail="Authorization header missing or invalid")
+async def verify_admin_token(request: Request) -> str:
+    """
+    Firebase IDトークンを検証し、管理者（カスタムクレーム admin=true）であればUIDを返す
 
-    token = auth_header.split('Bearer ')[1]
-    try:
-        decoded_token = auth.verify_id_token(token)
-        return decoded_token['uid']
-    except Exception as e:
-        print(f"Token verification failed: {e}")
-        raise HTTPException(status_code=401, detail="Invalid token")
+    運用向けのエンドポイント（内部統計・失敗した処理の再実行）はアプリの一般ユーザーには公開しない
+
+    Returns:
+        管理者のUID
+
+    Raises:
+        HTTPException: 認証失敗時は401、管理者でない場合は403
+    """
+    decoded_token = _decode_id_token(request)
+    if decoded_token.get('admin') is not True:
+        raise HTTPException(status_code=403, detail="Admin privileges required")
+    return decoded_token['uid']
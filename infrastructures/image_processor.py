@@ -1,10 +1,19 @@
 import torch
 from PIL import Image
 import io
-from typing import Optional
+from typing import Optional, Dict, Any
 from fastapi import UploadFile
 from .blip_client import initialize_blip_model, get_blip_model
 
+# キャプション生成のデコード設定（品質の高い順）
+CAPTION_PROFILES: Dict[str, Dict[str, Any]] = {
+    "quality": {"max_length": 50, "num_beams": 5},   # 従来の設定
+    "balanced": {"max_length": 30, "num_beams": 2},
+    "fast": {"max_length": 20, "num_beams": 1},      # greedy
+}
+
+DEFAULT_CAPTION_PROFILE = "quality"
+
 
 class ImageProcessor:
     """画像処理を行うインフラ層クラス"""
@@ -22,8 +31,7 @@ class ImageProcessor:
         """
         try:
             image_content = await image.read()
-            pil_image = Image.open(io.BytesIO(image_content)).convert("RGB")
-            return pil_image
+            return ImageProcessor.open_image(image_content)
         except Exception as e:
             print(f"画像処理エラー: {str(e)}")
             return None
@@ -31,17 +39,33 @@ class ImageProcessor:
             await image.seek(0)
 
     @staticmethod
-    def generate_text_from_image(pil_image: Image.Image) -> Optional[str]:
+    def open_image(image_data: bytes) -> Image.Image:
+        """
+        画像のバイトデータをRGBのPIL Imageに変換
+
+        Args:
+            image_data: 画像のバイトデータ
+
+        Returns:
+            PIL Image オブジェクト
+        """
+        return Image.open(io.BytesIO(image_data)).convert("RGB")
+
+    @staticmethod
+    def generate_text_from_image(pil_image: Image.Image, profile: str = DEFAULT_CAPTION_PROFILE) -> Optional[str]:
         """
         PIL ImageからBLIPモデルを使用してテキストを生成
 
         Args:
             pil_image: PIL Image オブジェクト
+            profile: デコード設定（CAPTION_PROFILESのキー）
 
         Returns:
             生成されたテキスト（英語）
         """
         try:
+            decoding = CAPTION_PROFILES[profile]
+
             # モデル初期化と取得
             initialize_blip_model()
             processor, model = get_blip_model()
@@ -55,7 +79,7 @@ class ImageProcessor:
 
             # モデルでテキスト生成
             with torch.no_grad():
-                output = model.generate(**inputs, max_length=50, num_beams=5)
+                output = model.generate(**inputs, **decoding)
 
             # テキストデコード
             generated_text = processor.decode(output[0], skip_special_tokens=True)
@@ -0,0 +1,149 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+# 推論用ワーカースレッド数（同時に実行するモデル呼び出しの上限）
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", "2"))
+
+# ワーカー1つあたりのtorch intra-opスレッド数（0の場合はCPU数をワーカー数で割った値）
+INFERENCE_TORCH_THREADS = int(os.environ.get("INFERENCE_TORCH_THREADS", "0"))
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+# 統計（/metrics で公開）
+_stats_lock = threading.Lock()
+_queued = 0
+_running = 0
+_stats: Dict[str, Dict[str, float]] = {}
+
+
+def _torch_threads() -> int:
+    """ワーカー1つあたりのtorchスレッド数"""
+    if INFERENCE_TORCH_THREADS > 0:
+        return INFERENCE_TORCH_THREADS
+    return max(1, (os.cpu_count() or 1) // max(1, INFERENCE_WORKERS))
+
+
+def _initialize_worker() -> None:
+    """ワーカースレッドの初期化（ワーカー同士でCPUを奪い合わないようtorchのスレッド数を制限）"""
+    try:
+        import torch
+        torch.set_num_threads(_torch_threads())
+    except ImportError:
+        pass
+
+
+def get_inference_executor() -> ThreadPoolExecutor:
+    """推論用スレッドプールのシングルトンインスタンスを取得"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=INFERENCE_WORKERS,
+                    thread_name_prefix="inference",
+                    initializer=_initialize_worker
+                )
+    return _executor
+
+
+def shutdown_inference_executor() -> None:
+    """推論用スレッドプールを停止（実行中の推論は完了を待つ）"""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _record(name: str, wait_ms: float, run_ms: float, failed: bool) -> None:
+    with _stats_lock:
+        stats = _stats.get(name)
+        if stats is None:
+            stats = _stats[name] = {
+                "completed": 0, "failed": 0,
+                "wait_ms_sum": 0.0, "wait_ms_max": 0.0,
+                "run_ms_sum": 0.0, "run_ms_max": 0.0
+            }
+        stats["failed" if failed else "completed"] += 1
+        stats["wait_ms_sum"] += wait_ms
+        stats["wait_ms_max"] = max(stats["wait_ms_max"], wait_ms)
+        stats["run_ms_sum"] += run_ms
+        stats["run_ms_max"] = max(stats["run_ms_max"], run_ms)
+
+
+async def run_inference(name: str, func: Callable[..., Any], *args: Any) -> Any:
+    """
+    モデル呼び出しを推論用スレッドプールで実行し、完了を待つ
+
+    イベントループを止めずに待機できるため、推論中も他のリクエストを処理できる
+
+    Args:
+        name: 統計上の名前（"sbert" / "vit" / "blip" など）
+        func: 実行する同期関数
+        *args: funcの引数
+
+    Returns:
+        funcの戻り値
+    """
+    global _queued
+
+    enqueued_at = time.perf_counter()
+    with _stats_lock:
+        _queued += 1
+
+    def task():
+        global _queued, _running
+        started_at = time.perf_counter()
+        with _stats_lock:
+            _queued -= 1
+            _running += 1
+        failed = True
+        try:
+            result = func(*args)
+            failed = False
+            return result
+        finally:
+            finished_at = time.perf_counter()
+            with _stats_lock:
+                _running -= 1
+            _record(name, (started_at - enqueued_at) * 1000, (finished_at - started_at) * 1000, failed)
+
+    loop = asyncio.get_running_loop()
+    try:
+        future = loop.run_in_executor(get_inference_executor(), task)
+    except RuntimeError:
+        # 停止済みのプールに投入された場合（終了処理中）はキュー数を戻す
+        with _stats_lock:
+            _queued -= 1
+        raise
+    return await future
+
+
+def get_inference_stats() -> Dict[str, Any]:
+    """
+    推論用スレッドプールの統計
+
+    Returns:
+        workers / torch_threads / queued（待機中）/ running（実行中）と、名前ごとの件数・待ち時間・実行時間
+    """
+    with _stats_lock:
+        per_model = {}
+        for name, stats in _stats.items():
+            count = stats["completed"] + stats["failed"]
+            per_model[name] = {
+                **stats,
+                "wait_ms_avg": stats["wait_ms_sum"] / count if count else 0.0,
+                "run_ms_avg": stats["run_ms_sum"] / count if count else 0.0
+            }
+        return {
+            "workers": INFERENCE_WORKERS,
+            "torch_threads": _torch_threads(),
+            "queued": _queued,
+            "running": _running,
+            "models": per_model
+        }
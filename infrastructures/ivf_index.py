@@ -0,0 +1,200 @@
+import hashlib
+import numpy as np
+from dataclasses import dataclass
+from typing import Any, Optional
+
+# 近似近傍インデックスの拡張子（埋め込みテーブルと同じディレクトリに置く）
+IVF_SUFFIX = ".ivf.npz"
+
+# 割り当て計算を一度に行う行数
+_ASSIGN_CHUNK_ROWS = 16384
+
+
+def ivf_filename(feature_filename: str) -> str:
+    """
+    旧形式の特徴量ファイル名からインデックスのファイル名を生成
+
+    Args:
+        feature_filename: 旧形式のファイル名 (例: "vit.npy")
+
+    Returns:
+        インデックスのファイル名 (例: "vit.ivf.npz")
+    """
+    stem = feature_filename[:-4] if feature_filename.endswith(".npy") else feature_filename
+    return f"{stem}{IVF_SUFFIX}"
+
+
+def ids_fingerprint(ids: np.ndarray) -> str:
+    """ID配列の指紋（インデックスとテーブルの行が対応しているか確認する）"""
+    digest = hashlib.sha256()
+    for label_id in np.asarray(ids).tolist():
+        digest.update(str(label_id).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _assign(matrix: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """各行を最も近い（内積が最大の）セントロイドに割り当てる"""
+    assignments = np.empty(matrix.shape[0], dtype=np.int32)
+    for start in range(0, matrix.shape[0], _ASSIGN_CHUNK_ROWS):
+        chunk = np.asarray(matrix[start:start + _ASSIGN_CHUNK_ROWS], dtype=np.float32)
+        assignments[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+    return assignments
+
+
+@dataclass
+class IVFIndex:
+    """
+    IVF-Flat 近似近傍インデックス（numpy実装）
+
+    L2正規化済みの行列を球面k-meansでクラスタに分け、クラスタごとの行番号リストを保持する。
+    検索時はクエリに近いクラスタだけを走査し、その行をfloat32で正確にスコアリングする
+    """
+    centroids: np.ndarray
+    list_offsets: np.ndarray
+    list_rows: np.ndarray
+    fingerprint: str
+
+    @property
+    def num_lists(self) -> int:
+        return self.centroids.shape[0]
+
+    def matches(self, ids: np.ndarray) -> bool:
+        """このインデックスが指定IDのテーブルから作られたものか"""
+        return len(self.list_rows) == len(ids) and self.fingerprint == ids_fingerprint(ids)
+
+    def candidate_rows(
+        self,
+        query: np.ndarray,
+        nprobe: int,
+        min_candidates: int = 0,
+        allowed: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """
+        クエリに近いクラスタの行番号を集める
+
+        Args:
+            query: L2正規化済みのクエリベクトル
+            nprobe: 走査するクラスタ数
+            min_candidates: nprobe走査後も候補がこの数に満たない場合は追加で走査する
+            allowed: 行ごとの許可マスク（地名フィルタ等の候補制限、Noneの場合は全行）
+
+        Returns:
+            候補の行番号配列
+        """
+        probe_order = np.argsort(-(self.centroids @ query))
+        collected = []
+        count = 0
+        for probed, list_id in enumerate(probe_order):
+            if probed >= nprobe and count >= min_candidates:
+                break
+            members = self.list_rows[self.list_offsets[list_id]:self.list_offsets[list_id + 1]]
+            if allowed is not None:
+                members = members[allowed[members]]
+            if len(members):
+                collected.append(members)
+                count += len(members)
+
+        if not collected:
+            return np.array([], dtype=np.intp)
+        return np.concatenate(collected).astype(np.intp, copy=False)
+
+
+def build_ivf_index(
+    matrix: np.ndarray,
+    ids: np.ndarray,
+    num_lists: Optional[int] = None,
+    iterations: int = 10,
+    sample_size: int = 100000,
+    seed: int = 0
+) -> IVFIndex:
+    """
+    L2正規化済みの行列から IVF-Flat インデックスを構築（オフライン処理）
+
+    Args:
+        matrix: (N, D) L2正規化済み行列
+        ids: (N,) ID配列
+        num_lists: クラスタ数（省略時は 4*sqrt(N)）
+        iterations: k-meansの反復回数
+        sample_size: セントロイド学習に使う最大行数
+        seed: 乱数シード
+
+    Returns:
+        IVFIndex
+    """
+    num_rows = matrix.shape[0]
+    if num_rows == 0:
+        raise ValueError("空の行列からはインデックスを構築できません")
+    if num_lists is None:
+        num_lists = max(1, int(4 * np.sqrt(num_rows)))
+
+    rng = np.random.default_rng(seed)
+    sample_rows = rng.choice(num_rows, size=min(sample_size, num_rows), replace=False)
+    sample = np.asarray(matrix[np.sort(sample_rows)], dtype=np.float32)
+    num_lists = min(num_lists, len(sample))
+    centroids = sample[rng.choice(len(sample), size=num_lists, replace=False)].copy()
+
+    # 球面k-means（内積最大のセントロイドに割り当て、平均を正規化）
+    for _ in range(iterations):
+        assignments = _assign(sample, centroids)
+        order = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments, minlength=num_lists)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        sums = np.zeros_like(centroids)
+        non_empty = counts > 0
+        sums[non_empty] = np.add.reduceat(sample[order], starts[non_empty], axis=0)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        empty = norms[:, 0] == 0
+        # 空クラスタはランダムな行で埋め直す
+        sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()), replace=True)]
+        norms[empty] = 1.0
+        centroids = (sums / norms).astype(np.float32)
+
+    assignments = _assign(matrix, centroids)
+    list_rows = np.argsort(assignments, kind="stable").astype(np.int32)
+    counts = np.bincount(assignments, minlength=num_lists)
+    list_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+    return IVFIndex(
+        centroids=centroids,
+        list_offsets=list_offsets,
+        list_rows=list_rows,
+        fingerprint=ids_fingerprint(ids)
+    )
+
+
+def save_ivf_index(index: IVFIndex, path: str) -> None:
+    """
+    インデックスを.npz形式で保存（pickleを使わない）
+
+    Args:
+        index: 保存するインデックス
+        path: 保存先パス
+    """
+    with open(path, "wb") as f:
+        np.savez(
+            f,
+            centroids=index.centroids,
+            list_offsets=index.list_offsets,
+            list_rows=index.list_rows,
+            fingerprint=np.array(index.fingerprint)
+        )
+
+
+def load_ivf_index(source: Any) -> IVFIndex:
+    """
+    .npz形式のインデックスを読み込み
+
+    Args:
+        source: ファイルパスまたはファイルライクオブジェクト
+
+    Returns:
+        IVFIndex
+    """
+    with np.load(source, allow_pickle=False) as data:
+        return IVFIndex(
+            centroids=data["centroids"].astype(np.float32),
+            list_offsets=data["list_offsets"],
+            list_rows=data["list_rows"],
+            fingerprint=str(data["fingerprint"])
+        )
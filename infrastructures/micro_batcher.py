@@ -0,0 +1,152 @@
+import asyncio
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from infrastructures.inference_executor import run_inference
+
+# 1回の推論にまとめる最大件数
+INFERENCE_MAX_BATCH_SIZE = int(os.environ.get("INFERENCE_MAX_BATCH_SIZE", "16"))
+
+# 最初のリクエストから推論を開始するまでの最大待ち時間（ミリ秒）
+INFERENCE_MAX_WAIT_MS = float(os.environ.get("INFERENCE_MAX_WAIT_MS", "5"))
+
+# 作成済みのバッチャー（統計の公開用）
+_batchers: Dict[str, "MicroBatcher"] = {}
+_batchers_lock = threading.Lock()
+
+
+class MicroBatcher:
+    """
+    同時に届いた推論リクエストをまとめて1回のモデル呼び出しで処理する非同期バッチャー
+
+    最大 max_batch_size 件、または最初のリクエストから max_wait_ms 経過した時点で
+    batch_func(items) を推論用スレッドプールで実行し、結果をそれぞれの呼び出し元に返す
+    """
+
+    def __init__(
+        self,
+        name: str,
+        batch_func: Callable[[List[Any]], List[Any]],
+        max_batch_size: Optional[int] = None,
+        max_wait_ms: Optional[float] = None
+    ):
+        """
+        Args:
+            name: 統計上の名前
+            batch_func: 入力リストを受け取り、同じ長さ・順序の結果リストを返す同期関数
+            max_batch_size: 最大バッチサイズ（省略時はINFERENCE_MAX_BATCH_SIZE）
+            max_wait_ms: 最大待ち時間（省略時はINFERENCE_MAX_WAIT_MS）
+        """
+        self.name = name
+        self.batch_func = batch_func
+        self.max_batch_size = max(1, max_batch_size or INFERENCE_MAX_BATCH_SIZE)
+        self.max_wait_ms = INFERENCE_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms
+
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+
+        self._batches = 0
+        self._items = 0
+        self._max_batch = 0
+        self._batch_sizes: Dict[int, int] = {}
+
+        with _batchers_lock:
+            _batchers[name] = self
+
+    async def submit(self, item: Any) -> Any:
+        """
+        1件を投入し、バッチ推論の結果を待つ
+
+        Args:
+            item: batch_funcに渡す入力1件
+
+        Returns:
+            itemに対応する結果
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_ms / 1000, self._flush)
+
+        return await future
+
+    def _flush(self) -> None:
+        """待機中のリクエストをバッチに切り出して推論を開始"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while self._pending:
+            batch = self._pending[:self.max_batch_size]
+            del self._pending[:self.max_batch_size]
+            # 待機中にキャンセルされたリクエストは推論しない
+            batch = [(item, future) for item, future in batch if not future.done()]
+            if not batch:
+                continue
+            task = asyncio.ensure_future(self._run_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+            # 残りが最大件数に満たない場合は次のリクエストを待つ
+            if len(self._pending) < self.max_batch_size:
+                break
+
+        if self._pending and self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait_ms / 1000, self._flush)
+
+    async def _run_batch(self, batch: List[Tuple[Any, asyncio.Future]]) -> None:
+        """1バッチ分の推論を実行し、結果を呼び出し元に配る"""
+        items = [item for item, _ in batch]
+        self._batches += 1
+        self._items += len(items)
+        self._max_batch = max(self._max_batch, len(items))
+        self._batch_sizes[len(items)] = self._batch_sizes.get(len(items), 0) + 1
+
+        try:
+            results = await run_inference(self.name, self.batch_func, items)
+            if len(results) != len(items):
+                raise RuntimeError(f"バッチ推論の結果数が一致しません ({len(results)} != {len(items)})")
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        バッチの統計
+
+        Returns:
+            設定値・実行バッチ数・平均/最大バッチサイズ・バッチサイズ分布
+        """
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "batches": self._batches,
+            "items": self._items,
+            "avg_batch_size": self._items / self._batches if self._batches else 0.0,
+            "max_observed_batch_size": self._max_batch,
+            "batch_sizes": dict(sorted(self._batch_sizes.items())),
+            "pending": len(self._pending)
+        }
+
+
+def get_batcher_stats() -> Dict[str, Any]:
+    """
+    作成済みの全バッチャーの統計
+
+    Returns:
+        名前ごとの統計
+    """
+    with _batchers_lock:
+        batchers = dict(_batchers)
+    return {name: batcher.stats() for name, batcher in batchers.items()}
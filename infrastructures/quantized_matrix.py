@@ -0,0 +1,113 @@
+import numpy as np
+from dataclasses import dataclass
+from typing import BinaryIO, Optional
+
+# 対応する圧縮形式
+# int8はメモリ優先の設定で、常駐するのは圧縮行列（float32の約1/4）だけになる代わりに
+# float32への変換分だけ全件計算より遅い（bench_quantized_similarity.py で約1.3倍）
+# （float16はnumpyに高速な半精度の行列積がなくfloat32全件計算より大幅に遅いため対象外）
+QUANTIZATION_MODES = ("int8",)
+
+# 一度にfloat32へ戻す行数（変換バッファがCPUキャッシュに収まる大きさ）
+_CHUNK_ROWS = 256
+
+
+@dataclass
+class QuantizedMatrix:
+    """
+    埋め込み行列の圧縮表現
+
+    - int8: 行ごとのスケールで [-127, 127] に量子化（メモリ約1/4）
+    """
+    mode: str
+    data: np.ndarray
+    scales: Optional[np.ndarray] = None
+
+    @property
+    def nbytes(self) -> int:
+        """保持しているバイト数"""
+        return self.data.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def dot(self, rows: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """
+        指定行とクエリの近似内積を計算
+
+        Args:
+            rows: 行番号の配列
+            query: float32のクエリベクトル
+
+        Returns:
+            rowsと同じ順序の近似内積
+        """
+        # 候補が多い場合は全行を連続領域のまま計算してから抜き出す
+        full_scan = len(rows) * 2 > self.data.shape[0]
+        total = self.data.shape[0] if full_scan else len(rows)
+
+        result = np.empty(total, dtype=np.float32)
+        buffer = np.empty((min(_CHUNK_ROWS, total), self.data.shape[1]), dtype=np.float32)
+        for start in range(0, total, _CHUNK_ROWS):
+            stop = min(start + _CHUNK_ROWS, total)
+            block = buffer[:stop - start]
+            block[...] = self.data[start:stop] if full_scan else self.data[rows[start:stop]]
+            np.matmul(block, query, out=result[start:stop])
+
+        if full_scan:
+            result = result[rows]
+        if self.scales is not None:
+            result *= self.scales[rows]
+        return result
+
+
+def quantize_matrix(matrix: np.ndarray, mode: str) -> QuantizedMatrix:
+    """
+    float32の埋め込み行列を圧縮する
+
+    Args:
+        matrix: (N, D) float32 行列
+        mode: "int8"
+
+    Returns:
+        QuantizedMatrix
+    """
+    if mode == "int8":
+        data = np.empty(matrix.shape, dtype=np.int8)
+        scales = np.empty(matrix.shape[0], dtype=np.float32)
+        for start in range(0, matrix.shape[0], _CHUNK_ROWS * 32):
+            chunk = np.asarray(matrix[start:start + _CHUNK_ROWS * 32], dtype=np.float32)
+            max_abs = np.abs(chunk).max(axis=1) if chunk.shape[1] > 0 else np.zeros(len(chunk), dtype=np.float32)
+            chunk_scales = np.where(max_abs > 0, max_abs / 127.0, 1.0).astype(np.float32)
+            data[start:start + len(chunk)] = np.clip(np.rint(chunk / chunk_scales[:, None]), -127, 127)
+            scales[start:start + len(chunk)] = chunk_scales
+        return QuantizedMatrix(mode=mode, data=data, scales=scales)
+
+    raise ValueError(f"未対応の圧縮形式です: {mode}")
+
+
+def save_quantized_arrays(quantized: QuantizedMatrix, data_file: BinaryIO, scales_file: BinaryIO) -> None:
+    """
+    圧縮行列とスケールをそれぞれ生の.npyとして書き出す（メモリマップ用）
+
+    Args:
+        quantized: 保存する圧縮行列
+        data_file: 圧縮行列の書き込み先
+        scales_file: 行ごとのスケールの書き込み先
+    """
+    np.save(data_file, quantized.data, allow_pickle=False)
+    np.save(scales_file, quantized.scales, allow_pickle=False)
+
+
+def open_quantized_mmap(mode: str, data_path: str, scales_path: str) -> QuantizedMatrix:
+    """
+    save_quantized_arraysで書き出した.npyをメモリマップで開く
+
+    Args:
+        mode: 圧縮形式
+        data_path: 圧縮行列の.npyパス
+        scales_path: スケールの.npyパス
+
+    Returns:
+        QuantizedMatrix
+    """
+    data = np.load(data_path, mmap_mode="r", allow_pickle=False)
+    scales = np.load(scales_path, mmap_mode="r", allow_pickle=False)
+    return QuantizedMatrix(mode=mode, data=data, scales=scales)
@@ -0,0 +1,51 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    同じキーの処理が実行中の場合、新たに実行せず実行中の結果を待つ（プロセス内）
+
+    最初の呼び出し元がキャンセルされても処理は続行し、待っている他の呼び出し元に結果を返す
+    """
+
+    def __init__(self, name: str):
+        """
+        Args:
+            name: 名前（統計用）
+        """
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    async def run(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        keyの処理を実行する（実行中であればその結果を待つ）
+
+        Args:
+            key: 同一視するキー
+            func: 実行するコルーチン関数
+
+        Returns:
+            funcの結果
+        """
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return await asyncio.shield(task)
+
+        task = asyncio.ensure_future(func())
+        self._inflight[key] = task
+        self.executed += 1
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        統計
+
+        Returns:
+            executed（実行数）/ coalesced（相乗りした呼び出し数）/ inflight（実行中のキー数）
+        """
+        return {"executed": self.executed, "coalesced": self.coalesced, "inflight": len(self._inflight)}
@@ -0,0 +1,71 @@
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Dict, Iterator
+
+
+class StageTimer:
+    """
+    1リクエスト内の処理段階ごとの開始時刻・所要時間を記録する
+
+    開始時刻はリクエスト開始からの経過ミリ秒で記録するため、並列に実行された段階の重なりと
+    全体の所要時間を決めている段階（クリティカルパス）が分かる
+    """
+
+    def __init__(self):
+        self._origin = time.perf_counter()
+        self._stages: Dict[str, Dict[str, float]] = {}
+
+    def _record(self, name: str, started: float) -> None:
+        finished = time.perf_counter()
+        self._stages[name] = {
+            "start": round((started - self._origin) * 1000, 1),
+            "duration": round((finished - started) * 1000, 1)
+        }
+
+    async def track(self, name: str, awaitable: Awaitable[Any]) -> Any:
+        """
+        非同期処理の所要時間を記録しながら待つ
+
+        Args:
+            name: 段階名
+            awaitable: 待つ処理
+
+        Returns:
+            awaitableの結果
+        """
+        started = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self._record(name, started)
+
+    @contextmanager
+    def measure(self, name: str) -> Iterator[None]:
+        """
+        同期処理の所要時間を記録する
+
+        Args:
+            name: 段階名
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record(name, started)
+
+    @property
+    def stages(self) -> Dict[str, Dict[str, float]]:
+        """段階名 → {"start": 開始(ms), "duration": 所要時間(ms)}"""
+        return dict(self._stages)
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        記録した内容をレスポンス用にまとめる
+
+        Returns:
+            {"total": 全体の経過時間(ms), "stages": 段階ごとの開始・所要時間}
+        """
+        return {
+            "total": round((time.perf_counter() - self._origin) * 1000, 1),
+            "stages": self.stages
+        }
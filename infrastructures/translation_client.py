@@ -1,11 +1,142 @@
-from deep_translator import GoogleTranslator
-from typing import Optional
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional, Dict, Any, Tuple
+from infrastructures.circuit_breaker import CircuitBreaker
+from infrastructures.memory_cache import LRUCache
 
+# 翻訳エンジン（"google": Google翻訳 / "local": ネットワークを使わない代替実装、テスト・オフライン用）
+TRANSLATION_BACKEND = os.environ.get("TRANSLATION_BACKEND", "google")
 
-def translate_text(text: str, target_lang: str, source_lang: str = 'auto') -> Optional[str]:
+# 翻訳1回あたりのタイムアウト（秒）
+TRANSLATION_TIMEOUT = float(os.environ.get("TRANSLATION_TIMEOUT", "5"))
+
+# メモリキャッシュの件数
+TRANSLATION_CACHE_SIZE = int(os.environ.get("TRANSLATION_CACHE_SIZE", "4096"))
+
+# 永続キャッシュ（SQLite）のパス（空文字の場合は永続化しない）
+TRANSLATION_CACHE_PATH = os.environ.get("TRANSLATION_CACHE_PATH", "/tmp/kankodori_translations.sqlite3")
+
+# 連続失敗で翻訳を一時停止する回数と停止秒数
+TRANSLATION_BREAKER_FAILURES = int(os.environ.get("TRANSLATION_BREAKER_FAILURES", "5"))
+TRANSLATION_BREAKER_RESET_SECONDS = float(os.environ.get("TRANSLATION_BREAKER_RESET_SECONDS", "30"))
+
+
+class GoogleTranslatorBackend:
+    """
+    deep_translatorのGoogle翻訳
+
+    GoogleTranslator.translate はリクエストのパラメータをインスタンスに書き込んでから送信するため、
+    複数スレッドで共有すると別のテキストが送られることがある。
+    インスタンスはスレッドごと・言語の組ごとに1回だけ作って使い回す
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def _translator(self, target_lang: str, source_lang: str):
+        translators = getattr(self._local, "translators", None)
+        if translators is None:
+            translators = self._local.translators = {}
+
+        translator = translators.get((source_lang, target_lang))
+        if translator is None:
+            from deep_translator import GoogleTranslator
+
+            translator = GoogleTranslator(source=source_lang, target=target_lang)
+            translators[(source_lang, target_lang)] = translator
+        return translator
+
+    def translate(self, text: str, target_lang: str, source_lang: str) -> str:
+        return self._translator(target_lang, source_lang).translate(text)
+
+
+class LocalTranslatorBackend:
+    """ネットワークを使わない代替翻訳（原文に翻訳先言語の印を付けて返す）"""
+
+    def translate(self, text: str, target_lang: str, source_lang: str) -> str:
+        return f"[{target_lang}] {text}"
+
+
+class TranslationStore:
+    """(翻訳元言語, 翻訳先言語, テキスト) → 翻訳結果 のSQLite永続キャッシュ"""
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: SQLiteファイルのパス
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS translations ("
+                "source TEXT NOT NULL, target TEXT NOT NULL, text TEXT NOT NULL, "
+                "result TEXT NOT NULL, created_at REAL NOT NULL, "
+                "PRIMARY KEY (source, target, text))"
+            )
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+    def get(self, key: Tuple[str, str, str]) -> Optional[str]:
+        """保存済みの翻訳結果を取得（なければNone）"""
+        try:
+            with self._lock:
+                row = self._connect().execute(
+                    "SELECT result FROM translations WHERE source = ? AND target = ? AND text = ?", key
+                ).fetchone()
+            return row[0] if row else None
+        except Exception as e:
+            print(f"翻訳キャッシュ読み込みエラー: {e}")
+            return None
+
+    def set(self, key: Tuple[str, str, str], result: str) -> None:
+        """翻訳結果を保存"""
+        try:
+            with self._lock:
+                connection = self._connect()
+                connection.execute(
+                    "INSERT OR REPLACE INTO translations (source, target, text, result, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (*key, result, time.time())
+                )
+                connection.commit()
+        except Exception as e:
+            print(f"翻訳キャッシュ書き込みエラー: {e}")
+
+
+def _create_backend():
+    if TRANSLATION_BACKEND == "local":
+        return LocalTranslatorBackend()
+    return GoogleTranslatorBackend()
+
+
+# シングルトンインスタンス
+_backend = _create_backend()
+_memory_cache = LRUCache(TRANSLATION_CACHE_SIZE)
+_store = TranslationStore(TRANSLATION_CACHE_PATH) if TRANSLATION_CACHE_PATH else None
+_breaker = CircuitBreaker("translation", TRANSLATION_BREAKER_FAILURES, TRANSLATION_BREAKER_RESET_SECONDS)
+_stats = {"store_hits": 0, "network_calls": 0, "failures": 0, "timeouts": 0}
+
+
+async def translate_text(text: str, target_lang: str, source_lang: str = 'auto') -> Optional[str]:
     """
     テキストを指定言語に翻訳する
 
+    メモリ → SQLite の順にキャッシュを確認し、なければ翻訳エンジンを別スレッドで呼び出す
+    （SQLiteの読み書きも別スレッドで行い、イベントループを止めない）
+    （TRANSLATION_TIMEOUT秒で打ち切り、連続失敗時は一時的に呼び出しを止める）
+
     Args:
         text: 翻訳するテキスト
         target_lang: 翻訳先言語 ('ja', 'en' など)
@@ -14,20 +145,75 @@ def translate_text(text: str, target_lang: str, source_lang: str = 'auto') -> Op
     Returns:
         翻訳後のテキスト（失敗時は元のテキスト）
     """
+    if not text or not text.strip():
+        return text
+
+    key = (source_lang, target_lang, text)
+    cached = _memory_cache.get(key)
+    if cached is not None:
+        return cached
+
+    if _store is not None:
+        stored = await asyncio.to_thread(_store.get, key)
+        if stored is not None:
+            _stats["store_hits"] += 1
+            _memory_cache.set(key, stored)
+            return stored
+
+    if not _breaker.allow():
+        return text
+
     try:
-        translator = GoogleTranslator(source=source_lang, target=target_lang)
-        result = translator.translate(text)
-        return result
+        _stats["network_calls"] += 1
+        result = await asyncio.wait_for(
+            asyncio.to_thread(_backend.translate, text, target_lang, source_lang),
+            timeout=TRANSLATION_TIMEOUT
+        )
+        if not result:
+            raise ValueError("翻訳結果が空です")
+    except asyncio.CancelledError:
+        # 呼び出し元の打ち切り（クライアント切断など）は失敗として数えないが、試行枠は解放する
+        _breaker.release_trial()
+        raise
+    except asyncio.TimeoutError:
+        _stats["timeouts"] += 1
+        _breaker.record_failure()
+        print(f"翻訳タイムアウト ({TRANSLATION_TIMEOUT}s)")
+        return text
     except Exception as e:
+        _stats["failures"] += 1
+        _breaker.record_failure()
         print(f"翻訳エラー: {str(e)}")
         return text
 
+    _breaker.record_success()
+    _memory_cache.set(key, result)
+    if _store is not None:
+        await asyncio.to_thread(_store.set, key, result)
+    return result
 
-def translate_to_japanese(text: str) -> str:
+
+async def translate_to_japanese(text: str) -> str:
     """テキストを日本語に翻訳する"""
-    return translate_text(text, target_lang='ja')
+    return await translate_text(text, target_lang='ja')
 
 
-def translate_to_english(text: str) -> str:
+async def translate_to_english(text: str) -> str:
     """テキストを英語に翻訳する"""
-    return translate_text(text, target_lang='en')
+    return await translate_text(text, target_lang='en')
+
+
+def get_translation_stats() -> Dict[str, Any]:
+    """
+    翻訳の統計
+
+    Returns:
+        キャッシュ・ネットワーク呼び出し・サーキットブレーカーの統計
+    """
+    return {
+        "backend": TRANSLATION_BACKEND,
+        "memory_cache": _memory_cache.stats(),
+        "store_enabled": _store is not None,
+        **_stats,
+        "breaker": _breaker.stats()
+    }
@@ -2,7 +2,7 @@ import torch
 import numpy as np
 from PIL import Image
 from transformers import ViTImageProcessor, ViTModel
-from typing import Optional
+from typing import Optional, List
 import io
 
 
@@ -105,6 +105,50 @@ class ViTVectorizer:
             print(f"特徴量抽出エラー: {e}")
             return None
 
+    def vectorize_images(self, images_data: List[bytes], batch_size: int = 16) -> List[Optional[np.ndarray]]:
+        """
+        複数の画像をまとめて前処理し、batch_size件ずつ1回のforwardでベクトル化する
+
+        Args:
+            images_data: 画像のバイトデータのリスト
+            batch_size: 1回のforwardで処理する最大件数
+
+        Returns:
+            images_dataと同じ順序のベクトルのリスト（読み込めなかった画像はNone）
+        """
+        vectors: List[Optional[np.ndarray]] = [None] * len(images_data)
+        try:
+            self._initialize_model()
+
+            # 読み込めない画像があっても他の画像は処理する
+            images = []
+            targets = []
+            for i, image_data in enumerate(images_data):
+                if not image_data:
+                    continue
+                try:
+                    image = Image.open(io.BytesIO(image_data))
+                    images.append(image.convert('RGB') if image.mode != 'RGB' else image)
+                    targets.append(i)
+                except Exception as e:
+                    print(f"画像前処理エラー: {e}")
+
+            for start in range(0, len(images), max(1, batch_size)):
+                chunk = images[start:start + batch_size]
+                inputs = self.processor(images=chunk, return_tensors="pt")
+                with torch.no_grad():
+                    outputs = self.model(**inputs)
+                    # [CLS]トークンの出力を画像ごとに取り出す
+                    cls_embeddings = outputs.last_hidden_state[:, 0, :].cpu().numpy()
+                for i, vector in zip(targets[start:start + batch_size], cls_embeddings):
+                    vectors[i] = vector
+
+            return vectors
+
+        except Exception as e:
+            print(f"特徴量抽出エラー: {e}")
+            return vectors
+
 
 # シングルトンインスタンス
 _vit_vectorizer = ViTVectorizer()
@@ -138,3 +182,17 @@ def extract_features(inputs: torch.Tensor) -> Optional[np.ndarray]:
     """
     vectorizer = get_vit_vectorizer()
     return vectorizer.extract_features(inputs)
+
+def vectorize_images(images_data: List[bytes], batch_size: int = 16) -> List[Optional[np.ndarray]]:
+    """
+    複数の画像をまとめてベクトル化する便利関数
+
+    Args:
+        images_data: 画像のバイトデータのリスト
+        batch_size: 1回のforwardで処理する最大件数
+
+    Returns:
+        ベクトルのリスト（失敗した画像はNone）
+    """
+    vectorizer = get_vit_vectorizer()
+    return vectorizer.vectorize_images(images_data, batch_size)
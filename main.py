@@ -1,20 +1,71 @@
-from fastapi import FastAPI, File, Form, UploadFile, Request
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, File, Form, UploadFile, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from typing import Optional, Dict, Any
 import uvicorn
 import controllers.search_controller as search_controller
-from infrastructures.firebase_config import verify_firebase_token
+from infrastructures.firebase_config import verify_firebase_token, verify_admin_token
 from services.logging_service import (
     save_api_log,
     create_request_data_search,
     create_response_data_search
 )
-from services.image_storage_service import process_search_image
+from services.image_storage_service import process_search_image, run_blob_manifest_refresher, detach_upload_file
+from services.warmup_service import run_warmup, is_ready, get_warmup_status
+from services.catalog_service import run_catalog_refresher
+from services.metrics_service import get_metrics, register_collector
+from infrastructures.inference_executor import get_inference_stats, shutdown_inference_executor
+from infrastructures.micro_batcher import get_batcher_stats
+from services.vit import get_image_embedding_cache
+from services.text_generate_service import get_caption_stats
+from infrastructures.translation_client import get_translation_stats
+from infrastructures.blob_manifest import get_blob_manifest
+from services.image_generate_service import get_image_generation_stats
+from services.search_service import get_search_result_cache_stats
+from infrastructures.background_queue import get_background_queue
+
+register_collector("inference", get_inference_stats)
+register_collector("batching", get_batcher_stats)
+register_collector("image_embedding_cache", get_image_embedding_cache().stats)
+register_collector("caption", get_caption_stats)
+register_collector("translation", get_translation_stats)
+register_collector("blob_manifest", get_blob_manifest().stats)
+register_collector("image_generation", get_image_generation_stats)
+register_collector("search_result_cache", get_search_result_cache_stats)
+register_collector("background_queue", get_background_queue().stats)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    起動時にモデル・カタログをバックグラウンドで事前読み込みし、カタログ・Blobマニフェストの定期更新と
+    レスポンス後の処理（画像保存・ログ保存）のキューを開始
+
+    終了時はキューに残った処理を待ってから止める
+    """
+    background_queue = get_background_queue()
+    background_queue.start()
+    background_tasks = [
+        asyncio.create_task(run_warmup()),
+        asyncio.create_task(run_catalog_refresher()),
+        asyncio.create_task(run_blob_manifest_refresher())
+    ]
+    yield
+    for task in background_tasks:
+        if not task.done():
+            task.cancel()
+    await background_queue.drain()
+    shutdown_inference_executor()
+
 
 app = FastAPI(
     title="観光地検索 API",
     description="テキストや画像から観光地検索",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -30,11 +81,61 @@ async def root():
     return {"message": "こんにちは！APIへようこそ。"}
 
 
+@app.get("/healthz/ready")
+async def readiness():
+    """
+    レディネスチェック
+
+    モデル・カタログのウォームアップが終わるまでは503を返す
+    """
+    status = get_warmup_status()
+    if not is_ready():
+        return JSONResponse(status_code=503, content=status)
+    return status
+
+
+@app.get("/metrics")
+async def metrics(request: Request) -> Dict[str, Any]:
+    """
+    プロセス内メトリクス（要管理者権限）
+
+    キャッシュのヒット率や推論キューの待ち時間などの統計を返す
+    """
+    await verify_admin_token(request)
+    return get_metrics()
+
+
+@app.get("/background-queue/dead-letters")
+async def background_dead_letters(request: Request) -> Dict[str, Any]:
+    """
+    レスポンス後の処理（画像保存・ログ保存）のうち、再試行しても失敗したものの一覧（要管理者権限）
+    """
+    await verify_admin_token(request)
+    return {"dead_letters": get_background_queue().dead_letters()}
+
+
+@app.post("/background-queue/replay")
+async def replay_background_dead_letters(request: Request) -> Dict[str, Any]:
+    """
+    再試行しても失敗した処理を同じ引数でキューに積み直す（要管理者権限）
+    """
+    await verify_admin_token(request)
+    replayed = await get_background_queue().replay_dead_letters()
+    return {"replayed": replayed}
+
+
 @app.post("/search")
 async def search_tourist_spots(
     request: Request,
     text: Optional[str] = Form(None),
-    image: Optional[UploadFile] = File(None)
+    image: Optional[UploadFile] = File(None),
+    caption_profile: Optional[str] = Form(None),
+    caption_budget_ms: Optional[float] = Form(None),
+    text_weight: Optional[float] = Form(None),
+    image_weight: Optional[float] = Form(None),
+    top_k: Optional[int] = Form(None),
+    cursor: Optional[str] = Form(None),
+    legacy: bool = Form(False)
 ) -> Dict[str, Any]:
     """
     観光地検索
@@ -44,6 +145,11 @@ async def search_tourist_spots(
     - 検索条件に応じて結果を返します
     - search_range指定で検索範囲を調整します
     - 条件に応じて指定されていない検索条件を生成します
+    - 画像のみの場合、caption_profile（quality / balanced / fast）または
+      caption_budget_ms（ミリ秒）でキャプション生成の速度と品質を選べます
+    - 結果は text_weight * text_similarity + image_weight * image_similarity（score）の高い順に
+      top_k 件ずつ返します。続きは metadata.page.next_cursor を cursor に指定して取得します
+    - legacy=true の場合は従来どおり候補全件を並べ替えずに返します
     """
 
     # Firebase認証
@@ -52,77 +158,178 @@ async def search_tourist_spots(
 
     try:
         # API処理実行
-        result = await search_controller.search_tourist_spots(text, image)
-
-        # メタデータから実際の値を取得
-        metadata = result.get("metadata", {})
-        internal = result.get("_internal", {})
-
-        actual_text = metadata.get("actual_text")
-        text_generated = metadata.get("text_generated", False)
-        image_generated = metadata.get("image_generated", False)
-        actual_image = internal.get("actual_image")
-
-        # テキストと画像のソースを判定
-        text_source = "generate" if text_generated else "user_input"
-        base_image_source = "generate" if image_generated else "user_upload"
-
-        # 画像処理（存在チェック→保存）
-        if actual_image is not None:
-            # 画像がある場合（アップロードまたは生成）
-            storage_path, final_image_source = await process_search_image(
-                image=actual_image,
-                text=actual_text,
-                user_id=user_uid,
-                image_source=base_image_source
-            )
-        else:
-            # 画像がない場合
-            storage_path, final_image_source = None, "none"
-
-        # リクエストデータ作成
-        request_data = create_request_data_search(
-            text=actual_text,
-            image_present=actual_image is not None,
-            text_source=text_source,
-            image_source=final_image_source,
-            storage_path=storage_path
+        result = await search_controller.search_tourist_spots(
+            text, image, caption_profile, caption_budget_ms, text_weight, image_weight, top_k, cursor, legacy
         )
 
-        # レスポンス用にinternalデータを削除
-        clean_result = {k: v for k, v in result.items() if k != "_internal"}
+        # 画像保存・ログ保存（レスポンス後にバックグラウンドで実行）
+        return await _persist_search_result(user_uid, result)
 
-        # 成功時のログ保存
-        response_data = create_response_data_search(
-            status="success",
-            result=clean_result,
-            total_candidates=len(result.get('results', [])) if isinstance(result, dict) else None
-        )
+    except Exception as e:
+        await _save_search_error_log(user_uid, text, image, e)
+        raise
 
-        await save_api_log(
-            user_id=user_uid,
-            api_endpoint="search",
-            request_data=request_data,
-            response_data=response_data
-        )
 
-        return clean_result
+@app.post("/search/stream")
+async def search_tourist_spots_stream(
+    request: Request,
+    text: Optional[str] = Form(None),
+    image: Optional[UploadFile] = File(None),
+    caption_profile: Optional[str] = Form(None),
+    caption_budget_ms: Optional[float] = Form(None),
+    text_weight: Optional[float] = Form(None),
+    image_weight: Optional[float] = Form(None),
+    top_k: Optional[int] = Form(None),
+    cursor: Optional[str] = Form(None),
+    legacy: bool = Form(False)
+) -> StreamingResponse:
+    """
+    観光地検索（ストリーミング）
+
+    /search と同じ検索を行い、結果がそろった順にNDJSON（1行1イベント）で返します
+    - {"event": "text", ...}  : テキスト類似度による結果（画像生成を待たずに返る）
+    - {"event": "image", ...} : 画像類似度の更新分
+    - {"event": "final", ...} : /search と同じ最終結果
+    - {"event": "error", ...} : 途中でエラーが発生した場合
+    - text_weight / image_weight / top_k / cursor / legacy は /search と同じです
+    """
 
-    except Exception as e:
-        # エラー時のログ保存
-        response_data = create_response_data_search(
-            status="error",
-            error_message=str(e)
-        )
+    # Firebase認証
+    user_uid = await verify_firebase_token(request)
+
+    # 入力の検証はストリーム開始前に行う
+    events = await search_controller.search_tourist_spots_stream(
+        text, image, caption_profile, caption_budget_ms, text_weight, image_weight, top_k, cursor, legacy
+    )
+
+    async def ndjson_lines():
+        try:
+            async for event, payload in events:
+                if event == "final":
+                    # 最終結果の画像保存・ログ保存はバックグラウンドで実行
+                    payload = await _persist_search_result(user_uid, payload)
+                yield json.dumps({"event": event, **payload}, ensure_ascii=False) + "\n"
+        except Exception as e:
+            print(f"ストリーミング検索エラー: {e}")
+            await _save_search_error_log(user_uid, text, image, e)
+            yield json.dumps({"event": "error", "detail": str(e)}, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
+
+async def _persist_search_result(user_uid: str, result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    検索結果の画像保存・ログ保存をバックグラウンドキューに積む
+
+    アップロード画像はレスポンス後に閉じられるため、積む前にメモリ上へコピーする
+
+    Args:
+        user_uid: Firebase UID
+        result: 検索サービスの結果（_internalを含む）
 
-        await save_api_log(
+    Returns:
+        レスポンス用の結果（_internalを除く）
+    """
+    metadata = result.get("metadata", {})
+    actual_image = result.get("_internal", {}).get("actual_image")
+
+    # レスポンス用にinternalデータを削除
+    clean_result = {k: v for k, v in result.items() if k != "_internal"}
+
+    # アップロード画像（UploadFile）のみコピーする（生成画像はPIL Image）
+    if hasattr(actual_image, 'read'):
+        actual_image = await detach_upload_file(actual_image)
+
+    await get_background_queue().submit(
+        "search_image", _save_search_records, user_uid, metadata, actual_image, clean_result
+    )
+    return clean_result
+
+
+async def _save_search_records(
+    user_uid: str,
+    metadata: Dict[str, Any],
+    actual_image: Any,
+    clean_result: Dict[str, Any]
+) -> None:
+    """
+    検索画像の保存（存在チェック→保存）と成功ログの保存（バックグラウンドで実行）
+
+    再試行するのはログ保存だけにする（画像保存からやり直すと、1回目に保存した画像が
+    「既存」と判定されて image_source が変わってしまうため）
+    """
+    actual_text = metadata.get("actual_text")
+    text_generated = metadata.get("text_generated", False)
+    image_generated = metadata.get("image_generated", False)
+
+    # テキストと画像のソースを判定
+    text_source = "generate" if text_generated else "user_input"
+    base_image_source = "generate" if image_generated else "user_upload"
+
+    # 画像処理（存在チェック→保存）
+    if actual_image is not None:
+        # 画像がある場合（アップロードまたは生成）
+        storage_path, final_image_source = await process_search_image(
+            image=actual_image,
+            text=actual_text,
             user_id=user_uid,
-            api_endpoint="search",
-            request_data=request_data,
-            response_data=response_data
+            image_source=base_image_source
         )
-
-        raise
+    else:
+        # 画像がない場合
+        storage_path, final_image_source = None, "none"
+
+    # リクエストデータ作成
+    request_data = create_request_data_search(
+        text=actual_text,
+        image_present=actual_image is not None,
+        text_source=text_source,
+        image_source=final_image_source,
+        storage_path=storage_path
+    )
+
+    # 成功時のログ保存（ページ分割時の候補数はページ情報から取得）
+    page = metadata.get("page")
+    response_data = create_response_data_search(
+        status="success",
+        result=clean_result,
+        total_candidates=page["total"] if page else len(clean_result.get('results', []))
+    )
+
+    await get_background_queue().run(
+        "search_log",
+        save_api_log,
+        user_id=user_uid,
+        api_endpoint="search",
+        request_data=request_data,
+        response_data=response_data
+    )
+
+
+async def _save_search_error_log(
+    user_uid: str,
+    text: Optional[str],
+    image: Optional[UploadFile],
+    error: Exception
+) -> None:
+    """検索エラー時のログ保存をバックグラウンドキューに積む"""
+    request_data = create_request_data_search(
+        text=text,
+        image_present=image is not None
+    )
+    response_data = create_response_data_search(
+        status="error",
+        error_message=str(error)
+    )
+
+    await get_background_queue().submit(
+        "search_error_log",
+        save_api_log,
+        user_id=user_uid,
+        api_endpoint="search",
+        request_data=request_data,
+        response_data=response_data
+    )
 
 @app.get("/suggest-images")
 async def suggest_images(request: Request) -> Dict[str, Any]:
@@ -141,22 +348,37 @@ async def suggest_images(request: Request) -> Dict[str, Any]:
 
 
 @app.post("/batch-search")
-async def batch_search(request: Request) -> Dict[str, Any]:
+async def batch_search(request: Request, weights: Optional[str] = None) -> Dict[str, Any]:
     """
     バッチ検索（実験用）
 
     test/set.txt ファイルに記載された[テキスト,画像URL]のペアで一括検索を実行
     結果は test/batch_search_results.json にキャッシュされる
+    - weights で比較する重みの組を指定できます（例: "1:0,0.5:0.5,0:1"、省略時は 100:0, 75:25, 50:50, 25:75, 0:100）
+      指定した場合のキャッシュは重みの組ごとに別ファイルになります（重複した組は1つにまとめます）
     """
 
     import os
     import csv
-    import json
+    import hashlib
+    from services.fusion_service import parse_weight_grid, weight_label
+
+    try:
+        weight_grid = parse_weight_grid(weights)
+    except ValueError:
+        raise HTTPException(
+            status_code=400,
+            detail="weights は \"テキスト:画像\" をカンマ区切りで指定してください（例: 1:0,0.5:0.5,0:1）"
+        )
+    labels = [weight_label(*pair) for pair in weight_grid.tolist()]
 
     # ファイルパス設定
     test_dir = os.path.join(os.path.dirname(__file__), "test")
     set_file_path = os.path.join(test_dir, "set.txt")
-    cache_file_path = os.path.join(test_dir, "batch_search_results.json")
+    # 重みの組が多いとファイル名の長さ制限を超えるため、正規化した組の短いハッシュを使う
+    grid_hash = hashlib.sha256("__".join(labels).encode("utf-8")).hexdigest()[:16]
+    cache_name = "batch_search_results.json" if not weights else f"batch_search_results_{grid_hash}.json"
+    cache_file_path = os.path.join(test_dir, cache_name)
 
     # キャッシュファイルが存在する場合は読み込んで返す
     if os.path.exists(cache_file_path):
@@ -201,19 +423,16 @@ async def batch_search(request: Request) -> Dict[str, Any]:
                 print(f"[{idx}] 検索中: テキスト='{text}', URL={image_url[:60]}...")
 
                 try:
-                    # 5つの重み比率で検索
-                    search_result = await search_with_url_and_weights(text, image_url)
+                    # すべての重み比率で検索
+                    search_result = await search_with_url_and_weights(text, image_url, weight_grid)
 
                     result_item = {
                         "id": idx,
                         "query_text": text,
-                        "query_image_url": image_url,
-                        "text_100_image_0": search_result.get("text_100_image_0"),
-                        "text_75_image_25": search_result.get("text_75_image_25"),
-                        "text_50_image_50": search_result.get("text_50_image_50"),
-                        "text_25_image_75": search_result.get("text_25_image_75"),
-                        "text_0_image_100": search_result.get("text_0_image_100")
+                        "query_image_url": image_url
                     }
+                    for label in labels:
+                        result_item[label] = search_result.get(label)
 
                     results.append(result_item)
                     print(f"[{idx}] 成功")
@@ -224,27 +443,12 @@ async def batch_search(request: Request) -> Dict[str, Any]:
                     if query_filename:
                         query_image_filenames.append(query_filename)
 
-                    # 2. 結果画像を保存（5つ、ファイル名は観光地ID）
-                    await save_result_image(
-                        search_result.get("text_100_image_0"),
-                        result_dir
-                    )
-                    await save_result_image(
-                        search_result.get("text_75_image_25"),
-                        result_dir
-                    )
-                    await save_result_image(
-                        search_result.get("text_50_image_50"),
-                        result_dir
-                    )
-                    await save_result_image(
-                        search_result.get("text_25_image_75"),
-                        result_dir
-                    )
-                    await save_result_image(
-                        search_result.get("text_0_image_100"),
-                        result_dir
-                    )
+                    # 2. 結果画像を保存（重み比率ごと、ファイル名は観光地ID）
+                    for label in labels:
+                        await save_result_image(
+                            search_result.get(label),
+                            result_dir
+                        )
 
                 except Exception as e:
                     print(f"[{idx}] エラー: {str(e)}")
@@ -252,14 +456,11 @@ async def batch_search(request: Request) -> Dict[str, Any]:
                     result_item = {
                         "id": idx,
                         "query_text": text,
-                        "query_image_url": image_url,
-                        "text_100_image_0": None,
-                        "text_75_image_25": None,
-                        "text_50_image_50": None,
-                        "text_25_image_75": None,
-                        "text_0_image_100": None,
-                        "error": str(e)
+                        "query_image_url": image_url
                     }
+                    for label in labels:
+                        result_item[label] = None
+                    result_item["error"] = str(e)
                     results.append(result_item)
 
         # 結果をJSONとして整形
@@ -0,0 +1,93 @@
+import asyncio
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional
+from repositories.firebase_repository import FirebaseDataManager
+
+# 常駐データをStorageの世代と照合する間隔（秒）
+FEATURE_REVALIDATE_SECONDS = float(os.environ.get("FEATURE_REVALIDATE_SECONDS", "300"))
+
+
+@dataclass
+class _FeatureEntry:
+    """常駐している特徴量データ1ファイル分"""
+    data: Any
+    generation: Optional[str]
+    checked_at: float
+
+
+class FeatureStore:
+    """特徴量ファイルをプロセス内に常駐させ、世代が変わった時だけ再取得するクラス"""
+
+    def __init__(self, manager: FirebaseDataManager, revalidate_seconds: float = FEATURE_REVALIDATE_SECONDS):
+        self._manager = manager
+        self._revalidate_seconds = revalidate_seconds
+        self._entries: Dict[str, _FeatureEntry] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def _get_lock(self, filename: str) -> asyncio.Lock:
+        """ファイルごとのロックを取得（同時リクエストでの二重ダウンロード防止）"""
+        lock = self._locks.get(filename)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[filename] = lock
+        return lock
+
+    def _is_fresh(self, entry: Optional[_FeatureEntry], max_age: Optional[float] = None) -> bool:
+        """再検証が不要な期間内かどうか"""
+        if entry is None:
+            return False
+        if max_age is None:
+            max_age = self._revalidate_seconds
+        return time.monotonic() - entry.checked_at < max_age
+
+    async def get(
+        self,
+        filename: str,
+        loader: Optional[Callable[[str, Optional[str]], Awaitable[Any]]] = None,
+        max_age: Optional[float] = None
+    ) -> Optional[Any]:
+        """
+        特徴量データを取得（メモリ上にあればそれを返す）
+
+        Args:
+            filename: 特徴量ファイル名 (例: "vit.table.npz")
+            loader: (ファイル名, 世代) を受け取りデータを返す読み込み関数（省略時は.npyとして読み込み）
+            max_age: 再検証せずに使う最大秒数（省略時はFEATURE_REVALIDATE_SECONDS、0で必ず世代を確認）
+
+        Returns:
+            読み込んだデータ、取得失敗時はNone
+        """
+        entry = self._entries.get(filename)
+        if self._is_fresh(entry, max_age):
+            return entry.data
+
+        async with self._get_lock(filename):
+            # ロック待ちの間に他のリクエストが更新済みの場合
+            entry = self._entries.get(filename)
+            if self._is_fresh(entry, max_age):
+                return entry.data
+
+            generation = await self._manager.get_feature_generation(filename)
+
+            if entry is not None and (generation is None or generation == entry.generation):
+                # 変更なし（または世代取得失敗）の場合は常駐データを使い続ける
+                entry.checked_at = time.monotonic()
+                return entry.data
+
+            print(f"特徴量を読み込み中: {filename} (generation={generation})")
+            if loader is None:
+                data = await self._manager.get_feature_npy(filename)
+            else:
+                data = await loader(filename, generation)
+            if data is None and entry is not None and entry.data is not None:
+                return entry.data
+
+            # 取得失敗もキャッシュし、再検証間隔内は再ダウンロードしない
+            self._entries[filename] = _FeatureEntry(
+                data=data,
+                generation=generation,
+                checked_at=time.monotonic()
+            )
+            return data
@@ -1,3 +1,5 @@
+import asyncio
+import io
 import json
 import os
 import numpy as np
@@ -5,7 +7,10 @@ from typing import Optional, List, Dict, Any
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from infrastructures.firebase_config import download_storage, upload_storage, initialize_firebase
+from infrastructures.firebase_config import download_storage, download_storage_bytes, upload_storage, initialize_firebase, get_storage_generation
+from infrastructures.embedding_table import EmbeddingTable
+from infrastructures.ivf_index import IVFIndex, load_ivf_index
+from infrastructures.feature_cache import FEATURE_CACHE_DIR, cache_lock, expand_table, hold_file_lock, open_cached_table, temporary_path
 
 class FirebaseDataManager:
     """Firebase Storageのデータ管理クラス"""
@@ -29,25 +34,27 @@ class FirebaseDataManager:
         try:
             self._ensure_initialized()
 
-            local_path = "/tmp/place_data.json"
             storage_path = "place_data.json"
 
-            success = await download_storage(storage_path, local_path)
-            if not success:
+            # 一時ファイルを経由せずメモリ上で直接パース
+            content = await download_storage_bytes(storage_path)
+            if content is None:
                 return None
 
-            with open(local_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-
-            # 一時ファイル削除
-            if os.path.exists(local_path):
-                os.remove(local_path)
-
-            return data
+            return json.loads(content)
         except Exception as e:
             print(f"place_data取得エラー: {e}")
             return None
 
+    async def get_place_data_generation(self) -> Optional[str]:
+        """
+        place_data.jsonの世代を取得
+
+        Returns:
+            世代を表す文字列、取得失敗時はNone
+        """
+        self._ensure_initialized()
+        return await get_storage_generation("place_data.json")
 
     async def append_to_query_image(self, new_item: Dict[str, Any]) -> bool:
         """
@@ -99,25 +106,98 @@ class FirebaseDataManager:
         try:
             self._ensure_initialized()
 
-            local_path = f"/tmp/{filename}"
             storage_path = f"features/{filename}"
 
-            success = await download_storage(storage_path, local_path)
-            if not success:
+            # 一時ファイルを経由せずメモリ上で直接読み込み
+            content = await download_storage_bytes(storage_path)
+            if content is None:
                 return None
 
             # npyファイルを読み込み（pickleオブジェクトを許可）
-            data = np.load(local_path, allow_pickle=True)
+            return np.load(io.BytesIO(content), allow_pickle=True)
+        except Exception as e:
+            print(f"feature npy取得エラー: {e}")
+            return None
 
-            # 一時ファイル削除
-            if os.path.exists(local_path):
-                os.remove(local_path)
+    async def get_embedding_table(self, filename: str, generation: Optional[str] = None) -> Optional[EmbeddingTable]:
+        """
+        featureディレクトリ内の埋め込みテーブル(.table.npz)を取得
+
+        ローカルキャッシュに展開した.npyをメモリマップで開くため、
+        同一インスタンスのワーカー間で行列のメモリを共有する
+
+        Args:
+            filename: 取得したいテーブルファイル名 (例: "vit.table.npz")
+            generation: Storage上の世代（Noneの場合はキャッシュを使わず取得し直す）
+
+        Returns:
+            EmbeddingTable、取得失敗時はNone
+        """
+        try:
+            self._ensure_initialized()
+
+            if generation is not None:
+                table = open_cached_table(filename, generation)
+                if table is not None:
+                    return table
+
+            storage_path = f"features/{filename}"
 
-            return data
+            # 他ワーカーが同じ世代を展開中なら完了を待ってから使う（待機中もイベントループを止めない）
+            async with hold_file_lock(cache_lock(filename, generation)):
+                if generation is not None:
+                    table = open_cached_table(filename, generation)
+                    if table is not None:
+                        return table
+
+                # 一意な一時ファイルにダウンロードし、展開後に削除（展開は正規化を含むため別スレッドで実行）
+                with temporary_path(FEATURE_CACHE_DIR, suffix=".download") as temp_path:
+                    success = await download_storage(storage_path, temp_path)
+                    if not success:
+                        return None
+                    await asyncio.to_thread(expand_table, temp_path, filename, generation)
+
+            return open_cached_table(filename, generation)
         except Exception as e:
-            print(f"feature npy取得エラー: {e}")
+            print(f"埋め込みテーブル取得エラー: {e}")
             return None
 
+    async def get_ivf_index(self, filename: str, generation: Optional[str] = None) -> Optional[IVFIndex]:
+        """
+        featureディレクトリ内の近似近傍インデックス(.ivf.npz)を取得
+
+        Args:
+            filename: 取得したいインデックスファイル名 (例: "vit.ivf.npz")
+            generation: Storage上の世代（未使用、FeatureStoreの読み込み関数の形式に合わせる）
+
+        Returns:
+            IVFIndex、取得失敗時はNone
+        """
+        try:
+            self._ensure_initialized()
+
+            content = await download_storage_bytes(f"features/{filename}")
+            if content is None:
+                return None
+
+            return await asyncio.to_thread(load_ivf_index, io.BytesIO(content))
+        except Exception as e:
+            print(f"近似近傍インデックス取得エラー: {e}")
+            return None
+
+    async def get_feature_generation(self, filename: str) -> Optional[str]:
+        """
+        featureディレクトリ内のファイルの世代を取得
+
+        Args:
+            filename: 対象のファイル名
+
+        Returns:
+            世代を表す文字列、取得失敗時はNone
+        """
+        self._ensure_initialized()
+        return await get_storage_generation(f"features/{filename}")
+
     async def list_api_query_images(self) -> List[str]:
         """
         api/query_imageディレクトリ内のファイル名一覧を取得
@@ -130,12 +210,15 @@ class FirebaseDataManager:
             self._ensure_initialized()
 
             bucket = storage.bucket()
-            blobs = bucket.list_blobs(prefix="api/query_image/")
+
+            # 一覧取得（ページごとにStorageへ問い合わせる）は別スレッドで実行
+            def list_names() -> List[str]:
+                return [blob.name for blob in bucket.list_blobs(prefix="api/query_image/")]
 
             filenames = []
-            for blob in blobs:
+            for name in await asyncio.to_thread(list_names):
                 # api/query_imageディレクトリ内のファイル名のみ抽出
-                filename = blob.name.replace("api/query_image/", "")
+                filename = name.replace("api/query_image/", "")
                 if filename:  # 空文字列でない場合
                     filenames.append(filename)
 
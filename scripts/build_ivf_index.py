@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+埋め込みテーブルから近似近傍インデックス（IVF-Flat）を構築し、
+特徴量ファイルと同じ features/ ディレクトリにアップロードするスクリプト
+
+埋め込みテーブルを再作成した場合は、インデックスも作り直すこと
+（行構成が一致しないインデックスは読み込み時に無視され、全件計算にフォールバックする）
+
+使い方:
+    python scripts/build_ivf_index.py [--lists 1024] [vit.npy sentence_bert_ja_mean_ver2.npy ...]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.firebase_service import get_embedding_table
+from infrastructures.ivf_index import build_ivf_index, save_ivf_index, ivf_filename
+from infrastructures.firebase_config import upload_storage
+
+# 対象のデフォルト
+DEFAULT_FEATURE_FILES = ["vit.npy", "sentence_bert_ja_mean_ver2.npy"]
+
+
+async def build_and_upload(filename: str, num_lists) -> bool:
+    """
+    1ファイル分のインデックスを構築してアップロード
+
+    Args:
+        filename: 特徴量ファイル名
+        num_lists: クラスタ数（Noneの場合は自動）
+
+    Returns:
+        成功時True、失敗時False
+    """
+    table = await get_embedding_table(filename)
+    if table is None or len(table) == 0:
+        print(f"埋め込みテーブルを取得できませんでした: {filename}")
+        return False
+
+    started = time.perf_counter()
+    index = build_ivf_index(table.matrix, table.ids, num_lists=num_lists)
+    print(f"インデックス構築: {filename} (N={len(table)}, lists={index.num_lists}, {time.perf_counter() - started:.1f}s)")
+
+    output_name = ivf_filename(filename)
+    local_path = f"/tmp/{output_name}"
+    save_ivf_index(index, local_path)
+    url = await upload_storage(local_path, f"features/{output_name}")
+
+    if os.path.exists(local_path):
+        os.remove(local_path)
+
+    if url is None:
+        print(f"アップロードに失敗しました: {output_name}")
+        return False
+
+    print(f"アップロード完了: features/{output_name}")
+    return True
+
+
+async def main_async(filenames, num_lists):
+    results = [await build_and_upload(filename, num_lists) for filename in filenames]
+    return all(results)
+
+
+def main():
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("filenames", nargs="*", default=DEFAULT_FEATURE_FILES)
+    parser.add_argument("--lists", type=int, default=None, help="クラスタ数（省略時は4*sqrt(N)）")
+    args = parser.parse_args()
+
+    success = asyncio.run(main_async(args.filenames, args.lists))
+    sys.exit(0 if success else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+提案画像（api/query_image/）の埋め込みを事前計算し、画像埋め込みキャッシュのディスク層に保存するスクリプト
+
+IMAGE_EMBEDDING_CACHE_DIR をAPIサーバーと共有しておくと、起動時のウォームアップでViTを実行せずに済む
+
+使い方:
+    IMAGE_EMBEDDING_CACHE_DIR=/tmp/kankodori_embeddings python scripts/build_query_image_embeddings.py
+"""
+
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.vit import precompute_query_image_embeddings, IMAGE_EMBEDDING_CACHE_DIR
+from infrastructures.inference_executor import shutdown_inference_executor
+
+
+def main():
+    """メイン処理"""
+    if not IMAGE_EMBEDDING_CACHE_DIR:
+        print("IMAGE_EMBEDDING_CACHE_DIR が空のため、ディスク層に保存できません")
+        sys.exit(1)
+
+    summary = asyncio.run(precompute_query_image_embeddings())
+    shutdown_inference_executor()
+
+    print(f"保存先: {IMAGE_EMBEDDING_CACHE_DIR}")
+    print(f"結果: {summary}")
+    sys.exit(0 if summary["failed"] == 0 else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+旧形式の特徴量ファイル（pickle化された {id: ベクトル} 辞書の.npy）を
+埋め込みテーブル形式（float32行列 + ID配列の.table.npz）に変換してFirebase Storageにアップロードするスクリプト
+
+使い方:
+    python scripts/convert_features.py [vit.npy sentence_bert_ja_mean_ver2.npy ...]
+"""
+
+import asyncio
+import os
+import sys
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from repositories.firebase_repository import FirebaseDataManager
+from infrastructures.embedding_table import EmbeddingTable, save_embedding_table, table_filename
+from infrastructures.firebase_config import upload_storage
+
+# 変換対象のデフォルト
+DEFAULT_FEATURE_FILES = ["vit.npy", "sentence_bert_ja_mean_ver2.npy"]
+
+
+async def convert_feature_file(manager: FirebaseDataManager, filename: str) -> bool:
+    """
+    1ファイル分を変換してアップロード
+
+    Args:
+        manager: Firebaseデータ管理インスタンス
+        filename: 旧形式の特徴量ファイル名
+
+    Returns:
+        成功時True、失敗時False
+    """
+    raw_data = await manager.get_feature_npy(filename)
+    if raw_data is None:
+        print(f"特徴量ファイルを取得できませんでした: {filename}")
+        return False
+
+    if isinstance(raw_data, np.ndarray) and raw_data.shape == ():
+        raw_data = raw_data.item()
+
+    if not isinstance(raw_data, dict):
+        print(f"辞書形式ではありません: {filename} ({type(raw_data)})")
+        return False
+
+    table = EmbeddingTable.from_feature_dict(raw_data)
+    output_name = table_filename(filename)
+    local_path = f"/tmp/{output_name}"
+
+    save_embedding_table(table, local_path)
+    url = await upload_storage(local_path, f"features/{output_name}")
+
+    if os.path.exists(local_path):
+        os.remove(local_path)
+
+    if url is None:
+        print(f"アップロードに失敗しました: {output_name}")
+        return False
+
+    print(f"変換完了: {filename} -> {output_name} (N={len(table)}, D={table.dim})")
+    return True
+
+
+async def main_async(filenames):
+    manager = FirebaseDataManager()
+    results = [await convert_feature_file(manager, filename) for filename in filenames]
+    return all(results)
+
+
+def main():
+    """メイン処理"""
+    filenames = sys.argv[1:] or DEFAULT_FEATURE_FILES
+    success = asyncio.run(main_async(filenames))
+    sys.exit(0 if success else 1)
+
+
+if __name__ == "__main__":
+    main()
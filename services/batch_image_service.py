@@ -1,6 +1,7 @@
 import os
 from typing import Optional, Dict, Any
 from infrastructures.image_downloader import download_image_from_url
+from services.image_storage_service import check_blob_exists
 
 
 async def save_query_image(
@@ -96,9 +97,8 @@ async def save_result_image(
 
         for ext in extensions:
             blob_path = f"api/photo/{result_id}{ext}"
-            test_blob = bucket.blob(blob_path)
-            if test_blob.exists():
-                blob = test_blob
+            if await check_blob_exists(blob_path):
+                blob = bucket.blob(blob_path)
                 break
 
         if blob is None:
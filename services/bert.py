@@ -1,12 +1,19 @@
 import numpy as np
 from typing import Optional
-from infrastructures.bert_vectorizer import vectorize_text
+from infrastructures.bert_vectorizer import vectorize_texts
+from infrastructures.micro_batcher import MicroBatcher
 
+# 同時に届いたクエリをまとめてエンコードするバッチャー
+# （バッチサイズ・待ち時間は INFERENCE_MAX_BATCH_SIZE / INFERENCE_MAX_WAIT_MS）
+_text_batcher = MicroBatcher("sbert", vectorize_texts)
 
-def text_vector(text: str) -> Optional[np.ndarray]:
+
+async def text_vector(text: str) -> Optional[np.ndarray]:
     """
     テキストをベクトル化する
 
+    同時に届いた他のリクエストとまとめて1回のエンコードで処理される
+
     Args:
         text: ベクトル化するテキスト
 
@@ -17,7 +24,7 @@ def text_vector(text: str) -> Optional[np.ndarray]:
         return None
 
     try:
-        vector = vectorize_text(text)
+        vector = await _text_batcher.submit(text)
         return vector
     except Exception as e:
         print(f"テキストベクトル化エラー: {e}")
@@ -0,0 +1,220 @@
+import asyncio
+import os
+import time
+import numpy as np
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+from infrastructures.embedding_table import EmbeddingTable
+from infrastructures.ivf_index import IVFIndex
+from infrastructures.quantized_matrix import QUANTIZATION_MODES
+from services.location_service import LocationIndex
+from services.similarity_engine import SIMILARITY_ENGINE
+from services.firebase_service import get_photo_data, get_place_data_generation, get_embedding_table, get_ivf_index
+
+# テキスト・画像の特徴量ファイル
+TEXT_FEATURE_FILE = "sentence_bert_ja_mean_ver2.npy"
+IMAGE_FEATURE_FILE = "vit.npy"
+
+# Storage上の世代をポーリングする間隔（秒）
+CATALOG_POLL_SECONDS = float(os.environ.get("CATALOG_POLL_SECONDS", "300"))
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    """
+    観光地メタデータと2つの埋め込みテーブル（および近似近傍インデックス）をまとめた不変のスナップショット
+
+    リクエストは開始時に1つのスナップショットを取得して最後まで使うため、
+    途中で差し替えが起きてもメタデータとベクトルの組み合わせは一貫する
+
+    location_index と text_rows / image_rows（photo_dataの各要素に対応する行番号、テーブルにない場合は-1）は
+    構築時に1回だけ計算し、検索時の地名フィルタと類似度計算は配列だけで行う
+    """
+    version: int
+    photo_data: List[Dict[str, Any]]
+    location_index: LocationIndex
+    text_table: Optional[EmbeddingTable]
+    image_table: Optional[EmbeddingTable]
+    text_rows: np.ndarray
+    image_rows: np.ndarray
+    text_index: Optional[IVFIndex]
+    image_index: Optional[IVFIndex]
+    place_generation: Optional[str]
+    created_at: float
+
+
+# 現在のスナップショット（参照の代入で差し替える）
+_current: Optional[CatalogSnapshot] = None
+_build_lock = asyncio.Lock()
+
+# 直近に読み込んだインデックス（テーブルと不一致で使わなかったものも含む、変更検知用）
+_raw_indexes: Dict[str, Optional[IVFIndex]] = {}
+
+
+def _verified_index(index: Optional[IVFIndex], table: Optional[EmbeddingTable], name: str) -> Optional[IVFIndex]:
+    """インデックスがテーブルと同じ行構成から作られている場合のみ使う"""
+    if index is None or table is None:
+        return None
+    if not index.matches(table.ids):
+        print(f"近似近傍インデックスがテーブルと一致しないため使用しません: {name}")
+        return None
+    return index
+
+
+def _item_rows(photo_data: List[Dict[str, Any]], table: Optional[EmbeddingTable]) -> np.ndarray:
+    """photo_dataの各要素に対応するテーブルの行番号（テーブルがない場合はすべて-1）"""
+    if table is None:
+        return np.full(len(photo_data), -1, dtype=np.intp)
+    return table.lookup_rows(item.get('id') for item in photo_data)
+
+
+def _build_snapshot(
+    current: Optional[CatalogSnapshot],
+    photo_data: List[Dict[str, Any]],
+    place_generation: Optional[str],
+    text_table: Optional[EmbeddingTable],
+    image_table: Optional[EmbeddingTable],
+    raw_text_index: Optional[IVFIndex],
+    raw_image_index: Optional[IVFIndex]
+) -> CatalogSnapshot:
+    """
+    取得済みのデータから新しいスナップショットを構築（別スレッドで実行する）
+
+    Args:
+        current: 現在のスナップショット（初回はNone）
+        photo_data: カタログのデータリスト
+        place_generation: place_data.jsonの世代
+        text_table / image_table: 埋め込みテーブル
+        raw_text_index / raw_image_index: 読み込んだ近似近傍インデックス（テーブルとの一致は未確認）
+
+    Returns:
+        CatalogSnapshot
+    """
+    # 地名インデックスはphoto_dataが変わった時だけ作り直す
+    if current is not None and photo_data is current.photo_data:
+        location_index = current.location_index
+    else:
+        location_index = LocationIndex(photo_data)
+
+    # 圧縮エンジン使用時、展開済みキャッシュに圧縮行列がないテーブル（旧形式から変換したもの）はここで作っておく
+    if SIMILARITY_ENGINE in QUANTIZATION_MODES:
+        for table in (text_table, image_table):
+            if table is not None:
+                table.quantized(SIMILARITY_ENGINE)
+
+    return CatalogSnapshot(
+        version=(current.version + 1) if current is not None else 1,
+        photo_data=photo_data,
+        location_index=location_index,
+        text_table=text_table,
+        image_table=image_table,
+        text_rows=_item_rows(photo_data, text_table),
+        image_rows=_item_rows(photo_data, image_table),
+        text_index=_verified_index(raw_text_index, text_table, TEXT_FEATURE_FILE),
+        image_index=_verified_index(raw_image_index, image_table, IMAGE_FEATURE_FILE),
+        place_generation=place_generation,
+        created_at=time.time()
+    )
+
+
+async def get_catalog_snapshot() -> Optional[CatalogSnapshot]:
+    """
+    現在のカタログスナップショットを取得
+
+    まだ構築されていない場合のみ、その場で構築する
+    （同時に届いたリクエストは最初の構築を待ち、Storageの世代確認を繰り返さない）
+
+    Returns:
+        CatalogSnapshot、構築失敗時はNone
+    """
+    if _current is None:
+        await refresh_catalog_snapshot(if_missing=True)
+    return _current
+
+
+async def refresh_catalog_snapshot(if_missing: bool = False) -> bool:
+    """
+    Storageの世代を確認し、変更があれば新しいスナップショットを構築して差し替える
+
+    Args:
+        if_missing: Trueの場合、ロック取得後にスナップショットが既にあれば何もしない
+
+    Returns:
+        差し替えた場合True
+    """
+    global _current
+
+    async with _build_lock:
+        current = _current
+        if if_missing and current is not None:
+            return False
+
+        # place_data.json は世代が変わった時だけ取得し直す
+        place_generation = await get_place_data_generation()
+        if current is not None and (place_generation is None or place_generation == current.place_generation):
+            photo_data = current.photo_data
+            place_generation = current.place_generation
+        else:
+            photo_data = await get_photo_data()
+            if photo_data is None:
+                if current is None:
+                    print("カタログスナップショットの構築に失敗しました（photo_dataなし）")
+                    return False
+                photo_data = current.photo_data
+                place_generation = current.place_generation
+
+        # 埋め込みテーブルは必ず世代を確認（変更がなければ同じオブジェクトが返る）
+        text_table = await get_embedding_table(TEXT_FEATURE_FILE, max_age=0)
+        image_table = await get_embedding_table(IMAGE_FEATURE_FILE, max_age=0)
+        raw_text_index = await get_ivf_index(TEXT_FEATURE_FILE, max_age=0)
+        raw_image_index = await get_ivf_index(IMAGE_FEATURE_FILE, max_age=0)
+
+        if (
+            current is not None
+            and photo_data is current.photo_data
+            and text_table is current.text_table
+            and image_table is current.image_table
+            and raw_text_index is _raw_indexes.get(TEXT_FEATURE_FILE)
+            and raw_image_index is _raw_indexes.get(IMAGE_FEATURE_FILE)
+        ):
+            return False
+
+        _raw_indexes[TEXT_FEATURE_FILE] = raw_text_index
+        _raw_indexes[IMAGE_FEATURE_FILE] = raw_image_index
+
+        # 地名インデックス・行番号の計算はCPU処理のため別スレッドで行い、ループ上では参照の差し替えだけを行う
+        snapshot = await asyncio.to_thread(
+            _build_snapshot,
+            current,
+            photo_data,
+            place_generation,
+            text_table,
+            image_table,
+            raw_text_index,
+            raw_image_index
+        )
+        _current = snapshot
+
+        print(
+            f"カタログスナップショット更新: version={snapshot.version}, "
+            f"photos={len(photo_data)}, "
+            f"text={len(text_table) if text_table is not None else None}, "
+            f"image={len(image_table) if image_table is not None else None}, "
+            f"ann={snapshot.text_index is not None}/{snapshot.image_index is not None}"
+        )
+        return True
+
+
+async def run_catalog_refresher(interval: float = CATALOG_POLL_SECONDS) -> None:
+    """
+    一定間隔でStorageの世代をポーリングし、スナップショットを更新し続ける
+
+    Args:
+        interval: ポーリング間隔（秒）
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await refresh_catalog_snapshot()
+        except Exception as e:
+            print(f"カタログ更新エラー: {e}")
@@ -1,8 +1,14 @@
+import asyncio
+import numpy as np
 from typing import Optional, List, Any, Dict
 from repositories.firebase_repository import FirebaseDataManager
+from repositories.feature_store import FeatureStore
+from infrastructures.embedding_table import EmbeddingTable, table_filename
+from infrastructures.ivf_index import IVFIndex, ivf_filename
 
 # モジュールレベルでシングルトンインスタンスを保持
 _firebase_manager = FirebaseDataManager()
+_feature_store = FeatureStore(_firebase_manager)
 
 
 async def get_photo_data() -> Optional[List[Any]]:
@@ -28,6 +34,20 @@ async def get_photo_data() -> Optional[List[Any]]:
         return None
 
 
+async def get_place_data_generation() -> Optional[str]:
+    """
+    place_data.jsonの世代を取得
+
+    Returns:
+        世代を表す文字列、取得失敗時はNone
+    """
+    try:
+        return await _firebase_manager.get_place_data_generation()
+    except Exception as e:
+        print(f"place_data世代取得エラー: {e}")
+        return None
+
+
 async def add_query_image(new_item: Dict[str, Any]) -> bool:
     """
     query_imageに新しいアイテムを追加
@@ -50,45 +70,75 @@ async def add_query_image(new_item: Dict[str, Any]) -> bool:
         return False
 
 
-async def get_feature(filename: str) -> Optional[tuple[Dict[str, Any], List[str]]]:
+async def _load_legacy_feature_table(filename: str, generation: Optional[str] = None) -> Optional[EmbeddingTable]:
+    """旧形式（pickle化された {id: ベクトル} 辞書）の.npyを読み込み、テーブルに変換"""
+    raw_data = await _firebase_manager.get_feature_npy(filename)
+    if raw_data is None:
+        return None
+
+    # numpy配列の場合、.item()で中身を取り出す
+    if isinstance(raw_data, np.ndarray) and raw_data.shape == ():
+        raw_data = raw_data.item()
+
+    # 辞書形式でない場合はエラー
+    if not isinstance(raw_data, dict):
+        print(f"エラー: ロードされたデータは辞書形式ではありません: {filename}")
+        print(f"実際のデータ型: {type(raw_data)}")
+        return None
+
+    return await asyncio.to_thread(EmbeddingTable.from_feature_dict, raw_data)
+
+
+async def get_embedding_table(filename: str, max_age: Optional[float] = None) -> Optional[EmbeddingTable]:
     """
-    特徴量データとラベルを取得
+    埋め込みテーブルを取得
+
+    features/{stem}.table.npz を優先し、未変換の場合は旧形式の.npyから変換する
 
     Args:
-        filename: 特徴量ファイル名
+        filename: 特徴量ファイル名 (例: "vit.npy")
+        max_age: 世代を再確認せずに常駐データを使う最大秒数（0で必ず確認）
 
     Returns:
-        (特徴量データ, ラベルリスト) のタプル、取得失敗時はNone
+        EmbeddingTable、取得失敗時はNone
     """
     try:
         # ビジネス検証（例：ファイル名形式チェック）
         if not filename.endswith('.npy'):
             filename += '.npy'
 
-        # npyファイルを取得
-        raw_data = await _firebase_manager.get_feature_npy(filename)
-        if raw_data is None:
-            return None
+        # 変換済みテーブルを取得（プロセス内に常駐、世代が変わった時のみ再ダウンロード）
+        table = await _feature_store.get(table_filename(filename), _firebase_manager.get_embedding_table, max_age)
+        if table is not None:
+            return table
 
-        # numpy配列の場合、.item()で中身を取り出す
-        import numpy as np
-        if isinstance(raw_data, np.ndarray) and raw_data.shape == ():
-            raw_data = raw_data.item()
+        # 旧形式からの変換（scripts/convert_features.py 実行前の互換用）
+        return await _feature_store.get(filename, _load_legacy_feature_table, max_age)
 
-        # 辞書形式でない場合はエラー
-        if not isinstance(raw_data, dict):
-            print(f"エラー: ロードされたデータは辞書形式ではありません: {filename}")
-            print(f"実際のデータ型: {type(raw_data)}")
-            return None
+    except Exception as e:
+        print(f"特徴量取得エラー: {e}")
+        return None
+
+
+async def get_ivf_index(filename: str, max_age: Optional[float] = None) -> Optional[IVFIndex]:
+    """
+    近似近傍インデックスを取得（scripts/build_ivf_index.py で作成したもの）
 
-        # 特徴量データとラベルを抽出
-        features = raw_data
-        labels = list(raw_data.keys())
+    Args:
+        filename: 特徴量ファイル名 (例: "vit.npy")
+        max_age: 世代を再確認せずに常駐データを使う最大秒数（0で必ず確認）
+
+    Returns:
+        IVFIndex、存在しない・取得失敗時はNone
+    """
+    try:
+        if not filename.endswith('.npy'):
+            filename += '.npy'
 
-        return features, labels
+        return await _feature_store.get(ivf_filename(filename), _firebase_manager.get_ivf_index, max_age)
 
     except Exception as e:
-        print(f"特徴量取得エラー: {e}")
+        print(f"近似近傍インデックス取得エラー: {e}")
         return None
 
 
@@ -0,0 +1,328 @@
+import math
+import os
+import numpy as np
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+from services.similarity_engine import SIMILARITY_ENGINE, top_k_positions
+
+# 重みを指定しない場合のテキスト・画像の重み
+SEARCH_TEXT_WEIGHT = float(os.environ.get("SEARCH_TEXT_WEIGHT", "0.5"))
+SEARCH_IMAGE_WEIGHT = float(os.environ.get("SEARCH_IMAGE_WEIGHT", "0.5"))
+
+# 1ページの件数（省略時）と上限
+SEARCH_TOP_K = int(os.environ.get("SEARCH_TOP_K", "50"))
+SEARCH_MAX_TOP_K = int(os.environ.get("SEARCH_MAX_TOP_K", "500"))
+
+# バッチ検索で比較する (テキスト, 画像) の重みの組
+DEFAULT_WEIGHT_GRID = ((1.0, 0.0), (0.75, 0.25), (0.5, 0.5), (0.25, 0.75), (0.0, 1.0))
+
+
+@dataclass(frozen=True)
+class FusionOptions:
+    """
+    検索結果の統合方法
+
+    legacy=True の場合は従来どおり候補全件を text_similarity / image_similarity のまま返す
+    """
+    text_weight: float = SEARCH_TEXT_WEIGHT
+    image_weight: float = SEARCH_IMAGE_WEIGHT
+    top_k: int = SEARCH_TOP_K
+    offset: int = 0
+    legacy: bool = False
+
+
+@dataclass
+class AlignedScores:
+    """
+    テキスト・画像の類似度を候補の位置でそろえた配列
+
+    positions は photo_data 内の位置（昇順・重複なし）、text / image は同じ順序の類似度
+    （どちらか一方にしかない候補のもう一方は0）
+    """
+    positions: np.ndarray
+    text: np.ndarray
+    image: np.ndarray
+    text_present: np.ndarray
+
+
+def encode_cursor(offset: int) -> str:
+    """次ページのカーソルを作る"""
+    return str(offset)
+
+
+def decode_cursor(cursor: Optional[str]) -> int:
+    """
+    カーソルから開始位置を取り出す
+
+    Args:
+        cursor: encode_cursor で作ったカーソル（Noneの場合は先頭）
+
+    Returns:
+        開始位置
+
+    Raises:
+        ValueError: 不正なカーソル
+    """
+    if cursor is None or cursor == "":
+        return 0
+    offset = int(cursor)
+    if offset < 0:
+        raise ValueError(f"不正なカーソルです: {cursor}")
+    return offset
+
+
+def candidate_budget(
+    needed: Optional[int],
+    engine: Optional[str] = None,
+    limit: Optional[int] = None
+) -> Optional[int]:
+    """
+    テキスト・画像それぞれの類似度計算で求める上位候補数
+
+    近似近傍検索（engine="ann"）は件数の指定がないと全件計算にフォールバックするため、
+    統合後に必要な件数以上（最低SEARCH_MAX_TOP_K件）を各側の候補数として渡す。
+    それ以外のエンジンでは全件を計算する（total・legacyの全件リストを従来どおりにする）
+
+    Args:
+        needed: 統合後に必要な件数（開始位置 + 件数、Noneの場合は全件）
+        engine: 類似度計算エンジン（省略時はSIMILARITY_ENGINE）
+        limit: 候補数の上限（カタログの件数、カーソルで極端な開始位置を指定されても全件を超えない）
+
+    Returns:
+        各側で求める候補数、全件の場合はNone
+    """
+    if needed is None or (engine or SIMILARITY_ENGINE) != "ann":
+        return None
+    budget = max(needed, SEARCH_MAX_TOP_K)
+    if limit is not None:
+        budget = min(budget, limit)
+    return budget
+
+
+def align_scores(
+    text_ranking: Tuple[np.ndarray, np.ndarray],
+    image_ranking: Tuple[np.ndarray, np.ndarray]
+) -> AlignedScores:
+    """
+    テキスト・画像それぞれの (位置, 類似度) を候補の和集合でそろえる
+
+    Args:
+        text_ranking: テキスト側の (photo_data内の位置, 類似度)
+        image_ranking: 画像側の (photo_data内の位置, 類似度)
+
+    Returns:
+        AlignedScores
+    """
+    text_positions, text_scores = text_ranking
+    image_positions, image_scores = image_ranking
+
+    # 位置はカタログ内の番号なので、ソートせずに位置を添字とする配列へ散らしてから集める
+    size = int(max(text_positions.max(initial=-1), image_positions.max(initial=-1))) + 1
+    text_dense = np.zeros(size, dtype=np.float32)
+    image_dense = np.zeros(size, dtype=np.float32)
+    text_mask = np.zeros(size, dtype=bool)
+    image_mask = np.zeros(size, dtype=bool)
+    text_dense[text_positions] = text_scores
+    text_mask[text_positions] = True
+    image_dense[image_positions] = image_scores
+    image_mask[image_positions] = True
+
+    positions = np.flatnonzero(text_mask | image_mask)
+    text = text_dense[positions]
+    image = image_dense[positions]
+    text_present = text_mask[positions]
+
+    return AlignedScores(positions=positions, text=text, image=image, text_present=text_present)
+
+
+def fuse_scores(aligned: AlignedScores, text_weight: float, image_weight: float) -> np.ndarray:
+    """重み付きの統合スコア（text_weight * text + image_weight * image）"""
+    return text_weight * aligned.text + image_weight * aligned.image
+
+
+def _items(
+    photo_data: List[Dict[str, Any]],
+    aligned: AlignedScores,
+    slots: np.ndarray,
+    fused: Optional[np.ndarray] = None
+) -> List[Dict[str, Any]]:
+    """指定した候補だけを辞書にする"""
+    items = []
+    for slot in slots.tolist():
+        item = photo_data[aligned.positions[slot]]
+        result_item = {
+            "id": item.get("id"),
+            "name": item.get("name", ""),
+            "location": item.get("location", ""),
+            "text_similarity": float(aligned.text[slot]),
+            "image_similarity": float(aligned.image[slot])
+        }
+        if fused is not None:
+            result_item["score"] = float(fused[slot])
+        items.append(result_item)
+    return items
+
+
+def _legacy_items(photo_data: List[Dict[str, Any]], aligned: AlignedScores) -> List[Dict[str, Any]]:
+    """integrate_similarities と同じ形式の全件リスト（テキスト側にない候補のname/locationは空）"""
+    items = []
+    for position, text, image, text_present in zip(
+        aligned.positions.tolist(), aligned.text.tolist(), aligned.image.tolist(), aligned.text_present.tolist()
+    ):
+        item = photo_data[position]
+        items.append({
+            "id": item.get("id"),
+            "name": item.get("name", "") if text_present else "",
+            "location": item.get("location", "") if text_present else "",
+            "text_similarity": text,
+            "image_similarity": image
+        })
+    return items
+
+
+def fuse_results(
+    photo_data: List[Dict[str, Any]],
+    aligned: AlignedScores,
+    options: FusionOptions
+) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """
+    統合スコアで並べて1ページ分だけ辞書にする
+
+    Args:
+        photo_data: カタログのデータリスト
+        aligned: align_scores の結果
+        options: 統合方法
+
+    Returns:
+        (結果リスト, ページ情報)、legacyの場合は (全件リスト, None)
+    """
+    if options.legacy:
+        return _legacy_items(photo_data, aligned), None
+
+    fused = fuse_scores(aligned, options.text_weight, options.image_weight)
+    end = options.offset + options.top_k
+    slots = top_k_positions(fused, end)[options.offset:end]
+
+    total = len(aligned.positions)
+    page = {
+        "top_k": options.top_k,
+        "text_weight": options.text_weight,
+        "image_weight": options.image_weight,
+        "total": total,
+        "next_cursor": encode_cursor(end) if end < total else None
+    }
+    return _items(photo_data, aligned, slots, fused), page
+
+
+def parse_weight_grid(spec: Optional[str]) -> np.ndarray:
+    """
+    重みの組の指定を (W, 2) 配列にする
+
+    Args:
+        spec: "テキスト:画像" をカンマ区切りで並べた文字列（例: "1:0,0.5:0.5,0:1"）、
+              Noneまたは空の場合は DEFAULT_WEIGHT_GRID
+
+    Returns:
+        (W, 2) の重み配列（各行が (テキストの重み, 画像の重み)）
+        ※ 同じ名前（weight_label）になる組は結果の辞書で1つにまとまるため、最初の1つだけ残す
+
+    Raises:
+        ValueError: 不正な指定
+    """
+    if not spec:
+        return np.array(DEFAULT_WEIGHT_GRID, dtype=np.float32)
+
+    pairs = []
+    for part in spec.split(","):
+        text_weight, image_weight = (float(value) for value in part.split(":"))
+        if not (math.isfinite(text_weight) and math.isfinite(image_weight)) or text_weight < 0 or image_weight < 0:
+            raise ValueError(f"重みは0以上の有限の値で指定してください: {part}")
+        pairs.append((text_weight, image_weight))
+
+    grid = np.array(pairs, dtype=np.float32)
+    first_rows: Dict[str, int] = {}
+    for row, pair in enumerate(grid.tolist()):
+        first_rows.setdefault(weight_label(*pair), row)
+    return grid[sorted(first_rows.values())]
+
+
+def weight_label(text_weight: float, image_weight: float) -> str:
+    """重みの組の名前（例: 0.75, 0.25 → "text_75_image_25"）"""
+    return f"text_{text_weight * 100:g}_image_{image_weight * 100:g}"
+
+
+def fuse_weight_grid(
+    aligned: AlignedScores,
+    weights: np.ndarray,
+    top_k: int = 1
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    複数の重みの組で統合スコアを一括計算し、組ごとの上位k件を返す
+
+    統合スコアは (W, 2) の重みと (2, N) の類似度の行列積1回で求め、
+    上位k件は行ごとのargpartitionで選ぶ（全件ソートはしない）
+
+    Args:
+        aligned: align_scores の結果
+        weights: (W, 2) の重み配列（parse_weight_grid の結果）
+        top_k: 組ごとに返す件数
+
+    Returns:
+        (組ごとの上位候補の添字 (W, k), 同じ形の統合スコア)、kは候補数との小さい方
+    """
+    num_candidates = len(aligned.positions)
+    k = min(top_k, num_candidates)
+    if k <= 0:
+        empty = np.empty((len(weights), 0))
+        return empty.astype(np.intp), empty.astype(np.float32)
+
+    fused = weights.astype(np.float32) @ np.vstack([aligned.text, aligned.image])
+
+    if k < num_candidates:
+        slots = np.argpartition(-fused, k - 1, axis=1)[:, :k]
+    else:
+        slots = np.broadcast_to(np.arange(num_candidates), fused.shape)
+    top_scores = np.take_along_axis(fused, slots, axis=1)
+
+    # 上位k件の中だけをスコアの高い順（同点は位置の小さい順）に並べる
+    order = np.lexsort((slots, -top_scores), axis=1)
+    slots = np.take_along_axis(slots, order, axis=1)
+    return slots, np.take_along_axis(top_scores, order, axis=1)
+
+
+def weight_grid_results(
+    photo_data: List[Dict[str, Any]],
+    aligned: AlignedScores,
+    weights: np.ndarray,
+    top_k: int = 1
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    重みの組ごとの上位k件を integrate_with_weights と同じ形式の辞書にする
+
+    Args:
+        photo_data: カタログのデータリスト
+        aligned: align_scores の結果
+        weights: (W, 2) の重み配列
+        top_k: 組ごとに返す件数
+
+    Returns:
+        重みの組の名前（weight_label）→ 上位k件のリスト
+    """
+    slots, scores = fuse_weight_grid(aligned, weights, top_k)
+
+    results = {}
+    for (text_weight, image_weight), row_slots, row_scores in zip(weights.tolist(), slots.tolist(), scores.tolist()):
+        items = []
+        for slot, score in zip(row_slots, row_scores):
+            item = photo_data[aligned.positions[slot]]
+            text_present = bool(aligned.text_present[slot])
+            items.append({
+                "id": item.get("id"),
+                "name": item.get("name", "") if text_present else "",
+                "location": item.get("location", "") if text_present else "",
+                "text_similarity": float(aligned.text[slot]),
+                "image_similarity": float(aligned.image[slot]),
+                "integrated_score": score
+            })
+        results[weight_label(text_weight, image_weight)] = items
+    return results
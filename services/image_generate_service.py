@@ -1,17 +1,35 @@
 # 画像生成コード．一回につき0.03$ほど
 
+import asyncio
+import io
 import os
 from dotenv import load_dotenv
-from typing import Optional
+from typing import Optional, Dict, Any
 from PIL import Image
+from filelock import FileLock
 from infrastructures.translation_client import translate_to_english
+from infrastructures.firebase_config import download_storage_bytes
 from infrastructures.huggingface_client import get_huggingface_client
 from infrastructures.file_manager import FileManager
+from infrastructures.feature_cache import atomic_temp_path, hold_file_lock
+from infrastructures.single_flight import SingleFlight
+from services.image_storage_service import check_blob_exists, confirm_blob_exists
+from infrastructures.blob_manifest import get_blob_manifest
 
 # .envから環境変数読み込み
 load_dotenv()
 
-def create_enhanced_prompt(user_input: str) -> str:
+# 同一プロンプトの生成をワーカー間でも1回にする場合のロックファイル置き場（空文字の場合はプロセス内のみ）
+IMAGE_GENERATION_LOCK_DIR = os.environ.get("IMAGE_GENERATION_LOCK_DIR", "")
+
+# 他のワーカーの生成完了を待つ最大秒数
+IMAGE_GENERATION_LOCK_TIMEOUT = float(os.environ.get("IMAGE_GENERATION_LOCK_TIMEOUT", "300"))
+
+# ファイル名（FileManager.create_filename）単位で生成を1回にまとめる
+_generation_flight = SingleFlight("image_generate")
+_generation_stats = {"generated": 0, "cross_worker_reused": 0}
+
+async def create_enhanced_prompt(user_input: str) -> str:
     """
     プロンプトを拡張・翻訳する（ビジネスロジック）
 
@@ -22,7 +40,7 @@ def create_enhanced_prompt(user_input: str) -> str:
         拡張・翻訳されたプロンプト
     """
     enhanced_prompt = f"{user_input}，このプロンプトに基づいて写真で撮影したようなリアルな風景画像を出力してください。人物は絶対に映してはいけません。"
-    english_prompt = translate_to_english(enhanced_prompt)
+    english_prompt = await translate_to_english(enhanced_prompt)
     return english_prompt
 
 async def check_existing_image_in_storage(filename: str) -> Optional[str]:
@@ -35,10 +53,7 @@ async def check_existing_image_in_storage(filename: str) -> Optional[str]:
     Returns:
         見つかった画像のパス（なければNone）
     """
-    from firebase_admin import storage
-
     try:
-        bucket = storage.bucket()
         extensions = ['.jpg', '.jpeg', '.png', '.webp']
 
         # filename から拡張子を除去
@@ -48,10 +63,17 @@ async def check_existing_image_in_storage(filename: str) -> Optional[str]:
         for folder in ["api/query_image", "api/search_image"]:
             for ext in extensions:
                 blob_path = f"{folder}/{base_name}{ext}"
-                blob = bucket.blob(blob_path)
-                if blob.exists():
+                if await check_blob_exists(blob_path):
                     print(f"既存画像発見 ({folder}): {blob_path}")
                     return blob_path
+
+        # マニフェストの「なし」は他のインスタンスが直近に保存した画像を含まないため、
+        # 生成（有料）する前に生成画像の保存先だけStorageに1回問い合わせて確認する
+        if get_blob_manifest().is_loaded:
+            blob_path = f"api/search_image/{base_name}.jpg"
+            if await confirm_blob_exists(blob_path):
+                print(f"既存画像発見 (api/search_image、Storageで確認): {blob_path}")
+                return blob_path
         return None
 
     except Exception as e:
@@ -62,33 +84,38 @@ async def load_image_from_storage(blob_path: str) -> Optional[Image.Image]:
     """
     Firebase Storageから画像を読み込み
 
+    ダウンロード（SDK呼び出し）とデコードは別スレッドで行い、イベントループを止めない
+
     Args:
         blob_path: Firebase Storageのパス
 
     Returns:
         PIL Image オブジェクト（失敗時はNone）
     """
-    from firebase_admin import storage
-    from io import BytesIO
-
     try:
-        bucket = storage.bucket()
-        blob = bucket.blob(blob_path)
-
-        image_bytes = BytesIO()
-        blob.download_to_file(image_bytes)
-        image_bytes.seek(0)
-
-        return Image.open(image_bytes)
+        image_data = await download_storage_bytes(blob_path)
+        if image_data is None:
+            return None
+        return await asyncio.to_thread(_decode_image, image_data)
 
     except Exception as e:
         print(f"Firebase Storage画像読み込みエラー: {e}")
         return None
 
+
+def _decode_image(image_data: bytes) -> Image.Image:
+    """画像バイト列をデコードする（同期処理）"""
+    image = Image.open(io.BytesIO(image_data))
+    image.load()
+    return image
+
+
 async def image_generate(prompt: str) -> Optional[Image.Image]:
     """
     画像を生成する（ビジネスロジック層）
 
+    同じファイル名になるプロンプトの生成が実行中の場合は、新たに生成せずその結果を待つ
+
     Args:
         prompt: 生成プロンプト
 
@@ -107,35 +134,89 @@ async def image_generate(prompt: str) -> Optional[Image.Image]:
                 print(f"既存画像を使用: {existing_path}")
                 return existing_image
 
-        # 3. ローカルキャッシュチェック
-        script_dir = FileManager.get_script_directory()
-        parent_dir = os.path.dirname(script_dir)
-        images_dir = FileManager.setup_directory(parent_dir, ["api", "query_wait"])
-        output_path = os.path.join(images_dir, filename)
+        # 3〜6. ローカルキャッシュ確認と生成（同一ファイル名は1回だけ実行）
+        return await _generation_flight.run(filename, lambda: _load_or_generate(prompt, filename))
 
-        if FileManager.file_exists(output_path):
-            existing_image = FileManager.load_image(output_path)
-            if existing_image:
-                print(f"ローカルキャッシュを使用: {output_path}")
-                return existing_image
+    except Exception as e:
+        print(f"画像生成サービスエラー: {e}")
+        return None
 
-        # 4. プロンプト処理
-        english_prompt = create_enhanced_prompt(prompt)
 
-        # 5. 画像生成
-        print(f"新規画像生成開始: {prompt}")
-        hf_client = get_huggingface_client()
-        image = hf_client.generate_image(english_prompt)
-        if image is None:
-            return None
+async def _load_or_generate(prompt: str, filename: str) -> Optional[Image.Image]:
+    """
+    ローカルキャッシュ（api/query_wait）になければ画像を生成して保存する
 
-        # 6. ローカルキャッシュに保存
-        if FileManager.save_image(image, output_path):
-            print(f"ローカルキャッシュに保存: {output_path}")
-            return image
-        else:
-            return None
+    IMAGE_GENERATION_LOCK_DIR が設定されている場合はファイルロックで他のワーカーとも排他し、
+    ロック取得後にキャッシュを確認し直す（他のワーカーが生成済みであればそれを使う）
+    """
+    # 3. ローカルキャッシュチェック
+    script_dir = FileManager.get_script_directory()
+    parent_dir = os.path.dirname(script_dir)
+    images_dir = FileManager.setup_directory(parent_dir, ["api", "query_wait"])
+    output_path = os.path.join(images_dir, filename)
+
+    cached_image = await asyncio.to_thread(_load_local_cache, output_path)
+    if cached_image is not None:
+        return cached_image
+
+    if not IMAGE_GENERATION_LOCK_DIR:
+        return await _generate_and_save(prompt, output_path)
+
+    os.makedirs(IMAGE_GENERATION_LOCK_DIR, exist_ok=True)
+    lock = FileLock(os.path.join(IMAGE_GENERATION_LOCK_DIR, f"{filename}.lock"), thread_local=False)
+    async with hold_file_lock(lock, IMAGE_GENERATION_LOCK_TIMEOUT):
+        cached_image = await asyncio.to_thread(_load_local_cache, output_path)
+        if cached_image is not None:
+            _generation_stats["cross_worker_reused"] += 1
+            return cached_image
+        return await _generate_and_save(prompt, output_path)
+
+
+def _load_local_cache(output_path: str) -> Optional[Image.Image]:
+    """ローカルキャッシュの画像を読み込む（なければNone、同期処理のため別スレッドで呼ぶ）"""
+    if FileManager.file_exists(output_path):
+        existing_image = FileManager.load_image(output_path)
+        if existing_image:
+            existing_image.load()
+            print(f"ローカルキャッシュを使用: {output_path}")
+            return existing_image
+    return None
+
+
+async def _generate_and_save(prompt: str, output_path: str) -> Optional[Image.Image]:
+    """画像を生成してローカルキャッシュに保存する"""
+    # 4. プロンプト処理
+    english_prompt = await create_enhanced_prompt(prompt)
+
+    # 5. 画像生成（外部APIの待ち時間中もイベントループを止めない）
+    print(f"新規画像生成開始: {prompt}")
+    _generation_stats["generated"] += 1
+    hf_client = get_huggingface_client()
+    image = await asyncio.to_thread(hf_client.generate_image, english_prompt)
+    if image is None:
+        return None
 
+    # 6. ローカルキャッシュに保存（書きかけのファイルが他から見えないよう一時ファイル経由、エンコードと書き込みは別スレッド）
+    try:
+        await asyncio.to_thread(_save_local_cache, image, output_path)
+        print(f"ローカルキャッシュに保存: {output_path}")
+        return image
     except Exception as e:
-        print(f"画像生成サービスエラー: {e}")
+        print(f"画像保存エラー: {str(e)}")
         return None
+
+
+def _save_local_cache(image: Image.Image, output_path: str) -> None:
+    """画像をJPEGでローカルキャッシュに書き込む（同期処理）"""
+    with atomic_temp_path(output_path) as temp_path:
+        image.save(temp_path, format="JPEG")
+
+
+def get_image_generation_stats() -> Dict[str, Any]:
+    """
+    画像生成の統計
+
+    Returns:
+        生成回数・相乗り数・他ワーカーの生成結果の再利用数
+    """
+    return {**_generation_flight.stats(), **_generation_stats}
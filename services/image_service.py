@@ -1,46 +1,100 @@
-from typing import List, Dict, Any, Optional, Union
+import asyncio
+import io
+import numpy as np
+from typing import Optional, Tuple, Union
 from fastapi import UploadFile
 from services.vit import get_image_vector
-from services.firebase_service import get_feature, get_photo_data
-from services.similarity_service import similarity_sort
+from services.catalog_service import CatalogSnapshot, get_catalog_snapshot
+from services.similarity_service import rank_positions, results_from_positions
 from infrastructures.image_downloader import download_image_from_url
 
-async def image_caluculate(image: Union[UploadFile, str, None], filtered_data: Optional[List[Dict[str, Any]]] = None):
+
+async def image_query_vector(image: Union[UploadFile, str, bytes, None]) -> Optional[np.ndarray]:
+    """
+    検索画像を読み込んでベクトル化する
+
+    Args:
+        image: UploadFile / 画像URL / 画像のバイトデータ / PIL Image（image_generateの結果）
+
+    Returns:
+        画像ベクトル（失敗時はNone）
+    """
     # imageがNoneの場合は空の結果を返す
     if image is None:
-        return []
+        return None
 
     # 1. 画像データを読み込み
-    if isinstance(image, str):
+    if isinstance(image, bytes):
+        image_data = image
+    elif isinstance(image, str):
         # URL文字列の場合
         image_data = await download_image_from_url(image)
         if image_data is None:
             print(f"画像URLからのダウンロード失敗: {image}")
-            return []
+            return None
     elif hasattr(image, 'read'):
         # UploadFileの場合
         image_data = await image.read()
     else:
-        # PIL.Imageの場合（image_generateから返された）
-        import io
-        buffer = io.BytesIO()
-        image.save(buffer, format='JPEG')
-        image_data = buffer.getvalue()
+        # PIL.Imageの場合（image_generateから返された、エンコードは別スレッド）
+        image_data = await asyncio.to_thread(_encode_jpeg, image)
 
     # 2. vit.pyを使用して画像からベクトルを抽出
-    vector = get_image_vector(image_data)
+    return await get_image_vector(image_data)
+
+
+def _encode_jpeg(image) -> bytes:
+    """PIL ImageをJPEGのバイト列にする（同期処理）"""
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+def image_scores(
+    vector: Optional[np.ndarray],
+    filtered_positions: Optional[np.ndarray],
+    snapshot: CatalogSnapshot,
+    top_k: Optional[int] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    画像ベクトルと候補のコサイン類似度を計算してソート
+
+    Args:
+        vector: 画像ベクトル
+        filtered_positions: テキスト側の地名フィルタ結果（Noneの場合はカタログ全体）
+        snapshot: カタログスナップショット
+        top_k: 上位何件を返すか（Noneの場合は全件）
 
+    Returns:
+        (類似度の高い順のphoto_data内の位置, 類似度)
+    """
     if vector is None:
-        return []
+        return np.array([], dtype=np.intp), np.array([], dtype=np.float32)
 
-    # filtered_dataがない場合はget_photo_dataから取得
-    if filtered_data is None:
-        filtered_data = await get_photo_data()
+    # filtered_positions（テキスト側の地名フィルタ結果）がない場合はカタログ全体を対象にする
+    if filtered_positions is None:
+        filtered_positions = np.arange(len(snapshot.photo_data), dtype=np.intp)
 
-    # 3. npyファイルから特徴量データを取得
-    features, labels = await get_feature("vit.npy")
+    return rank_positions(
+        filtered_positions, snapshot.image_rows, vector, snapshot.image_table,
+        top_k=top_k, index=snapshot.image_index
+    )
 
-    # 4. コサイン類似度を計算してソート
-    similarity_results = similarity_sort(filtered_data, vector, features, labels)
 
-    return similarity_results
+async def image_caluculate(image: Union[UploadFile, str, bytes, None], filtered_positions: Optional[np.ndarray] = None, top_k: Optional[int] = None, snapshot: Optional[CatalogSnapshot] = None):
+    # 1〜2. 画像を読み込んでベクトル化
+    vector = await image_query_vector(image)
+
+    if vector is None:
+        return []
+
+    # 3. カタログスナップショットを取得（テキスト側と同じものを渡すと一貫したビューになる）
+    if snapshot is None:
+        snapshot = await get_catalog_snapshot()
+    if snapshot is None:
+        print("カタログスナップショットが取得できませんでした")
+        return []
+
+    # 4. コサイン類似度を計算してソート
+    positions, scores = image_scores(vector, filtered_positions, snapshot, top_k)
+    return results_from_positions(snapshot.photo_data, positions, scores)
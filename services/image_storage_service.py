@@ -1,31 +1,100 @@
+import asyncio
+import io
 import os
 from typing import Optional, Tuple
 from fastapi import UploadFile
 from firebase_admin import storage
 from infrastructures.firebase_config import initialize_firebase
+from infrastructures.blob_manifest import get_blob_manifest, BLOB_MANIFEST_REFRESH_SECONDS
 
 # Firebase初期化
 initialize_firebase()
 
 
+async def refresh_blob_manifest() -> bool:
+    """Blobマニフェストを一覧取得し直す（一覧取得は別スレッドで実行）"""
+    return await asyncio.to_thread(get_blob_manifest().load)
+
+
+async def run_blob_manifest_refresher(interval: float = BLOB_MANIFEST_REFRESH_SECONDS) -> None:
+    """
+    一定間隔でBlobマニフェストを取得し直し続ける（他のインスタンスの書き込みを反映する）
+
+    Args:
+        interval: 更新間隔（秒）
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await refresh_blob_manifest()
+        except Exception as e:
+            print(f"Blobマニフェスト更新エラー: {e}")
+
+
+async def detach_upload_file(image: UploadFile) -> UploadFile:
+    """
+    アップロード画像をメモリ上のコピーにする
+
+    リクエストのUploadFileはレスポンス送信後に閉じられるため、
+    レスポンス後に読み込む処理（ストリーミング・バックグラウンド保存）にはコピーを渡す
+
+    Args:
+        image: アップロードされた画像ファイル
+
+    Returns:
+        同じファイル名・ヘッダーを持つメモリ上のUploadFile
+    """
+    await image.seek(0)
+    image_data = await image.read()
+    await image.seek(0)
+    return UploadFile(
+        file=io.BytesIO(image_data),
+        filename=image.filename,
+        headers=image.headers
+    )
+
+
 async def check_blob_exists(blob_path: str) -> bool:
-    """指定パスのBlobが存在するかチェック"""
+    """指定パスのBlobが存在するかチェック（マニフェストにあればStorageに問い合わせない）"""
+    exists = get_blob_manifest().exists(blob_path)
+    if exists is not None:
+        return exists
+    return await confirm_blob_exists(blob_path)
+
+
+async def confirm_blob_exists(blob_path: str) -> bool:
+    """
+    マニフェストを使わずStorageに存在を問い合わせる（存在した場合はマニフェストにも反映）
+
+    マニフェストの「なし」は他のインスタンスの直近の書き込みを含まないため、
+    誤りが高くつく判断（画像生成など）の前に確認する場合に使う
+    """
     try:
         bucket = storage.bucket()
         blob = bucket.blob(blob_path)
-        return blob.exists()
+        exists = await asyncio.to_thread(blob.exists)
     except Exception as e:
         print(f"Blob存在チェックエラー ({blob_path}): {e}")
         return False
 
+    if exists:
+        get_blob_manifest().add(blob_path)
+    return exists
+
 
 async def save_image_to_storage(image_data: bytes, blob_path: str, content_type: str = "image/jpeg") -> bool:
     """画像データをFirebase Storageに保存"""
     try:
         bucket = storage.bucket()
         blob = bucket.blob(blob_path)
-        blob.upload_from_string(image_data, content_type=content_type)
-        blob.make_public()
+
+        # アップロードは同期APIのため別スレッドで実行（イベントループを止めない）
+        def upload():
+            blob.upload_from_string(image_data, content_type=content_type)
+            blob.make_public()
+
+        await asyncio.to_thread(upload)
+        get_blob_manifest().add(blob_path)
         print(f"画像保存成功: {blob_path}")
         return True
     except Exception as e:
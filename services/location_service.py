@@ -1,40 +1,82 @@
-from typing import List, Dict, Any, Set
+import numpy as np
+from typing import List, Dict, Any, Set, Iterable, Collection
 
+# 地名マッチングに使うキーワードの最小文字数
+MIN_KEYWORD_LENGTH = 2
 
-def filter_location(keywords: List[str], data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    """
-    キーワードによる地名フィルタリング
 
-    Args:
-        keywords: 抽出されたキーワードリスト
-        data: フィルタリング対象のデータリスト
+class LocationIndex:
+    """
+    地名の部分文字列 → 地名 の転置インデックス
 
-    Returns:
-        地名でフィルタリングされたデータリスト
+    カタログ内の異なる地名ごとに長さ MIN_KEYWORD_LENGTH 以上の部分文字列をすべて登録しておき、
+    検索時は抽出したキーワードを1回ずつ引くだけで `keyword in location` と同じ結果を得る。
+    地名ごとのデータ位置（カタログ内の添字）は事前に配列化しておく
     """
-    if not keywords or not data:
-        return []
 
-    filtered_data = []
-    matched_locations: Set[str] = set()
+    def __init__(self, data: List[Dict[str, Any]]):
+        """
+        Args:
+            data: カタログのデータリスト（スナップショットごとに1回だけ構築する）
+        """
+        location_ids: Dict[str, int] = {}
+        positions_by_location: List[List[int]] = []
+        for position, item in enumerate(data):
+            location = item.get('location', '')
+            location_id = location_ids.get(location)
+            if location_id is None:
+                location_id = location_ids[location] = len(positions_by_location)
+                positions_by_location.append([])
+            positions_by_location[location_id].append(position)
+
+        substrings: Dict[str, Set[int]] = {}
+        for location, location_id in location_ids.items():
+            if not isinstance(location, str):
+                continue
+            for start in range(len(location)):
+                for stop in range(start + MIN_KEYWORD_LENGTH, len(location) + 1):
+                    substrings.setdefault(location[start:stop], set()).add(location_id)
+
+        self.size = len(data)
+        self.locations = list(location_ids)
+        self._positions = [np.array(positions, dtype=np.intp) for positions in positions_by_location]
+        self._substrings = {
+            substring: np.array(sorted(ids), dtype=np.intp) for substring, ids in substrings.items()
+        }
+
+    def match_locations(self, keywords: Iterable[str]) -> np.ndarray:
+        """
+        いずれかのキーワードを含む地名のIDを取得
+
+        Args:
+            keywords: 抽出されたキーワード
+
+        Returns:
+            地名IDの配列（self.locationsの添字）
+        """
+        matched = [self._substrings[k] for k in set(keywords) if len(k) >= MIN_KEYWORD_LENGTH and k in self._substrings]
+        if not matched:
+            return np.array([], dtype=np.intp)
+        return np.unique(np.concatenate(matched))
+
+    def filter_positions(self, keywords: Collection[str]) -> np.ndarray:
+        """
+        キーワードを部分文字列として含む地名のデータ位置を昇順で返す
 
-    # 1. 地名マッチング
-    for item in data:
-        location = item.get('location', '')
+        - キーワードがない場合は空
+        - 一致する地名がない場合は全件
 
-        # 2文字以上のキーワードで地名マッチング
-        for keyword in keywords:
-            if len(keyword) >= 2 and keyword in location:
-                matched_locations.add(location)
-                break
+        Args:
+            keywords: 抽出されたキーワード
 
-    # 2. マッチした地名のデータをすべて収集
-    for item in data:
-        if item.get('location') in matched_locations:
-            filtered_data.append(item)
+        Returns:
+            カタログ内の位置の配列（昇順）
+        """
+        if not keywords or self.size == 0:
+            return np.array([], dtype=np.intp)
 
-    # 3. 一致する地名がない場合は元のデータをそのまま返す
-    if not filtered_data:
-        return data
+        location_ids = self.match_locations(keywords)
+        if len(location_ids) == 0:
+            return np.arange(self.size, dtype=np.intp)
 
-    return filtered_data
+        return np.sort(np.concatenate([self._positions[location_id] for location_id in location_ids]))
@@ -1,3 +1,4 @@
+import asyncio
 from typing import Optional, Dict, Any
 from datetime import datetime, timezone
 from firebase_admin import firestore
@@ -41,7 +42,8 @@ async def save_api_log(
         # Firestoreに保存（ユーザーごとのサブコレクション）
         db = get_firestore_client()
         doc_ref = db.collection('users').document(user_id).collection('api_logs').document()
-        doc_ref.set(log_data)
+        # 書き込みは同期APIのため別スレッドで実行（イベントループを止めない）
+        await asyncio.to_thread(doc_ref.set, log_data)
 
         print(f"API log saved: {api_endpoint} by user {user_id}")
         return True
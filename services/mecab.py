@@ -1,33 +1,46 @@
+import os
+import threading
+import unicodedata
+from functools import lru_cache
 import MeCab
-from typing import List, Dict, Any
-from services.location_service import filter_location
-from services.firebase_service import get_photo_data
+from typing import Dict, Any, Optional, FrozenSet
+from services.metrics_service import increment_counter, register_collector
 
+# 抽出対象の品詞
+TARGET_POS = ["名詞", "形容詞", "動詞", "形容動詞", "形状詞"]
 
-async def keyword(text: str) -> List[Dict[str, Any]]:
-    """
-    形態素解析でキーワードを抽出し、地名でフィルタリングした結果を返す
+# キーワード抽出結果のキャッシュ件数（NFKC正規化後のテキスト単位）
+KEYWORD_CACHE_SIZE = int(os.environ.get("KEYWORD_CACHE_SIZE", "4096"))
+
+# スレッドごとのMeCab Tagger（Taggerはスレッドセーフではないため共有しない）
+_local = threading.local()
 
-    Args:
-        text: 解析対象のテキスト
+
+def get_tagger() -> MeCab.Tagger:
+    """
+    現在のスレッドのMeCab Taggerを取得（初回のみ辞書を読み込んで生成）
 
     Returns:
-        地名でフィルタリングされたデータリスト
+        MeCab.Tagger
+
+    Raises:
+        RuntimeError: MeCabの初期化に失敗した場合
     """
-    # 抽出対象の品詞
-    target_pos = ["名詞", "形容詞", "動詞", "形容動詞", "形状詞"]
+    tagger = getattr(_local, "tagger", None)
+    if tagger is None:
+        tagger = MeCab.Tagger()
+        _local.tagger = tagger
+        increment_counter("mecab_taggers_created")
+    return tagger
 
-    # MeCabの初期化
-    try:
-        mecab = MeCab.Tagger()
-    except RuntimeError as e:
-        print(f"MeCab初期化エラー: {e}")
-        return []
 
-    keywords = []
+@lru_cache(maxsize=KEYWORD_CACHE_SIZE)
+def _extract_keywords_cached(normalized_text: str) -> FrozenSet[str]:
+    """正規化済みテキストからキーワードを抽出（結果はLRUキャッシュされる）"""
+    keywords = set()
 
     # 形態素解析実行
-    node = mecab.parseToNode(text)
+    node = get_tagger().parseToNode(normalized_text)
 
     while node:
         features = node.feature.split(',')
@@ -36,21 +49,49 @@ async def keyword(text: str) -> List[Dict[str, Any]]:
             surface = node.surface  # 表層形
 
             # 指定した品詞かつ有効な単語の場合（1文字でもOK）
-            if pos in target_pos and surface and len(surface) >= 1:
-                keywords.append(surface)
+            if pos in TARGET_POS and surface and len(surface) >= 1:
+                keywords.add(surface)
 
         node = node.next
 
-    # 重複削除
-    keywords = list(set(keywords))
+    return frozenset(keywords)
+
+
+def extract_keywords(text: str) -> Optional[FrozenSet[str]]:
+    """
+    形態素解析でキーワードを抽出する
+
+    テキストはNFKC正規化してから解析し、同じ正規化結果のテキストはキャッシュから返す
+
+    Args:
+        text: 解析対象のテキスト
+
+    Returns:
+        キーワードの集合、MeCabの初期化に失敗した場合はNone
+    """
+    normalized_text = unicodedata.normalize("NFKC", text or "")
+    try:
+        return _extract_keywords_cached(normalized_text)
+    except RuntimeError as e:
+        print(f"MeCab初期化エラー: {e}")
+        return None
+
+
+def warmup_tagger() -> None:
+    """現在のスレッドのTaggerを生成し、辞書を読み込んでおく"""
+    get_tagger().parse("函館の夜景")
+
+
+def get_keyword_cache_stats() -> Dict[str, Any]:
+    """
+    キーワードキャッシュの統計
+
+    Returns:
+        hits / misses / size / maxsize の辞書
+    """
+    info = _extract_keywords_cached.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "maxsize": info.maxsize}
 
-    # データ取得
-    photo_data = await get_photo_data()
-    if not photo_data:
-        print("photo_dataが取得できませんでした")
-        return []
 
-    # 地名フィルタリング
-    filtered_data = filter_location(keywords, photo_data)
+register_collector("keyword_cache", get_keyword_cache_stats)
 
-    return filtered_data
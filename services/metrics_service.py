@@ -0,0 +1,78 @@
+import threading
+from typing import Any, Callable, Dict
+
+# プロセス内のメトリクス（/metrics で公開）
+_lock = threading.Lock()
+_counters: Dict[str, float] = {}
+_observations: Dict[str, Dict[str, float]] = {}
+_collectors: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+
+def increment_counter(name: str, amount: float = 1) -> None:
+    """
+    カウンタを加算
+
+    Args:
+        name: メトリクス名
+        amount: 加算する値
+    """
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def observe(name: str, value: float) -> None:
+    """
+    観測値（所要時間など）を記録し、件数・合計・最大値を集計する
+
+    Args:
+        name: メトリクス名
+        value: 観測値
+    """
+    with _lock:
+        stats = _observations.get(name)
+        if stats is None:
+            stats = _observations[name] = {"count": 0, "sum": 0.0, "max": value}
+        stats["count"] += 1
+        stats["sum"] += value
+        stats["max"] = max(stats["max"], value)
+
+
+def register_collector(name: str, collector: Callable[[], Dict[str, Any]]) -> None:
+    """
+    取得時に値を計算するメトリクスを登録（キャッシュの統計など）
+
+    Args:
+        name: メトリクス名
+        collector: 辞書を返す関数
+    """
+    with _lock:
+        _collectors[name] = collector
+
+
+def get_metrics() -> Dict[str, Any]:
+    """
+    全メトリクスのスナップショットを取得
+
+    Returns:
+        counters / observations / collectors ごとの辞書
+    """
+    with _lock:
+        counters = dict(_counters)
+        observations = {
+            name: {**stats, "avg": stats["sum"] / stats["count"] if stats["count"] else 0.0}
+            for name, stats in _observations.items()
+        }
+        collectors = dict(_collectors)
+
+    collected = {}
+    for name, collector in collectors.items():
+        try:
+            collected[name] = collector()
+        except Exception as e:
+            collected[name] = {"error": str(e)}
+
+    return {
+        "counters": counters,
+        "observations": observations,
+        "collectors": collected
+    }
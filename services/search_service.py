@@ -1,53 +1,348 @@
-from typing import Optional, List, Dict, Any
+import asyncio
+import io
+import os
+import threading
+import unicodedata
+import numpy as np
+from dataclasses import dataclass
+from typing import Optional, List, Dict, Any, AsyncIterator, Tuple
 from fastapi import UploadFile
-from services.text_generate_service import text_generate
+from PIL import Image
+from services.text_generate_service import generate_caption, select_caption_profile
 from services.image_generate_service import image_generate
-from services.text_service import text_caluculate
-from services.image_service import image_caluculate
+from services.text_service import text_caluculate, text_filter_positions, text_scores
+from services.image_service import image_caluculate, image_query_vector, image_scores
+from services.bert import text_vector
 from services.integration_service import integrate_similarities
 from services.suggestion_service import random_suggest
+from services.catalog_service import get_catalog_snapshot
+from services.fusion_service import (
+    FusionOptions,
+    align_scores,
+    candidate_budget,
+    fuse_results,
+    parse_weight_grid,
+    weight_grid_results,
+    weight_label
+)
+from services.metrics_service import observe
+from infrastructures.stage_timer import StageTimer
+from infrastructures.memory_cache import LRUCache
+from infrastructures.embedding_cache import content_hash
 
 
-async def search_tourist_spots(
+# 検索結果キャッシュ（件数上限と有効期限）
+SEARCH_RESULT_CACHE_SIZE = int(os.environ.get("SEARCH_RESULT_CACHE_SIZE", "256"))
+SEARCH_RESULT_CACHE_TTL = float(os.environ.get("SEARCH_RESULT_CACHE_TTL", "600"))
+
+
+@dataclass(frozen=True)
+class _CachedSearch:
+    """
+    キャッシュする検索結果（重み付き統合の前の類似度）
+
+    重み・件数・開始位置はキャッシュ後に適用するため、ページ送りや重みの変更もキャッシュから返せる
+    生成画像はPIL画像のままだと1枚数MBになるため、JPEGのバイト列で保持してヒット時に復元する
+    """
+    actual_text: str
+    text_ranking: Tuple[np.ndarray, np.ndarray]
+    image_ranking: Tuple[np.ndarray, np.ndarray]
+    generated_jpeg: Optional[bytes]
+
+
+_result_cache = LRUCache(SEARCH_RESULT_CACHE_SIZE, ttl=SEARCH_RESULT_CACHE_TTL)
+_result_cache_version: Optional[int] = None
+_result_cache_lock = threading.Lock()
+
+
+def _encode_jpeg(image: Image.Image) -> bytes:
+    """生成画像をキャッシュ用のJPEGバイト列にする"""
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def _decode_jpeg(data: bytes) -> Image.Image:
+    """キャッシュしたJPEGバイト列を画像に戻す"""
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    return image
+
+
+def _normalize_query_text(text: str) -> str:
+    """キャッシュのキー用に検索テキストを正規化（全角・半角と空白の違いを無視）"""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+def _result_cache_key(
+    text: Optional[str],
+    image_data: Optional[bytes],
+    profile: Optional[str],
+    version: int,
+    budget: Optional[int] = None
+) -> tuple:
+    """
+    検索結果キャッシュのキー
+
+    (正規化テキスト, 画像の内容ハッシュ, テキスト生成のデコード設定, カタログの版数, 各側の候補数)
+    ※ デコード設定はテキストを画像から生成する場合のみ設定される（テキスト生成に実際に使うものを渡す）
+    ※ 候補数は近似近傍検索の場合のみ設定される（全件計算の結果はどのページにも使える）
+    """
+    return (
+        _normalize_query_text(text) if text is not None else None,
+        content_hash(image_data) if image_data is not None else None,
+        profile,
+        version,
+        budget
+    )
+
+
+def _lookup_result(key: tuple, version: int) -> Optional[_CachedSearch]:
+    """キャッシュから取得（カタログの版数が変わっていれば古い結果をすべて捨てる）"""
+    global _result_cache_version
+    with _result_cache_lock:
+        if _result_cache_version != version:
+            if _result_cache_version is not None:
+                print(f"カタログ更新のため検索結果キャッシュを破棄: version={_result_cache_version} → {version}")
+            _result_cache.clear()
+            _result_cache_version = version
+    return _result_cache.get(key)
+
+
+def get_search_result_cache_stats() -> Dict[str, Any]:
+    """検索結果キャッシュの統計"""
+    stats = _result_cache.stats()
+    stats["catalog_version"] = _result_cache_version
+    return stats
+
+
+async def search_tourist_spots_events(
     text: Optional[str] = None,
-    image: Optional[UploadFile] = None
-) -> Dict[str, Any]:
+    image: Optional[UploadFile] = None,
+    caption_profile: Optional[str] = None,
+    caption_budget_ms: Optional[float] = None,
+    fusion: Optional[FusionOptions] = None
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    テキスト・画像で観光地を検索し、結果がそろった順に途中経過を返す
+
+    次の依存関係だけを守って各段階を並行に実行する
+      - カタログ取得 … テキスト側・画像側で共有
+      - テキスト側: (画像からのテキスト生成) → 地名フィルタ → テキストベクトル化 → テキスト類似度
+      - 画像側    : (テキストからの画像生成) → 画像ベクトル化 → 画像類似度（地名フィルタの結果を使用）
+
+    同じ検索（正規化テキスト・画像の内容・カタログの版数が同じ）の類似度はキャッシュから返す
+
+    返すイベント（この順）
+      - "text" : テキスト類似度だけで統合した結果（image_similarityは0）
+      - "image": 画像類似度の更新分（[{"id", "image_similarity"}]、legacy以外は最終結果のページ分のみ）
+      - "final": search_tourist_spots と同じ最終結果
+
+    Args:
+        text: 検索テキスト（Noneの場合は画像から生成）
+        image: 検索画像（Noneの場合はテキストから生成）
+        caption_profile: 画像からのテキスト生成のデコード設定
+        caption_budget_ms: 画像からのテキスト生成に使える時間
+        fusion: 結果の統合方法（重み・件数・開始位置、省略時は既定値）
+
+    Yields:
+        (イベント名, 内容)
+    """
+    timer = StageTimer()
+    fusion = fusion or FusionOptions()
+    empty_ranking = (np.array([], dtype=np.intp), np.array([], dtype=np.float32))
+
     # 元の入力を記録
     original_text = text
     original_image = image
 
-    text_generated = False
-    image_generated = False
+    text_generated = text is None
+    image_generated = image is None
 
-    if text==None:
-        text = await text_generate(image)
-        text_generated = True
+    # デコード設定は1回だけ選び、キャッシュのキーとテキスト生成の両方に使う
+    # （caption_budget_ms の場合、実測の所要時間で選択が変わるため）
+    profile = select_caption_profile(caption_profile, caption_budget_ms) if text_generated else None
+    translation_failed = False
 
-    if image==None:
-        image = await image_generate(text)
-        image_generated = True
+    # アップロード画像は1回だけ読み込み、テキスト生成と画像ベクトル化で共有する
+    image_data = None
+    if image is not None:
+        image_data = await image.read()
+        await image.seek(0)
 
-    text_similar, filtered_data = await text_caluculate(text)
-    image_similar = await image_caluculate(image, filtered_data)
+    # テキスト・画像で同じカタログスナップショットを使う（キャッシュのキーにも版数を使う）
+    snapshot = await timer.track("catalog", get_catalog_snapshot())
+    photo_data = snapshot.photo_data if snapshot is not None else []
 
-    # テキストと画像の類似度を統合
-    integrated_results = integrate_similarities(text_similar, image_similar)
+    # 各側の候補数（開始位置はカーソルから来るため、カタログの件数で頭打ちにする）
+    budget = None if fusion.legacy else candidate_budget(fusion.offset + fusion.top_k, limit=len(photo_data))
 
-    return {
-        "results": integrated_results,
-        "metadata": {
-            "actual_text": text,
-            "text_generated": text_generated,
-            "image_generated": image_generated,
-            "has_image": image is not None,
-            "original_text": original_text,
-            "has_original_image": original_image is not None
-        },
-        "_internal": {
-            "actual_image": image,
-            "original_image": original_image
+    # 同じ検索の結果がキャッシュにあれば推論をすべて省略する
+    cache_key = None
+    cached = None
+    if snapshot is not None:
+        cache_key = _result_cache_key(text, image_data, profile, snapshot.version, budget)
+        with timer.measure("result_cache"):
+            cached = _lookup_result(cache_key, snapshot.version)
+
+    text_task = text_branch_task = image_branch_task = None
+    if cached is None:
+        async def resolve_text() -> Optional[str]:
+            nonlocal translation_failed
+            if not text_generated:
+                return text
+            caption = await timer.track("text_generate", generate_caption(image_data, profile))
+            if caption is None:
+                return None
+            # 翻訳に失敗した場合は英語のキャプションのまま検索する
+            translation_failed = caption["japanese"] == caption["english"]
+            return caption["japanese"]
+
+        text_task = asyncio.ensure_future(resolve_text())
+
+        async def resolve_image():
+            if not image_generated:
+                return image
+            # 画像生成は生成元のテキストだけを待つ（テキスト側の類似度計算とは並行）
+            return await timer.track("image_generate", image_generate(await text_task))
+
+        async def text_branch():
+            actual_text = await text_task
+            if snapshot is None:
+                return np.array([], dtype=np.intp), empty_ranking
+            with timer.measure("keyword_filter"):
+                filtered_positions = text_filter_positions(actual_text, snapshot) if actual_text else np.array([], dtype=np.intp)
+            vector = await timer.track("text_vector", text_vector(actual_text))
+            with timer.measure("text_score"):
+                return filtered_positions, text_scores(vector, filtered_positions, snapshot, budget)
+
+        async def image_branch():
+            actual_image = await resolve_image()
+            source = image_data if not image_generated else actual_image
+            vector = await timer.track("image_vector", image_query_vector(source))
+            return actual_image, vector
+
+        text_branch_task = asyncio.ensure_future(text_branch())
+        image_branch_task = asyncio.ensure_future(image_branch())
+
+    try:
+        # 1. テキスト側が終わった時点で先に返す（画像生成・画像ベクトル化は続行中）
+        if cached is not None:
+            actual_text = cached.actual_text
+            text_ranking = cached.text_ranking
+        else:
+            filtered_positions, text_ranking = await text_branch_task
+            actual_text = await text_task
+
+        text_results, _ = fuse_results(photo_data, align_scores(text_ranking, empty_ranking), fusion)
+        yield "text", {
+            "results": text_results,
+            "metadata": {
+                "actual_text": actual_text,
+                "text_generated": text_generated,
+                "elapsed_ms": timer.summary()["total"]
+            }
         }
-    }
+
+        # 2. 画像側を待って画像類似度を返す
+        if cached is not None:
+            # 生成画像はキャッシュしたものを使う（保存・ログ記録は通常どおり行う）
+            actual_image = image
+            if image_generated:
+                actual_image = None
+                if cached.generated_jpeg is not None:
+                    actual_image = await asyncio.to_thread(_decode_jpeg, cached.generated_jpeg)
+            image_ranking = cached.image_ranking
+        else:
+            actual_image, image_vector = await image_branch_task
+
+            image_ranking = empty_ranking
+            if snapshot is not None:
+                with timer.measure("image_score"):
+                    image_ranking = image_scores(image_vector, filtered_positions, snapshot, budget)
+            else:
+                print("カタログスナップショットが取得できませんでした")
+
+            # テキスト・画像とも揃った結果だけをキャッシュする（生成・翻訳の失敗を残さない）
+            if cache_key is not None and actual_text and image_vector is not None and not translation_failed:
+                generated_jpeg = None
+                if image_generated and actual_image is not None:
+                    generated_jpeg = await asyncio.to_thread(_encode_jpeg, actual_image)
+                _result_cache.set(cache_key, _CachedSearch(
+                    actual_text=actual_text,
+                    text_ranking=text_ranking,
+                    image_ranking=image_ranking,
+                    generated_jpeg=generated_jpeg
+                ))
+
+        # 3. テキストと画像の類似度を重み付きで統合し、1ページ分だけ結果にする
+        with timer.measure("integrate"):
+            integrated_results, page = fuse_results(photo_data, align_scores(text_ranking, image_ranking), fusion)
+
+        yield "image", {
+            "results": [{"id": item["id"], "image_similarity": item["image_similarity"]} for item in integrated_results],
+            "metadata": {
+                "image_generated": image_generated,
+                "has_image": actual_image is not None,
+                "elapsed_ms": timer.summary()["total"]
+            }
+        }
+
+        timings = timer.summary()
+        for stage, values in timings["stages"].items():
+            observe(f"search_stage_ms.{stage}", values["duration"])
+        observe("search_total_ms", timings["total"])
+
+        yield "final", {
+            "results": integrated_results,
+            "metadata": {
+                "actual_text": actual_text,
+                "text_generated": text_generated,
+                "image_generated": image_generated,
+                "has_image": actual_image is not None,
+                "original_text": original_text,
+                "has_original_image": original_image is not None,
+                "cache_hit": cached is not None,
+                "page": page,
+                "timings_ms": timings
+            },
+            "_internal": {
+                "actual_image": actual_image,
+                "original_image": original_image
+            }
+        }
+    finally:
+        # 途中で打ち切られた場合（クライアント切断・エラー）は残りの処理を止める
+        for task in (text_branch_task, image_branch_task, text_task):
+            if task is not None and not task.done():
+                task.cancel()
+
+
+async def search_tourist_spots(
+    text: Optional[str] = None,
+    image: Optional[UploadFile] = None,
+    caption_profile: Optional[str] = None,
+    caption_budget_ms: Optional[float] = None,
+    fusion: Optional[FusionOptions] = None
+) -> Dict[str, Any]:
+    """
+    テキスト・画像で観光地を検索する（search_tourist_spots_events の最終結果のみを返す）
+
+    Args:
+        text: 検索テキスト（Noneの場合は画像から生成）
+        image: 検索画像（Noneの場合はテキストから生成）
+        caption_profile: 画像からのテキスト生成のデコード設定
+        caption_budget_ms: 画像からのテキスト生成に使える時間
+        fusion: 結果の統合方法（重み・件数・開始位置、省略時は既定値）
+
+    Returns:
+        results / metadata（pageにページ情報、timings_msに段階ごとの開始・所要時間）/ _internal
+    """
+    result: Dict[str, Any] = {}
+    async for event, payload in search_tourist_spots_events(text, image, caption_profile, caption_budget_ms, fusion):
+        if event == "final":
+            result = payload
+    return result
 
 
 async def search_with_url(
@@ -57,6 +352,8 @@ async def search_with_url(
     """
     テキストと画像URLで検索する（バッチ検索用）
 
+    従来形式の全件リストを返すため、近似近傍検索は使わず全件を計算する
+
     Args:
         text: 検索テキスト
         image_url: 画像のURL
@@ -65,8 +362,9 @@ async def search_with_url(
         検索結果
     """
     # 画像URLをそのまま使用（image_serviceでダウンロード処理される）
-    text_similar, filtered_data = await text_caluculate(text)
-    image_similar = await image_caluculate(image_url, filtered_data)
+    snapshot = await get_catalog_snapshot()
+    text_similar, filtered_positions = await text_caluculate(text, snapshot=snapshot)
+    image_similar = await image_caluculate(image_url, filtered_positions, snapshot=snapshot)
 
     # テキストと画像の類似度を統合
     integrated_results = integrate_similarities(text_similar, image_similar)
@@ -84,38 +382,52 @@ async def search_with_url(
 
 async def search_with_url_and_weights(
     text: str,
-    image_url: str
+    image_url: str,
+    weights: Optional[np.ndarray] = None,
+    top_k: int = 1
 ) -> Dict[str, Any]:
     """
-    テキストと画像URLで検索し、5つの重み比率で統合した結果を返す
+    テキストと画像URLで検索し、複数の重み比率で統合した結果を返す
+
+    類似度は1回だけ計算し、すべての重み比率を1回の行列積で統合する
 
     Args:
         text: 検索テキスト
         image_url: 画像のURL
+        weights: (W, 2) の (テキスト, 画像) の重み配列（省略時は 100:0, 75:25, 50:50, 25:75, 0:100）
+        top_k: 重み比率ごとに返す件数
 
     Returns:
-        5つの統合比率（100:0, 75:25, 50:50, 25:75, 0:100）での上位1件ずつ
+        重み比率の名前（例: "text_75_image_25"）→ 上位1件（top_k>1の場合は上位k件のリスト、該当なしはNone）
     """
-    from services.integration_service import integrate_with_weights
+    if weights is None:
+        weights = parse_weight_grid(None)
 
-    # テキストと画像の類似度を計算
-    text_similar, filtered_data = await text_caluculate(text)
-    image_similar = await image_caluculate(image_url, filtered_data)
+    # テキストと画像の類似度を計算（テキスト側と画像ベクトル化は並行に実行）
+    snapshot = await get_catalog_snapshot()
+    if snapshot is None:
+        print("カタログスナップショットが取得できませんでした")
+        return {weight_label(*pair): None for pair in weights.tolist()}
 
-    # 5つの統合比率で計算
-    result_100_0 = integrate_with_weights(text_similar, image_similar, 1.0, 0.0, top_n=1)
-    result_75_25 = integrate_with_weights(text_similar, image_similar, 0.75, 0.25, top_n=1)
-    result_50_50 = integrate_with_weights(text_similar, image_similar, 0.5, 0.5, top_n=1)
-    result_25_75 = integrate_with_weights(text_similar, image_similar, 0.25, 0.75, top_n=1)
-    result_0_100 = integrate_with_weights(text_similar, image_similar, 0.0, 1.0, top_n=1)
+    # 近似近傍検索の場合は各側の上位候補だけを計算する
+    budget = candidate_budget(top_k, limit=len(snapshot.photo_data))
 
-    return {
-        "text_100_image_0": result_100_0[0] if result_100_0 else None,
-        "text_75_image_25": result_75_25[0] if result_75_25 else None,
-        "text_50_image_50": result_50_50[0] if result_50_50 else None,
-        "text_25_image_75": result_25_75[0] if result_25_75 else None,
-        "text_0_image_100": result_0_100[0] if result_0_100 else None
-    }
+    async def text_branch():
+        filtered_positions = text_filter_positions(text, snapshot)
+        vector = await text_vector(text)
+        return filtered_positions, text_scores(vector, filtered_positions, snapshot, budget)
+
+    (filtered_positions, text_ranking), image_vector = await asyncio.gather(
+        text_branch(), image_query_vector(image_url)
+    )
+    image_ranking = image_scores(image_vector, filtered_positions, snapshot, budget)
+
+    # すべての重み比率で一括統合
+    grid = weight_grid_results(snapshot.photo_data, align_scores(text_ranking, image_ranking), weights, top_k)
+
+    if top_k == 1:
+        return {label: (items[0] if items else None) for label, items in grid.items()}
+    return {label: (items or None) for label, items in grid.items()}
 
 
 async def get_suggested_images() -> Dict[str, List[str]]:
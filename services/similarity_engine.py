@@ -0,0 +1,185 @@
+import os
+import numpy as np
+from typing import Optional, Tuple
+from infrastructures.embedding_table import EmbeddingTable
+from infrastructures.ivf_index import IVFIndex
+from infrastructures.quantized_matrix import QUANTIZATION_MODES
+
+# 対応する類似度計算エンジン
+SIMILARITY_ENGINES = ("exact", "ann") + QUANTIZATION_MODES
+
+# 類似度計算エンジン（"exact" / "int8" / "ann"）
+SIMILARITY_ENGINE = os.environ.get("SIMILARITY_ENGINE", "exact")
+if SIMILARITY_ENGINE not in SIMILARITY_ENGINES:
+    raise ValueError(f"未対応のSIMILARITY_ENGINEです: {SIMILARITY_ENGINE} (対応: {', '.join(SIMILARITY_ENGINES)})")
+
+# 圧縮エンジン使用時にfloat32で再計算する上位候補数
+SIMILARITY_RESCORE_CANDIDATES = int(os.environ.get("SIMILARITY_RESCORE_CANDIDATES", "300"))
+
+# 近似近傍検索で走査するクラスタ数
+ANN_NPROBE = int(os.environ.get("ANN_NPROBE", "16"))
+
+# 候補数がこれ未満の場合は近似近傍検索を使わず全件計算する
+ANN_MIN_ROWS = int(os.environ.get("ANN_MIN_ROWS", "20000"))
+
+
+def _normalize_query(table: EmbeddingTable, query_vector: np.ndarray) -> Optional[np.ndarray]:
+    """クエリをfloat32の単位ベクトルにする（次元数不一致の場合はNone）"""
+    query = np.asarray(query_vector, dtype=np.float32).reshape(-1)
+    if query.shape[0] != table.dim:
+        print(f"類似度計算エラー: 次元数が一致しません (query={query.shape[0]}, table={table.dim})")
+        return None
+
+    query_norm = np.linalg.norm(query)
+    if query_norm == 0:
+        return query
+    return query / query_norm
+
+
+def score_rows(table: EmbeddingTable, rows: np.ndarray, query_vector: np.ndarray) -> Optional[np.ndarray]:
+    """
+    指定した行とクエリベクトルのコサイン類似度を (sim+1)/2 に正規化して返す
+
+    Args:
+        table: L2正規化済みの埋め込みテーブル
+        rows: スコアを計算する行番号の配列
+        query_vector: クエリベクトル
+
+    Returns:
+        rowsと同じ順序のスコア配列（次元数不一致の場合はNone）
+    """
+    query = _normalize_query(table, query_vector)
+    if query is None:
+        return None
+
+    # 候補が多い場合は全行との積を1回で計算してから抜き出す方が速い
+    if len(rows) * 2 > len(table):
+        similarity = (table.matrix @ query)[rows]
+    else:
+        similarity = table.matrix[rows] @ query
+
+    return (similarity + 1) / 2
+
+
+def top_k_positions(scores: np.ndarray, top_k: Optional[int] = None) -> np.ndarray:
+    """
+    スコアの高い順に位置を返す（同点は位置の小さい順）
+
+    Args:
+        scores: スコア配列
+        top_k: 上位何件を返すか（Noneの場合は全件）
+
+    Returns:
+        位置の配列
+    """
+    n = len(scores)
+    if top_k is None or top_k >= n:
+        return np.argsort(-scores, kind="stable")
+    if top_k <= 0:
+        return np.array([], dtype=np.intp)
+
+    # argpartitionで上位k件の境界値を求め、同点の扱いを全件ソートと揃える
+    kth_score = scores[np.argpartition(-scores, top_k - 1)[top_k - 1]]
+    above = np.flatnonzero(scores > kth_score)
+    ties = np.flatnonzero(scores == kth_score)[:top_k - len(above)]
+    selected = np.sort(np.concatenate([above, ties]))
+
+    return selected[np.argsort(-scores[selected], kind="stable")]
+
+
+def rank_rows(
+    table: EmbeddingTable,
+    rows: np.ndarray,
+    query_vector: np.ndarray,
+    top_k: Optional[int] = None,
+    engine: Optional[str] = None,
+    index: Optional[IVFIndex] = None
+) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """
+    指定した行をクエリとの類似度順に並べる
+
+    engineが "int8" の場合は圧縮行列で全候補を近似スコアリングし、
+    上位 max(top_k, SIMILARITY_RESCORE_CANDIDATES) 件だけをfloat32で再計算する。
+    再計算する行はファイルから直接読むため、メモリマップしたfloat32行列はプロセスに載らない
+
+    engineが "ann" の場合はIVFインデックスでクエリに近いクラスタの行だけをスコアリングする。
+    インデックスがない・top_k未指定・候補がANN_MIN_ROWS未満の場合は全件計算にフォールバックする
+
+    Args:
+        table: L2正規化済みの埋め込みテーブル
+        rows: 対象の行番号の配列
+        query_vector: クエリベクトル
+        top_k: 上位何件を返すか（Noneの場合は全件）
+        engine: "exact" / "int8" / "ann"（省略時はSIMILARITY_ENGINE）
+        index: engine="ann" で使うIVFインデックス
+
+    Returns:
+        (順位順の位置配列, rowsと同じ順序のスコア配列)、次元数不一致の場合はNone
+        ※ "ann" ではスコアリングしなかった位置のスコアはNaN
+
+    Raises:
+        ValueError: 未対応のエンジン
+    """
+    engine = engine or SIMILARITY_ENGINE
+    if engine not in SIMILARITY_ENGINES:
+        raise ValueError(f"未対応の類似度計算エンジンです: {engine}")
+
+    if engine == "ann":
+        if index is not None and top_k is not None and len(rows) >= ANN_MIN_ROWS:
+            return _rank_rows_ann(table, rows, query_vector, top_k, index)
+        engine = "exact"
+
+    if engine not in QUANTIZATION_MODES:
+        scores = score_rows(table, rows, query_vector)
+        if scores is None:
+            return None
+        return top_k_positions(scores, top_k), scores
+
+    query = _normalize_query(table, query_vector)
+    if query is None:
+        return None
+
+    # 1. 圧縮行列で近似スコアを計算
+    scores = (table.quantized(engine).dot(rows, query) + 1) / 2
+
+    # 2. 上位候補だけfloat32で再計算（スコアは従来と同じ値になる）
+    num_candidates = max(top_k or 0, SIMILARITY_RESCORE_CANDIDATES)
+    candidates = np.sort(top_k_positions(scores, num_candidates))
+    scores[candidates] = (table.read_rows(rows[candidates]) @ query + 1) / 2
+    ranked = candidates[top_k_positions(scores[candidates])]
+
+    if top_k is not None:
+        return ranked[:top_k], scores
+
+    # 全件要求の場合、候補外は近似スコア順で後ろに続ける
+    rest_mask = np.ones(len(rows), dtype=bool)
+    rest_mask[candidates] = False
+    rest = np.flatnonzero(rest_mask)
+    rest = rest[top_k_positions(scores[rest])]
+    return np.concatenate([ranked, rest]), scores
+
+
+def _rank_rows_ann(
+    table: EmbeddingTable,
+    rows: np.ndarray,
+    query_vector: np.ndarray,
+    top_k: int,
+    index: IVFIndex
+) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """IVFインデックスで候補を絞り込んでから正確にスコアリングする"""
+    query = _normalize_query(table, query_vector)
+    if query is None:
+        return None
+
+    # rows（地名フィルタ後の候補）以外の行はインデックス走査時に除外する
+    position_of_row = np.full(len(table), -1, dtype=np.intp)
+    position_of_row[rows] = np.arange(len(rows))
+    allowed = None if len(rows) == len(table) else position_of_row >= 0
+
+    candidates = index.candidate_rows(query, ANN_NPROBE, min_candidates=top_k, allowed=allowed)
+    positions = np.sort(position_of_row[candidates])
+
+    scores = np.full(len(rows), np.nan, dtype=np.float32)
+    scores[positions] = (table.matrix[rows[positions]] @ query + 1) / 2
+    ranked = positions[top_k_positions(scores[positions], top_k)]
+    return ranked, scores
@@ -1,71 +1,82 @@
 import numpy as np
-from typing import List, Dict, Any
-from sklearn.metrics.pairwise import cosine_similarity
+from typing import List, Dict, Any, Optional, Tuple
+from infrastructures.embedding_table import EmbeddingTable
+from infrastructures.ivf_index import IVFIndex
+from services.similarity_engine import rank_rows
 
 
-def similarity_sort(
-    filtered_data: List[Dict[str, Any]],
+def rank_positions(
+    positions: np.ndarray,
+    item_rows: np.ndarray,
     query_vector: np.ndarray,
-    features: np.ndarray,
-    labels: List[str]
-) -> List[Dict[str, Any]]:
+    table: Optional[EmbeddingTable],
+    top_k: Optional[int] = None,
+    engine: Optional[str] = None,
+    index: Optional[IVFIndex] = None
+) -> Tuple[np.ndarray, np.ndarray]:
     """
-    フィルタリングされたデータとクエリベクトル間のコサイン類似度を計算し、ソートする
+    候補の位置をクエリとの類似度順に並べる（配列のみで計算し、辞書は作らない）
 
     Args:
-        filtered_data: 地名でフィルタリングされたデータリスト
-        query_vector: クエリテキストのベクトル
-        features: npyファイルから取得したベクトル配列
-        labels: ベクトルに対応するIDリスト
+        positions: 対象とするphoto_data内の位置（昇順）
+        item_rows: photo_dataの各要素に対応するテーブルの行番号（テーブルにない場合は-1）
+        query_vector: クエリベクトル
+        table: 埋め込みテーブル
+        top_k: 上位何件を返すか（Noneの場合は全件）
+        engine: 類似度計算エンジン
+        index: engine="ann" で使う近似近傍インデックス
 
     Returns:
-        類似度の高い順にソートされた{"id": id, "similarity": similarity}の辞書リスト
+        (類似度順のphoto_data内の位置, 同じ順序の類似度)、計算できない場合は空配列
     """
-    if not filtered_data or query_vector is None:
-        return []
-
-    similarities = []
+    empty = (np.array([], dtype=np.intp), np.array([], dtype=np.float32))
+    if len(positions) == 0 or query_vector is None or table is None or len(table) == 0:
+        return empty
 
-    # filtered_dataのIDリストを作成
-    filtered_ids = [item.get('id') for item in filtered_data]
+    # テーブルにない要素を除き、同一行は先頭の要素を使う
+    candidate_rows = item_rows[positions]
+    present = candidate_rows >= 0
+    positions = positions[present]
+    if len(positions) == 0:
+        return empty
 
-    # labelsをループしてfeaturesから対応するベクトルを取得
-    for label_id in labels:
-        # filtered_dataに含まれるIDかチェック
-        if label_id in filtered_ids:
-            # 対応するitemを取得
-            item = next(item for item in filtered_data if item.get('id') == label_id)
+    # テーブルの行順で並べる（同じ類似度の場合の順序を従来と揃える）
+    rows, first = np.unique(candidate_rows[present], return_index=True)
+    row_items = positions[first]
 
-            # featuresから対応するベクトルを取得
-            feature_vector = features.get(label_id)
-            if feature_vector is None:
-                print(f"ベクトルが見つかりません (ID: {label_id})")
-                continue
+    # コサイン類似度を行列演算で一括計算し、類似度の高い順に上位k件を取得
+    ranking = rank_rows(table, rows, query_vector, top_k=top_k, engine=engine, index=index)
+    if ranking is None:
+        return empty
+    order, normalized_similarity = ranking
 
-            try:
-                # feature_vectorが1次元の場合は2次元にreshape
-                if feature_vector.ndim == 1:
-                    feature_vector_2d = feature_vector.reshape(1, -1)
-                else:
-                    feature_vector_2d = feature_vector
+    return row_items[order], normalized_similarity[order]
 
-                if query_vector.ndim == 1:
-                    query_vector_2d = query_vector.reshape(1, -1)
-                else:
-                    query_vector_2d = query_vector
 
-                # コサイン類似度計算
-                similarity = cosine_similarity(query_vector_2d, feature_vector_2d)[0][0]
-                normalized_similarity = (similarity + 1) / 2
-                name = item.get("name")
-                locarion = item.get("location")
-                similarities.append({"id": label_id, "name": name, "location": locarion, "similarity": float(normalized_similarity)})
+def results_from_positions(
+    photo_data: List[Dict[str, Any]],
+    positions: np.ndarray,
+    scores: np.ndarray
+) -> List[Dict[str, Any]]:
+    """
+    rank_positions の結果を{"id", "name", "location", "similarity"}の辞書リストにする
 
-            except Exception as e:
-                print(f"類似度計算エラー (ID: {label_id}): {e}")
-                continue
+    Args:
+        photo_data: カタログのデータリスト
+        positions: photo_data内の位置
+        scores: 位置と同じ順序の類似度
 
-    # 類似度の高い順にソート
-    sorted_results = sorted(similarities, key=lambda x: x["similarity"], reverse=True)
+    Returns:
+        辞書リスト（positionsの順序）
+    """
+    sorted_results = []
+    for position, similarity in zip(positions.tolist(), scores.tolist()):
+        item = photo_data[position]
+        sorted_results.append({
+            "id": item.get("id"),
+            "name": item.get("name"),
+            "location": item.get("location"),
+            "similarity": float(similarity)
+        })
 
     return sorted_results
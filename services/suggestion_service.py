@@ -1,16 +1,27 @@
 import random
 from typing import List, Dict, Any
 from services.firebase_service import get_api_query_images
+from infrastructures.blob_manifest import get_blob_manifest
+
+# 提案画像のディレクトリ
+QUERY_IMAGE_PREFIX = "api/query_image/"
+
 
 async def random_suggest() -> Dict[str, List[str]]:
     """
-    get_api_query_images()を呼び出し、その中からランダムで6つを返す
+    提案画像の一覧からランダムで6つを返す
+
+    一覧はBlobマニフェストから取得し、未読み込みの場合のみ get_api_query_images() でStorageに問い合わせる
 
     Returns:
         ランダムに選択された6つの画像IDのリスト
     """
     # 全ての画像データを取得
-    all_images = await get_api_query_images()
+    names = get_blob_manifest().names(QUERY_IMAGE_PREFIX)
+    if names is not None:
+        all_images = [name[len(QUERY_IMAGE_PREFIX):] for name in names if name != QUERY_IMAGE_PREFIX]
+    else:
+        all_images = await get_api_query_images()
 
     # 6つ以下の場合はそのまま返す
     if len(all_images) <= 6:
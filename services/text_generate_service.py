@@ -1,34 +1,170 @@
-from typing import Optional
+import os
+import threading
+import time
+from typing import Optional, Dict, Any, Union
 from fastapi import UploadFile
-from infrastructures.image_processor import ImageProcessor
+from infrastructures.image_processor import ImageProcessor, CAPTION_PROFILES, DEFAULT_CAPTION_PROFILE
+from infrastructures.inference_executor import run_inference
 from infrastructures.translation_client import translate_to_japanese
+from infrastructures.embedding_cache import content_hash
+from infrastructures.memory_cache import LRUCache
 
-async def text_generate(image: UploadFile) -> Optional[str]:
+# 既定のデコード設定（リクエストで指定がない場合）
+CAPTION_PROFILE = os.environ.get("CAPTION_PROFILE", DEFAULT_CAPTION_PROFILE)
+
+# キャプションキャッシュの件数
+CAPTION_CACHE_SIZE = int(os.environ.get("CAPTION_CACHE_SIZE", "1024"))
+
+# レイテンシ予算で選ぶ際、実測がまだないプロファイルの想定所要時間（ミリ秒、CPU上のBLIP-large）
+_ESTIMATED_CAPTION_MS = {"quality": 6000.0, "balanced": 2500.0, "fast": 1200.0}
+
+# 実測所要時間の指数移動平均の重み
+_LATENCY_EWMA_ALPHA = 0.2
+
+# (画像のSHA-256, デコード設定) → {"english": ..., "japanese": ...}
+_caption_cache = LRUCache(CAPTION_CACHE_SIZE)
+
+_latency_lock = threading.Lock()
+_observed_caption_ms: Dict[str, float] = {}
+
+
+def _record_caption_latency(profile: str, elapsed_ms: float) -> None:
+    """プロファイルごとの所要時間を指数移動平均で記録"""
+    with _latency_lock:
+        previous = _observed_caption_ms.get(profile)
+        if previous is None:
+            _observed_caption_ms[profile] = elapsed_ms
+        else:
+            _observed_caption_ms[profile] = previous + _LATENCY_EWMA_ALPHA * (elapsed_ms - previous)
+
+
+def _generate_caption(image_data: bytes, profile: str) -> Optional[str]:
+    """画像をデコードしてキャプションを生成し、所要時間を記録（推論用スレッドで実行）"""
+    pil_image = ImageProcessor.open_image(image_data)
+    started = time.perf_counter()
+    english_text = ImageProcessor.generate_text_from_image(pil_image, profile)
+    if english_text is not None:
+        _record_caption_latency(profile, (time.perf_counter() - started) * 1000)
+    return english_text
+
+
+def select_caption_profile(profile: Optional[str] = None, latency_budget_ms: Optional[float] = None) -> str:
     """
-    画像からテキストを生成する（ビジネスロジック層）
+    デコード設定を選ぶ
+
+    - profileが指定されていればそれを使う
+    - latency_budget_msが指定されていれば、所要時間（実測または想定）が予算内で最も品質の高いもの
+      （どれも収まらない場合は最速のもの）
+    - どちらもなければ CAPTION_PROFILE
 
     Args:
-        image: アップロードされた画像ファイル
+        profile: デコード設定名（"quality" / "balanced" / "fast"）
+        latency_budget_ms: キャプション生成に使える時間（ミリ秒）
 
     Returns:
-        生成された日本語テキスト（失敗時はNone）
+        デコード設定名
+    """
+    if profile:
+        if profile not in CAPTION_PROFILES:
+            raise ValueError(f"未対応のデコード設定です: {profile}")
+        return profile
+
+    if latency_budget_ms is not None:
+        with _latency_lock:
+            observed = dict(_observed_caption_ms)
+        for name in CAPTION_PROFILES:
+            expected_ms = observed.get(name, _ESTIMATED_CAPTION_MS.get(name, 0.0))
+            if expected_ms <= latency_budget_ms:
+                return name
+        return list(CAPTION_PROFILES)[-1]
+
+    return CAPTION_PROFILE
+
+
+def get_caption_stats() -> Dict[str, Any]:
+    """
+    キャプション生成の統計
+
+    Returns:
+        キャッシュの統計とプロファイルごとの実測所要時間
+    """
+    with _latency_lock:
+        observed = dict(_observed_caption_ms)
+    return {"cache": _caption_cache.stats(), "observed_ms": observed, "default_profile": CAPTION_PROFILE}
+
+
+async def generate_caption(
+    image: Union[UploadFile, bytes],
+    profile: Optional[str] = None,
+    latency_budget_ms: Optional[float] = None
+) -> Optional[Dict[str, str]]:
+    """
+    画像から英語のキャプションを生成し、日本語に翻訳する
+
+    同じ画像・同じデコード設定の結果はキャッシュから返す
+
+    Args:
+        image: アップロードされた画像ファイル、または画像のバイトデータ
+        profile: デコード設定（"quality" / "balanced" / "fast"）
+        latency_budget_ms: キャプション生成に使える時間（profile未指定時に設定を選ぶ）
+
+    Returns:
+        {"english": 英語, "japanese": 日本語}（翻訳に失敗した場合 japanese は英語のまま）、失敗時はNone
     """
     try:
-        # 1. 画像を処理してPIL Imageに変換
-        pil_image = await ImageProcessor.process_uploaded_image(image)
-        if pil_image is None:
+        profile = select_caption_profile(profile, latency_budget_ms)
+
+        # 1. 画像を読み込み、内容ハッシュでキャッシュを確認
+        if isinstance(image, bytes):
+            image_data = image
+        else:
+            image_data = await image.read()
+            await image.seek(0)
+        if not image_data:
             return None
 
-        # 2. 画像からテキスト生成
-        english_text = ImageProcessor.generate_text_from_image(pil_image)
+        cache_key = (content_hash(image_data), profile)
+        cached = _caption_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        # 2. 画像のデコードとテキスト生成（推論用スレッドプールで実行）
+        english_text = await run_inference("blip", _generate_caption, image_data, profile)
         if english_text is None:
             return None
 
         # 3. 日本語に翻訳
-        japanese_text = translate_to_japanese(english_text)
+        japanese_text = await translate_to_japanese(english_text)
+        if not japanese_text:
+            return None
 
-        return japanese_text
+        caption = {"english": english_text, "japanese": japanese_text}
+
+        # 翻訳に失敗した場合（原文がそのまま返る）はキャッシュしない
+        if japanese_text != english_text:
+            _caption_cache.set(cache_key, caption)
+        return caption
 
     except Exception as e:
         print(f"テキスト生成サービスエラー: {str(e)}")
         return None
+
+
+async def text_generate(
+    image: Union[UploadFile, bytes],
+    profile: Optional[str] = None,
+    latency_budget_ms: Optional[float] = None
+) -> Optional[str]:
+    """
+    画像からテキストを生成する（ビジネスロジック層）
+
+    Args:
+        image: アップロードされた画像ファイル、または画像のバイトデータ
+        profile: デコード設定（"quality" / "balanced" / "fast"）
+        latency_budget_ms: キャプション生成に使える時間（profile未指定時に設定を選ぶ）
+
+    Returns:
+        生成された日本語テキスト（失敗時はNone）
+    """
+    caption = await generate_caption(image, profile, latency_budget_ms)
+    return caption["japanese"] if caption is not None else None
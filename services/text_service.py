@@ -1,20 +1,68 @@
-from services.mecab import keyword
+from services.mecab import extract_keywords
 from services.bert import text_vector
-from services.firebase_service import get_feature
-from services.similarity_service import similarity_sort
+from services.catalog_service import CatalogSnapshot, get_catalog_snapshot
+from services.similarity_service import rank_positions, results_from_positions
+from typing import Optional, Tuple
+import numpy as np
 
-async def text_caluculate(text: str):
-    # 1. 形態素解析 + 地名フィルタリング（mecab.pyで実行）
-    filtered_data = await keyword(text)
 
-    # 2. テキストベクトル化
-    vector = text_vector(text)
+def text_filter_positions(text: str, snapshot: CatalogSnapshot) -> np.ndarray:
+    """
+    形態素解析 + 地名フィルタリング（スナップショットの地名インデックスで候補位置を取得）
+
+    Args:
+        text: 検索テキスト
+        snapshot: カタログスナップショット
+
+    Returns:
+        photo_data内の候補位置の配列
+    """
+    keywords = extract_keywords(text)
+    if keywords is None:
+        return np.array([], dtype=np.intp)
+    return snapshot.location_index.filter_positions(keywords)
+
+
+def text_scores(
+    vector: Optional[np.ndarray],
+    filtered_positions: np.ndarray,
+    snapshot: CatalogSnapshot,
+    top_k: Optional[int] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    テキストベクトルと候補のコサイン類似度を計算してソート
+
+    Args:
+        vector: テキストベクトル
+        filtered_positions: 地名フィルタ後の候補位置
+        snapshot: カタログスナップショット
+        top_k: 上位何件を返すか（Noneの場合は全件）
 
-    # 3. npyファイルからベクトルデータ取得
-    features, labels = await get_feature("sentence_bert_ja_mean_ver2.npy")
-    #features, labels = await get_feature("bert_ja_mean.npy")
+    Returns:
+        (類似度の高い順のphoto_data内の位置, 類似度)
+    """
+    return rank_positions(
+        filtered_positions, snapshot.text_rows, vector, snapshot.text_table,
+        top_k=top_k, index=snapshot.text_index
+    )
+
+
+async def text_caluculate(text: str, top_k: Optional[int] = None, snapshot: Optional[CatalogSnapshot] = None):
+    # 0. カタログスナップショット（メタデータとベクトルの一貫したビュー）
+    if snapshot is None:
+        snapshot = await get_catalog_snapshot()
+    if snapshot is None:
+        print("カタログスナップショットが取得できませんでした")
+        return [], np.array([], dtype=np.intp)
+
+    # 1. 形態素解析 + 地名フィルタリング
+    filtered_positions = text_filter_positions(text, snapshot)
+
+    # 2. テキストベクトル化
+    vector = await text_vector(text)
 
-    # 4. コサイン類似度計算とソート
-    similarity_results = similarity_sort(filtered_data, vector, features, labels)
+    # 3. コサイン類似度計算とソート
+    positions, scores = text_scores(vector, filtered_positions, snapshot, top_k)
+    similarity_results = results_from_positions(snapshot.photo_data, positions, scores)
 
-    return similarity_results, filtered_data
+    return similarity_results, filtered_positions
@@ -1,12 +1,56 @@
+import asyncio
+import os
 import numpy as np
-from typing import Optional
-from infrastructures.vit_vectorizer import process_image, extract_features
+from typing import Any, Dict, List, Optional
+from infrastructures.vit_vectorizer import vectorize_images
+from infrastructures.inference_executor import run_inference
+from infrastructures.micro_batcher import MicroBatcher, INFERENCE_MAX_BATCH_SIZE
+from infrastructures.embedding_cache import EmbeddingCache, content_hash
+from infrastructures.firebase_config import download_storage_bytes
+from services.firebase_service import get_api_query_images
 
+# 画像埋め込みキャッシュのメモリ層の件数
+IMAGE_EMBEDDING_CACHE_SIZE = int(os.environ.get("IMAGE_EMBEDDING_CACHE_SIZE", "2048"))
 
-def get_image_vector(image_data: bytes) -> Optional[np.ndarray]:
+# 画像埋め込みキャッシュのディスク層（空文字の場合はディスク層なし）
+IMAGE_EMBEDDING_CACHE_DIR = os.environ.get("IMAGE_EMBEDDING_CACHE_DIR", "/tmp/kankodori_embeddings")
+
+# 提案画像（事前計算の対象）のStorageディレクトリ
+QUERY_IMAGE_PREFIX = "api/query_image/"
+
+# 事前計算で同時にダウンロードする画像の数
+PRECOMPUTE_DOWNLOAD_CONCURRENCY = int(os.environ.get("PRECOMPUTE_DOWNLOAD_CONCURRENCY", "8"))
+
+# 事前計算で一度にダウンロード・ベクトル化する画像の数（メモリに保持する画像データの上限）
+PRECOMPUTE_CHUNK_SIZE = int(os.environ.get("PRECOMPUTE_CHUNK_SIZE", "64"))
+
+
+def _vectorize_batch(images_data: List[bytes]) -> List[Optional[np.ndarray]]:
+    """バッチャーから渡された画像を1回のforwardでベクトル化（推論用スレッドで実行）"""
+    return vectorize_images(images_data, batch_size=len(images_data))
+
+
+# 同時に届いた画像をまとめて1回のforwardで処理するバッチャー
+# （バッチサイズ・待ち時間は INFERENCE_MAX_BATCH_SIZE / INFERENCE_MAX_WAIT_MS）
+_image_batcher = MicroBatcher("vit", _vectorize_batch)
+
+
+# 画像バイト列のSHA-256をキーにした埋め込みキャッシュ
+_image_embedding_cache = EmbeddingCache("vit", IMAGE_EMBEDDING_CACHE_SIZE, IMAGE_EMBEDDING_CACHE_DIR)
+
+
+def get_image_embedding_cache() -> EmbeddingCache:
+    """画像埋め込みキャッシュのシングルトンインスタンスを取得"""
+    return _image_embedding_cache
+
+
+async def get_image_vector(image_data: bytes) -> Optional[np.ndarray]:
     """
     画像をベクトル化する
 
+    同じ内容の画像はキャッシュから返し、キャッシュにない場合のみ
+    同時に届いた他のリクエストとまとめて1回のforwardで処理される
+
     Args:
         image_data: 画像のバイトデータ
 
@@ -17,17 +61,106 @@ def get_image_vector(image_data: bytes) -> Optional[np.ndarray]:
         print("空の画像データが入力されました")
         return None
 
-    try:
-        # 1. 画像の前処理
-        inputs = process_image(image_data)
-        if inputs is None:
-            return None
-
-        # 2. 特徴量抽出
-        vector = extract_features(inputs)
+    key = content_hash(image_data)
+    vector = await _image_embedding_cache.get(key)
+    if vector is not None:
+        return vector
 
+    try:
+        vector = await _image_batcher.submit(image_data)
+        if vector is not None:
+            await _image_embedding_cache.set(key, vector)
         return vector
 
     except Exception as e:
         print(f"画像ベクトル化エラー: {e}")
         return None
+
+
+async def get_image_vectors(images_data: List[bytes], batch_size: Optional[int] = None) -> List[Optional[np.ndarray]]:
+    """
+    大量の画像をまとめてベクトル化する（カタログ埋め込みの作成などオフライン処理用）
+
+    リクエスト用のバッチャーを経由せず、batch_size件ずつ推論用スレッドプールで処理する
+
+    Args:
+        images_data: 画像のバイトデータのリスト
+        batch_size: 1回のforwardで処理する最大件数（省略時はINFERENCE_MAX_BATCH_SIZE）
+
+    Returns:
+        images_dataと同じ順序のベクトルのリスト（失敗した画像はNone）
+    """
+    batch_size = batch_size or INFERENCE_MAX_BATCH_SIZE
+    vectors: List[Optional[np.ndarray]] = []
+    for start in range(0, len(images_data), batch_size):
+        chunk = images_data[start:start + batch_size]
+        vectors.extend(await run_inference("vit_bulk", vectorize_images, chunk, batch_size))
+    return vectors
+
+
+async def precompute_image_embeddings(storage_paths: List[str]) -> Dict[str, Any]:
+    """
+    Storage上の画像の埋め込みを事前計算し、削除されないようキャッシュに保持する
+
+    ディスク層に既にあるものはViTを実行しない。
+    PRECOMPUTE_CHUNK_SIZE 件ずつダウンロード・ベクトル化し、保持する画像データをその件数までに抑える。
+    チャンク内のダウンロードは PRECOMPUTE_DOWNLOAD_CONCURRENCY 件ずつ並行に行う（SDK呼び出しは別スレッド）
+
+    Args:
+        storage_paths: 画像のStorageパスのリスト
+
+    Returns:
+        total / cached / computed / failed の件数
+    """
+    summary = {"total": len(storage_paths), "cached": 0, "computed": 0, "failed": 0}
+    semaphore = asyncio.Semaphore(max(1, PRECOMPUTE_DOWNLOAD_CONCURRENCY))
+
+    async def download(storage_path: str) -> Optional[bytes]:
+        async with semaphore:
+            return await download_storage_bytes(storage_path)
+
+    chunk_size = max(1, PRECOMPUTE_CHUNK_SIZE)
+    for start in range(0, len(storage_paths), chunk_size):
+        chunk = storage_paths[start:start + chunk_size]
+        downloads = await asyncio.gather(*(download(storage_path) for storage_path in chunk))
+
+        missing_keys: List[str] = []
+        missing_data: List[bytes] = []
+        for image_data in downloads:
+            if not image_data:
+                summary["failed"] += 1
+                continue
+
+            key = content_hash(image_data)
+            vector = await _image_embedding_cache.get(key)
+            if vector is not None:
+                await _image_embedding_cache.set(key, vector, pin=True)
+                summary["cached"] += 1
+            else:
+                missing_keys.append(key)
+                missing_data.append(image_data)
+
+        if missing_data:
+            vectors = await get_image_vectors(missing_data)
+            for key, vector in zip(missing_keys, vectors):
+                if vector is None:
+                    summary["failed"] += 1
+                    continue
+                await _image_embedding_cache.set(key, vector, pin=True)
+                summary["computed"] += 1
+
+    return summary
+
+
+async def precompute_query_image_embeddings() -> Dict[str, Any]:
+    """
+    提案画像（api/query_image/）すべての埋め込みを事前計算する
+
+    提案画像が検索に使われた場合、リクエスト処理中にViTを実行しない
+
+    Returns:
+        total / cached / computed / failed の件数
+    """
+    filenames = await get_api_query_images()
+    storage_paths = [f"{QUERY_IMAGE_PREFIX}{filename}" for filename in filenames]
+    return await precompute_image_embeddings(storage_paths)
@@ -0,0 +1,163 @@
+import asyncio
+import io
+import os
+import time
+from typing import Any, Callable, Dict, List, Set
+from PIL import Image
+from infrastructures.inference_executor import run_inference
+
+# 必須の段階が失敗した場合に再試行するまでの間隔（秒）
+WARMUP_RETRY_SECONDS = float(os.environ.get("WARMUP_RETRY_SECONDS", "30"))
+
+# ウォームアップ状態（プロセスごと）
+_ready = False
+_started_at = None
+_finished_at = None
+_errors: List[str] = []
+_pending: Set[str] = set()
+
+
+def _create_dummy_image() -> Image.Image:
+    """推論確認用のダミー画像を生成"""
+    return Image.new("RGB", (224, 224), color=(128, 128, 128))
+
+
+def _warmup_vit() -> None:
+    """ViTモデルを読み込み、ダミー画像で1回推論する"""
+    from infrastructures.vit_vectorizer import process_image, extract_features
+
+    buffer = io.BytesIO()
+    _create_dummy_image().save(buffer, format="JPEG")
+    inputs = process_image(buffer.getvalue())
+    if inputs is None or extract_features(inputs) is None:
+        raise RuntimeError("ViTのダミー推論に失敗しました")
+
+
+def _warmup_bert() -> None:
+    """Sentence-BERTモデルを読み込み、ダミーテキストで1回推論する"""
+    from infrastructures.bert_vectorizer import vectorize_text
+
+    if vectorize_text("函館の夜景") is None:
+        raise RuntimeError("Sentence-BERTのダミー推論に失敗しました")
+
+
+def _warmup_blip() -> None:
+    """BLIPモデルを読み込み、ダミー画像で1回キャプション生成する"""
+    from infrastructures.image_processor import ImageProcessor
+
+    if ImageProcessor.generate_text_from_image(_create_dummy_image()) is None:
+        raise RuntimeError("BLIPのダミー推論に失敗しました")
+
+
+async def _warmup_query_images() -> None:
+    """提案画像の埋め込みを事前計算する（ディスク層にあるものは読み込むだけ）"""
+    from services.vit import precompute_query_image_embeddings
+
+    summary = await precompute_query_image_embeddings()
+    print(f"提案画像の埋め込み: {summary}")
+
+
+async def _warmup_blob_manifest() -> None:
+    """Storage上の画像一覧（存在確認用のマニフェスト）を読み込む"""
+    from services.image_storage_service import refresh_blob_manifest
+
+    if not await refresh_blob_manifest():
+        raise RuntimeError("Blobマニフェストを取得できませんでした")
+
+
+async def _warmup_mecab() -> None:
+    """MeCabの辞書を読み込む（キーワード抽出はイベントループのスレッドで行うため同じスレッドで生成する）"""
+    from services.mecab import warmup_tagger
+
+    warmup_tagger()
+
+
+async def _warmup_catalog() -> None:
+    """観光地データと埋め込みテーブルを読み込み、カタログスナップショットを構築する"""
+    from services.catalog_service import get_catalog_snapshot
+
+    snapshot = await get_catalog_snapshot()
+    if snapshot is None:
+        raise RuntimeError("カタログスナップショットを構築できませんでした")
+    if snapshot.text_table is None or snapshot.image_table is None:
+        raise RuntimeError("埋め込みテーブルを取得できませんでした")
+
+
+async def _run_step(name: str, step: Callable) -> bool:
+    """ウォームアップの1段階を実行（成功した場合True）"""
+    step_started = time.perf_counter()
+    try:
+        if asyncio.iscoroutinefunction(step):
+            await step()
+        else:
+            await run_inference(f"warmup_{name}", step)
+        print(f"ウォームアップ完了: {name} ({time.perf_counter() - step_started:.1f}s)")
+        return True
+    except Exception as e:
+        print(f"ウォームアップエラー ({name}): {e}")
+        _errors.append(f"{name}: {e}")
+        return False
+
+
+async def run_warmup() -> None:
+    """
+    モデル・カタログ・埋め込みテーブルを事前に読み込む
+
+    モデルの読み込みはイベントループを止めないよう推論用スレッドプールで実行し、
+    その間も /healthz/ready は503を返し続ける
+
+    必須の段階（カタログ・MeCab・各モデル）が失敗した場合は WARMUP_RETRY_SECONDS ごとに再試行し、
+    すべて成功するまで503のままにする。任意の段階（Blobマニフェスト・提案画像の埋め込み）の失敗は
+    readyを妨げない（初回リクエスト時や定期更新で取り直される）
+    """
+    global _ready, _started_at, _finished_at
+
+    _started_at = time.time()
+    print("ウォームアップ開始")
+
+    # (名前, 処理, 必須かどうか)
+    steps = [
+        ("catalog", _warmup_catalog, True),
+        ("mecab", _warmup_mecab, True),
+        ("blob_manifest", _warmup_blob_manifest, False),
+        ("sbert", _warmup_bert, True),
+        ("vit", _warmup_vit, True),
+        ("query_images", _warmup_query_images, False),
+        ("blip", _warmup_blip, True),
+    ]
+
+    for name, step, critical in steps:
+        if not await _run_step(name, step) and critical:
+            _pending.add(name)
+
+    while _pending:
+        print(f"必須のウォームアップが未完了のため{WARMUP_RETRY_SECONDS:g}秒後に再試行: {sorted(_pending)}")
+        await asyncio.sleep(WARMUP_RETRY_SECONDS)
+        for name, step, _ in steps:
+            if name in _pending and await _run_step(name, step):
+                _pending.discard(name)
+
+    _finished_at = time.time()
+    _ready = True
+    print(f"ウォームアップ終了 ({_finished_at - _started_at:.1f}s)")
+
+
+def is_ready() -> bool:
+    """ウォームアップが完了しているかどうか"""
+    return _ready
+
+
+def get_warmup_status() -> Dict[str, Any]:
+    """
+    ウォームアップの状態を取得
+
+    Returns:
+        状態を表す辞書
+    """
+    return {
+        "ready": _ready,
+        "started_at": _started_at,
+        "finished_at": _finished_at,
+        "pending": sorted(_pending),
+        "errors": list(_errors)
+    }
@@ -0,0 +1,160 @@
+import asyncio
+import sys
+import threading
+import time
+import types
+import pytest
+from infrastructures import translation_client
+from infrastructures.circuit_breaker import CircuitBreaker
+from infrastructures.memory_cache import LRUCache
+from infrastructures.translation_client import GoogleTranslatorBackend, LocalTranslatorBackend, TranslationStore, translate_text
+
+
+class CountingBackend(LocalTranslatorBackend):
+    """呼び出し回数を数えるローカル翻訳"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def translate(self, text, target_lang, source_lang):
+        self.calls += 1
+        return super().translate(text, target_lang, source_lang)
+
+
+class SlowBackend(LocalTranslatorBackend):
+    """解除されるまで返らないローカル翻訳"""
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def translate(self, text, target_lang, source_lang):
+        self.release.wait(0.5)
+        return super().translate(text, target_lang, source_lang)
+
+
+class FailingBackend(LocalTranslatorBackend):
+    def translate(self, text, target_lang, source_lang):
+        raise RuntimeError("翻訳失敗")
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    """キャッシュ・ブレーカーをテストごとに作り直す"""
+    monkeypatch.setattr(translation_client, "_memory_cache", LRUCache(16))
+    monkeypatch.setattr(translation_client, "_store", TranslationStore(str(tmp_path / "translations.sqlite3")))
+    monkeypatch.setattr(translation_client, "_breaker", CircuitBreaker("test", failure_threshold=2, reset_seconds=0.05))
+    monkeypatch.setattr(translation_client, "TRANSLATION_TIMEOUT", 0.1)
+    return translation_client
+
+
+def test_translation_is_cached_in_memory_and_store(client, monkeypatch):
+    backend = CountingBackend()
+    monkeypatch.setattr(client, "_backend", backend)
+
+    assert asyncio.run(translate_text("京都", "en")) == "[en] 京都"
+    assert asyncio.run(translate_text("京都", "en")) == "[en] 京都"
+    assert backend.calls == 1
+
+    # メモリキャッシュが消えてもSQLiteから返る
+    monkeypatch.setattr(client, "_memory_cache", LRUCache(16))
+    assert asyncio.run(translate_text("京都", "en")) == "[en] 京都"
+    assert backend.calls == 1
+
+
+def test_timeout_returns_original_text_and_is_not_cached(client, monkeypatch):
+    backend = SlowBackend()
+    monkeypatch.setattr(client, "_backend", backend)
+
+    assert asyncio.run(translate_text("奈良", "en")) == "奈良"
+    backend.release.set()
+    assert client._memory_cache.get(("auto", "en", "奈良")) is None
+    assert client._store.get(("auto", "en", "奈良")) is None
+    assert client._breaker.stats()["consecutive_failures"] == 1
+
+
+def test_breaker_opens_and_recovers(client, monkeypatch):
+    monkeypatch.setattr(client, "_backend", FailingBackend())
+    asyncio.run(translate_text("a", "en"))
+    asyncio.run(translate_text("b", "en"))
+    assert client._breaker.state == "open"
+
+    # 停止中は翻訳エンジンを呼ばずに原文を返す
+    backend = CountingBackend()
+    monkeypatch.setattr(client, "_backend", backend)
+    assert asyncio.run(translate_text("c", "en")) == "c"
+    assert backend.calls == 0
+
+    time.sleep(0.06)
+    assert asyncio.run(translate_text("c", "en")) == "[en] c"
+    assert client._breaker.state == "closed"
+
+
+def test_cancelled_half_open_trial_releases_breaker(client, monkeypatch):
+    monkeypatch.setattr(client, "_backend", FailingBackend())
+    asyncio.run(translate_text("a", "en"))
+    asyncio.run(translate_text("b", "en"))
+    time.sleep(0.06)
+
+    # half-openの試行を途中でキャンセルする
+    backend = SlowBackend()
+    monkeypatch.setattr(client, "_backend", backend)
+
+    async def cancel_trial():
+        task = asyncio.ensure_future(translate_text("c", "en"))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_trial())
+    backend.release.set()
+
+    monkeypatch.setattr(client, "_backend", CountingBackend())
+    assert asyncio.run(translate_text("d", "en")) == "[en] d"
+    assert client._breaker.state == "closed"
+
+
+def test_store_is_accessed_off_the_event_loop(client, monkeypatch):
+    threads = []
+
+    class RecordingStore(TranslationStore):
+        def get(self, key):
+            threads.append(threading.current_thread())
+            return super().get(key)
+
+        def set(self, key, result):
+            threads.append(threading.current_thread())
+            super().set(key, result)
+
+    monkeypatch.setattr(client, "_store", RecordingStore(client._store.path))
+    monkeypatch.setattr(client, "_backend", CountingBackend())
+
+    assert asyncio.run(translate_text("神戸", "en")) == "[en] 神戸"
+    assert len(threads) == 2
+    assert all(thread is not threading.main_thread() for thread in threads)
+
+
+def test_google_backend_reuses_translator_per_thread(monkeypatch):
+    created = []
+
+    class FakeGoogleTranslator:
+        def __init__(self, source, target):
+            self.target = target
+            created.append((source, target))
+
+        def translate(self, text):
+            return f"[{self.target}] {text}"
+
+    monkeypatch.setitem(sys.modules, "deep_translator", types.SimpleNamespace(GoogleTranslator=FakeGoogleTranslator))
+    backend = GoogleTranslatorBackend()
+
+    assert backend.translate("京都", "en", "auto") == "[en] 京都"
+    assert backend.translate("奈良", "en", "auto") == "[en] 奈良"
+    assert backend.translate("京都", "ko", "auto") == "[ko] 京都"
+    assert created == [("auto", "en"), ("auto", "ko")]
+
+    # 別スレッドでは別のインスタンスを使う
+    worker = threading.Thread(target=backend.translate, args=("京都", "en", "auto"))
+    worker.start()
+    worker.join()
+    assert created == [("auto", "en"), ("auto", "ko"), ("auto", "en")]